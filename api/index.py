@@ -4,145 +4,91 @@ import datetime
 import csv
 import os
 import re
+import sys
 import random
-import urllib.request
-import urllib.error
 from urllib.parse import urlparse, parse_qs
 from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+# 共享模块位于项目根目录 (Vercel部署时同样会打包)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from quote_cache import quote_cache
+import http_client
+from ticker_symbology import lookup, symbols_for
+from quote_parser import parse_sina
+from request_chunker import fetch_chunked
+from source_health import source_health
+from fund_metadata import get_fund_metadata_cache
+from fund_search import FundSearch
+from market_calendar import beijing_now, calculation_mode, market_statuses, ticker_status
 
 # 真实股价获取功能 - 移植自fund_estimator.py (Vercel优化版)
-def get_real_stock_price_changes(ticker_map, mode):
+SINA_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Referer': 'https://finance.sina.com.cn/'
+}
+
+def fetch_sina_changes(tickers):
+    """从新浪财经获取数据 (简化版本，适配Vercel)：按URL长度分组并发查询，不截断股票列表；返回 (changes, failed)"""
+    sina_tickers_map = symbols_for(tickers, 'sina')
+
+    def fetch(url):
+        response = http_client.get(url, headers=SINA_HEADERS, timeout=5)  # 缩短超时时间
+        response.raise_for_status()
+        return parse_sina(response.content, sina_tickers_map)
+
+    # 请求出错的分组与没有行情数据的股票一并视为失败
+    changes, _ = fetch_chunked("https://hq.sinajs.cn/list=", sina_tickers_map.keys(), fetch)
+    return changes, [t for t in tickers if t not in changes]
+
+# 新浪熔断期间直接跳过，不再每次请求都等满超时 (半开探测函数只在这里注册一次)
+source_health.register('Sina', fetch_sina_changes)
+fetch_sina_instrumented = source_health.instrument('Sina', fetch_sina_changes)
+
+def get_real_stock_price_changes(ticker_map, mode, known_failed=frozenset()):
     """
     真实股价获取 - 移植自fund_estimator.py的核心逻辑 (Vercel优化)
     """
-    tickers_to_fetch = list(set(ticker_map.values()))
-    if not tickers_to_fetch:
-        return {}
-
-    # 尝试从新浪财经获取数据 (简化版本，适配Vercel)
-    changes = {}
-    failed_tickers = []
-
-    # 构建新浪财经查询 - 限制数量避免超时
-    sina_tickers_map = {}
-    for ticker in tickers_to_fetch[:10]:  # 限制最多10只股票避免超时
-        if ticker.endswith('.SS'):
-            sina_ticker = f"sh{ticker.replace('.SS', '')}"
-        elif ticker.endswith('.SZ'):
-            sina_ticker = f"sz{ticker.replace('.SZ', '')}"
-        elif ticker.endswith('.HK'):
-            sina_ticker = f"hk{ticker.replace('.HK', '')}"
-        elif ticker.endswith('.BJ'):
-            sina_ticker = f"bj{ticker.replace('.BJ', '')}"
-        elif ticker.isalpha():
-            sina_ticker = f"gb_{ticker.lower()}"
-        else:
-            sina_ticker = ticker
-        sina_tickers_map[sina_ticker] = ticker
+    return fetch_real_stock_price_changes(ticker_map, mode, known_failed)[0]
 
-    try:
-        url = f"https://hq.sinajs.cn/list={','.join(sina_tickers_map.keys())}"
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
-            'Referer': 'https://finance.sina.com.cn/'
-        }
-
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=5) as response:  # 缩短超时时间
-            try:
-                content = response.read().decode('gbk')
-            except UnicodeDecodeError:
-                content = response.read().decode('utf-8', errors='ignore')
-
-        for line in content.split(';'):
-            if len(line) < 20 or '=""' in line:
-                continue
-
-            match = re.search(r'var hq_str_([^=]+)="([^"]+)"', line)
-            if not match:
-                continue
-
-            sina_ticker, data_str = match.groups()
-            original_ticker = sina_tickers_map.get(sina_ticker)
-            if not original_ticker:
-                continue
-
-            data = data_str.split(',')
-
-            try:
-                change = None
-
-                # A股数据解析 (优先处理，最常用)
-                if sina_ticker.startswith(('sh', 'sz', 'bj')) and len(data) > 3:
-                    latest = float(data[3])
-                    prev_close = float(data[2])
-                    if prev_close != 0:
-                        change = (latest - prev_close) / prev_close
-
-                # 港股数据解析
-                elif sina_ticker.startswith('hk') and len(data) > 8:
-                    latest = float(data[6])
-                    prev_close = float(data[3])
-                    if prev_close != 0:
-                        change = (latest - prev_close) / prev_close
-
-                # 美股数据解析
-                elif sina_ticker.startswith('gb_') and len(data) > 26:
-                    latest = float(data[1])
-                    prev_close = float(data[26])
-                    if prev_close == 0 and len(data) > 7:
-                        prev_close = float(data[7])
-                    if prev_close != 0:
-                        change = (latest - prev_close) / prev_close
-
-                if change is not None:
-                    changes[original_ticker] = change
-                else:
-                    failed_tickers.append(original_ticker)
-
-            except (ValueError, IndexError):
-                failed_tickers.append(original_ticker)
-                continue
+def fetch_real_stock_price_changes(ticker_map, mode, known_failed=frozenset()):
+    """
+    返回 ({公司名称: 涨跌幅}, 查询失败的股票列表)
+    known_failed: 本次批量请求中已经查询失败的股票，直接按失败处理，不再重复查询
+    """
+    all_tickers = list(set(ticker_map.values()))
+    if not all_tickers:
+        return {}, []
+
+    # 先查全局行情缓存，已缓存的股票不再占用查询名额
+    cached_changes, tickers_to_fetch = quote_cache.get_many(all_tickers, mode)
+    skipped = [t for t in tickers_to_fetch if t in known_failed]
+    tickers_to_fetch = [t for t in tickers_to_fetch if t not in known_failed]
+    if not tickers_to_fetch and not skipped:
+        ticker_to_name = {v: k for k, v in ticker_map.items()}
+        return {ticker_to_name.get(k): v for k, v in cached_changes.items() if ticker_to_name.get(k)}, []
+
+    # 新浪熔断期间直接跳过 (后台半开探测恢复)
+    if not tickers_to_fetch:
+        changes, failed_tickers = {}, []
+    elif source_health.breaker('Sina').allow(tickers_to_fetch):
+        changes, failed_tickers = fetch_sina_instrumented(tickers_to_fetch)
+    else:
+        changes, failed_tickers = {}, list(tickers_to_fetch)
+    failed_tickers += skipped
 
-    except Exception as e:
-        # 如果新浪财经失败，将所有股票标记为失败
-        failed_tickers = list(tickers_to_fetch)
+    # 只缓存真实查询到的行情
+    for ticker, change in changes.items():
+        quote_cache.put(ticker, change, mode)
 
     # 对于失败的股票，使用0变化 (简化版本，不再尝试腾讯财经避免超时)
     for ticker in failed_tickers:
         changes[ticker] = 0.0
+    changes.update(cached_changes)
 
     # 转换回公司名称作为key
     ticker_to_name = {v: k for k, v in ticker_map.items()}
-    return {ticker_to_name.get(k): v for k, v in changes.items() if ticker_to_name.get(k)}
-
-def get_real_fund_name_from_web(fund_code):
-    """
-    从财经网站获取真实基金名称 - 移植自fund_estimator.py (Vercel优化)
-    """
-    # 尝试天天基金 (缩短超时时间)
-    try:
-        url = f"http://fundgz.1234567.com.cn/js/{fund_code}.js"
-        headers = {
-            'Referer': 'http://fund.eastmoney.com/',
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        }
-
-        req = urllib.request.Request(url, headers=headers)
-        with urllib.request.urlopen(req, timeout=3) as response:  # 缩短超时时间
-            content = response.read().decode('utf-8')
-
-        match = re.search(r'jsonpgz\((.*)\)', content)
-        if match:
-            data = json.loads(match.group(1))
-            name = data.get('name')
-            if name:
-                return name, "天天基金"
-    except Exception:
-        pass
-
-    # 简化版本：如果网络失败，直接返回默认名称，不再尝试新浪财经
-    return f"基金{fund_code}", "默认名称"
+    return {ticker_to_name.get(k): v for k, v in changes.items() if ticker_to_name.get(k)}, failed_tickers
 
 # 推荐基金代码 - 仅供展示，实际支持任意基金代码
 RECOMMENDED_FUND_CODES = [
@@ -153,16 +99,11 @@ def is_valid_fund_code(fund_code):
     """验证基金代码格式 (6位数字)"""
     return bool(fund_code and fund_code.isdigit() and len(fund_code) == 6)
 
-# 动态基金名称缓存
-_fund_names_cache = {}
-
+# 基金名称经由持久化的基金元数据缓存；Serverless入口不在导入时启动后台预热 (响应后后台线程会被冻结)
 def get_fund_name_cached(fund_code):
     """获取基金名称，带缓存功能 (Vercel优化)"""
-    if fund_code not in _fund_names_cache:
-        name, source = get_real_fund_name_from_web(fund_code)
-        _fund_names_cache[fund_code] = name
-        # 移除print语句避免Vercel日志过多
-    return _fund_names_cache[fund_code]
+    entry = get_fund_metadata_cache().get_or_fetch(fund_code, timeout=3)  # 缩短超时时间
+    return entry['name'] if entry and entry['name'] else f"基金{fund_code}"
 
 # 基金分类信息
 FUND_CATEGORIES = {
@@ -174,63 +115,25 @@ FUND_CATEGORIES = {
     "519066": {"type": "混合型", "theme": "蓝筹稳健", "company": "汇添富基金", "risk": "中"}
 }
 
+# 全市场基金搜索索引：由随部署发布的基金列表快照构建 (见 vercel.json includeFiles)，首次搜索时加载，
+# 查询与刷新都不访问网络；上面的分类信息补充主题与基金公司，没有快照时这些基金同样可以搜到
+fund_search = FundSearch(extras=FUND_CATEGORIES, background_refresh=False)
+
 def determine_calculation_mode():
     """
-    按照原始fund_estimator.py的全球化时间逻辑
+    按照原始fund_estimator.py的全球化时间逻辑 (北京时间，与服务器所在时区无关)
     """
-    import datetime
-    # 简化的时区判断 - 避免pytz依赖
-    now = datetime.datetime.now()
-
-    # 周末总是回顾模式
-    if now.weekday() >= 5:
-        return 'PREVIOUS_DAY'
-
-    # 简化的"全球静默期"判断 (5:00-9:30)
-    is_recap_window = (datetime.time(5, 0) <= now.time() < datetime.time(9, 30))
-    if is_recap_window:
-        return 'PREVIOUS_DAY'
-
-    return 'CURRENT_DAY'
+    return calculation_mode()
 
 def smart_ticker_converter(stock_code):
     """
-    按照原始fund_estimator.py的智能股票代码转换器
+    按照原始fund_estimator.py的智能股票代码转换器 (与其共用 ticker_symbology 的规则和缓存)
+    返回 (规范代码, 市场代码)
     """
-    if not stock_code:
+    record = lookup(stock_code)
+    if record is None:
         return None, "unknown"
-
-    stock_code = str(stock_code).strip().upper()
-
-    # 处理带后缀的格式
-    if ' US' in stock_code:
-        return stock_code.replace(' US', '').strip(), "US"
-    if ' HK' in stock_code:
-        code = stock_code.replace(' HK', '').strip()
-        return f"{code.zfill(5)}.HK", "HK"
-    if ' CH' in stock_code:
-        stock_code = stock_code.replace(' CH', '').strip()
-
-    # 6位数字 - A股
-    if stock_code.isdigit() and len(stock_code) == 6:
-        if stock_code.startswith(('8', '4', '9')):
-            return f"{stock_code}.BJ", "BJ"  # 北交所
-        return (f"{stock_code}.SS", "A") if stock_code.startswith('6') else (f"{stock_code}.SZ", "A")
-
-    # 港股 (4-5位数字)
-    if stock_code.isdigit() and len(stock_code) < 6:
-        return f"{stock_code.zfill(5)}.HK", "HK"
-
-    # 美股 (纯字母)
-    if stock_code.isalpha():
-        return stock_code, "US"
-
-    # 复合代码处理
-    if ',' in stock_code:
-        codes = stock_code.split(',')
-        return smart_ticker_converter(codes[0].strip())
-
-    return stock_code, "unknown"
+    return record.ticker, record.market_code
 
 def fetch_fund_holdings_from_web(fund_code):
     """从网络获取基金持仓数据"""
@@ -239,12 +142,10 @@ def fetch_fund_holdings_from_web(fund_code):
         # API: http://fundf10.eastmoney.com/ccmx_{fund_code}.html
         url = f"http://fundf10.eastmoney.com/FundArchivesDatas.aspx?type=jjcc&code={fund_code}&topline=10"
 
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-        req.add_header('Referer', f'http://fundf10.eastmoney.com/ccmx_{fund_code}.html')
-
-        with urllib.request.urlopen(req, timeout=15) as response:
-            content = response.read().decode('utf-8')
+        headers = {'Referer': f'http://fundf10.eastmoney.com/ccmx_{fund_code}.html'}
+        response = http_client.get(url, headers=headers, timeout=15)
+        response.raise_for_status()
+        content = response.content.decode('utf-8')
 
         # 解析天天基金的JSON数据
         # 查找JSON数据部分
@@ -344,9 +245,10 @@ def load_fund_holdings(fund_code):
     except Exception as e:
         return generate_mock_holdings(fund_code), f"获取持仓数据失败，使用模拟数据: {str(e)}"
 
-def get_stock_price_changes(holdings):
+def get_stock_price_changes(holdings, known_failed=frozenset()):
     """
     获取真实股价变化 - 替代模拟数据
+    known_failed: 批量估值时合并查询已失败的股票，不再重复查询
     """
     # 构建股票代码映射
     ticker_map = {}
@@ -357,24 +259,30 @@ def get_stock_price_changes(holdings):
         'inactive_market_count': 0
     }
 
+    # 实时模式下休市日的交易所整体跳过，不查询行情 (每个交易所只判断一次)
+    mode = determine_calculation_mode()
+    statuses = market_statuses() if mode == 'CURRENT_DAY' else {}
+    inactive = set()
+
     for holding in holdings:
         stock_code = holding['code']
         company_name = holding['name']
 
         # 使用智能代码转换器
         ticker, market = smart_ticker_converter(stock_code)
-        if ticker:
+        if ticker and statuses and ticker_status(ticker, statuses) == 'holiday':
+            inactive.add(company_name)
+        elif ticker:
             ticker_map[company_name] = ticker
 
         statistics['total_processed'] += 1
 
-    if not ticker_map:
+    if not ticker_map and not inactive:
         return {}, statistics
 
     # 获取真实股价变化
     try:
-        mode = determine_calculation_mode()
-        price_changes_by_name = get_real_stock_price_changes(ticker_map, mode)
+        price_changes_by_name = get_real_stock_price_changes(ticker_map, mode, known_failed)
 
         # 构建结果
         results = {}
@@ -385,7 +293,16 @@ def get_stock_price_changes(holdings):
 
             ticker, market = smart_ticker_converter(stock_code)
 
-            if company_name in price_changes_by_name:
+            if company_name in inactive:
+                results[stock_code] = {
+                    'ticker': ticker,
+                    'market': market,
+                    'price_change': 0,
+                    'weight': weight,
+                    'status': 'inactive'
+                }
+                statistics['inactive_market_count'] += 1
+            elif company_name in price_changes_by_name:
                 price_change = price_changes_by_name[company_name]
                 results[stock_code] = {
                     'ticker': ticker,
@@ -425,20 +342,22 @@ def get_stock_price_changes(holdings):
 
         return results, statistics
 
-def calculate_fund_estimate_full(fund_code, target_date=None):
+def calculate_fund_estimate_full(fund_code, target_date=None, preloaded_holdings=None, known_failed=frozenset()):
     """
     基于原始fund_estimator.py逻辑的完整基金估值计算 - 支持任意基金代码
+    preloaded_holdings: 批量估值时已加载的 (holdings, error)，避免重复获取持仓
+    known_failed: 批量估值时合并查询已失败的股票，不再逐只基金重复查询
     """
     try:
         # 验证基金代码格式
         if not is_valid_fund_code(fund_code):
-            return {"error": f"基金代码格式错误: {fund_code}，应为6位数字"}
+            return {"fund_code": fund_code, "error": f"基金代码格式错误: {fund_code}，应为6位数字"}
 
         # 获取真实基金名称（支持任意基金代码）
         fund_name = get_fund_name_cached(fund_code)
 
         # 加载基金持仓数据
-        holdings, error = load_fund_holdings(fund_code)
+        holdings, error = preloaded_holdings or load_fund_holdings(fund_code)
         if not holdings:
             return {
                 "error": "无法获取基金持仓数据",
@@ -451,7 +370,7 @@ def calculate_fund_estimate_full(fund_code, target_date=None):
         calc_mode = determine_calculation_mode()
 
         # 获取真实股价变化
-        price_changes, statistics = get_stock_price_changes(holdings)
+        price_changes, statistics = get_stock_price_changes(holdings, known_failed)
 
         # 计算加权估值
         total_weight = 0
@@ -496,11 +415,11 @@ def calculate_fund_estimate_full(fund_code, target_date=None):
             "fund_info": FUND_CATEGORIES.get(fund_code, {}),
             "estimated_change": weighted_change,
             "calculation_mode": calc_mode,
-            "query_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "query_time": beijing_now().strftime("%Y-%m-%d %H:%M:%S"),
             "statistics": detailed_statistics,
             "price_details": price_changes,
             "top_holdings": holdings[:10],
-            "update_time": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "update_time": beijing_now().strftime("%Y-%m-%d %H:%M:%S"),
             "mode": "实时模式" if calc_mode == 'CURRENT_DAY' else "历史回顾模式",
             "note": f"基于原始fund_estimator.py逻辑 + 真实股价数据 - {calc_mode}模式"
         }
@@ -508,7 +427,42 @@ def calculate_fund_estimate_full(fund_code, target_date=None):
         return result
 
     except Exception as e:
-        return {"error": f"计算失败: {str(e)}"}
+        return {"fund_code": fund_code, "error": f"计算失败: {str(e)}"}
+
+BATCH_MAX_FUNDS = 50    # 批量估值单次最多基金数
+BATCH_MAX_WORKERS = 8   # 批量估值并发线程数
+
+def calculate_fund_estimates_batch(fund_codes):
+    """
+    批量基金估值 - 并发加载所有基金持仓，合并去重后统一查询一次行情，
+    再逐只基金计算 (行情全部命中缓存，合并查询失败的股票直接按失败处理)。按完成顺序逐个产出估值结果。
+    """
+    valid_codes = [code for code in fund_codes if is_valid_fund_code(code)]
+    for code in fund_codes:
+        if not is_valid_fund_code(code):
+            yield {"fund_code": code, "error": f"基金代码格式错误: {code}，应为6位数字"}
+
+    with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+        holdings_by_code = dict(zip(valid_codes, executor.map(load_fund_holdings, valid_codes)))
+
+        # 合并所有基金的持仓股票，统一查询一次 (实时模式跳过休市日的交易所)
+        mode = determine_calculation_mode()
+        statuses = market_statuses() if mode == 'CURRENT_DAY' else {}
+        union_ticker_map = {}
+        for holdings, _ in holdings_by_code.values():
+            for holding in holdings or []:
+                ticker, _ = smart_ticker_converter(holding['code'])
+                if ticker and not (statuses and ticker_status(ticker, statuses) == 'holiday'):
+                    union_ticker_map[ticker] = ticker
+        _, union_failed = fetch_real_stock_price_changes(union_ticker_map, mode)
+        union_failed = frozenset(union_failed)
+
+        futures = [
+            executor.submit(calculate_fund_estimate_full, code, None, holdings_by_code[code], union_failed)
+            for code in valid_codes
+        ]
+        for future in as_completed(futures):
+            yield future.result()
 
 def get_fund_info_with_external_data(fund_code):
     """
@@ -527,11 +481,9 @@ def get_fund_info_with_external_data(fund_code):
     # 尝试获取实时估值信息
     try:
         url = f"http://fundgz.1234567.com.cn/js/{fund_code}.js"
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', 'Mozilla/5.0')
-
-        with urllib.request.urlopen(req, timeout=5) as response:
-            content = response.read().decode('utf-8')
+        response = http_client.get(url, headers={'User-Agent': 'Mozilla/5.0'}, timeout=5)
+        response.raise_for_status()
+        content = response.content.decode('utf-8')
 
         # 解析JSONP
         jsonp_match = re.search(r'jsonpgz\((.*)\)', content)
@@ -555,58 +507,44 @@ def get_fund_info_with_external_data(fund_code):
 
     return fund_info
 
+def _search_result(fund_code, record, data_source, lookup=False):
+    """
+    搜索结果条目：名称/分类取自本地搜索索引与元数据缓存
+    索引与缓存都没有名称时，lookup 为 True 或属于上面分类信息中的基金在线查询名称 (结果写入元数据缓存，只查询一次)
+    """
+    if record:
+        category = FUND_CATEGORIES.get(fund_code) or {"type": record[3], "theme": record[5], "company": record[6]}
+    else:
+        category = FUND_CATEGORIES.get(fund_code, {})
+    name = record[1] if record else None
+    if not name:
+        entry = get_fund_metadata_cache().get(fund_code)
+        if entry and entry['name']:
+            name = entry['name']
+        else:
+            name = get_fund_name_cached(fund_code) if lookup or fund_code in FUND_CATEGORIES else f"基金{fund_code}"
+    return {
+        "code": fund_code,
+        "name": name,
+        "category": category,
+        "has_holdings_data": os.path.exists(os.path.join('fund_holdings', f'{fund_code}.csv')),
+        "data_source": data_source
+    }
+
 def search_funds_by_keyword(keyword):
-    """根据关键词搜索基金 - 支持任意基金代码查询"""
+    """根据关键词搜索基金 - 在全市场基金的本地索引中按代码、名称、拼音、类型、主题、基金公司匹配"""
+    index = fund_search.index()
     if not keyword:
         # 如果没有关键词，返回推荐基金列表
-        results = []
-        for fund_code in RECOMMENDED_FUND_CODES:
-            fund_name = get_fund_name_cached(fund_code)
-            fund_info = {
-                "code": fund_code,
-                "name": fund_name,
-                "category": FUND_CATEGORIES.get(fund_code, {}),
-                "has_holdings_data": os.path.exists(os.path.join('fund_holdings', f'{fund_code}.csv')),
-                "data_source": "推荐基金"
-            }
-            results.append(fund_info)
-        return results
+        return [_search_result(code, index.get(code), "推荐基金") for code in RECOMMENDED_FUND_CODES]
 
     keyword = keyword.strip()
 
-    # 如果输入的是6位数字，直接作为基金代码查询
+    # 如果输入的是6位数字，直接作为基金代码查询 (索引中没有的基金在线查询名称)
     if is_valid_fund_code(keyword):
-        fund_name = get_fund_name_cached(keyword)
-        fund_info = {
-            "code": keyword,
-            "name": fund_name,
-            "category": FUND_CATEGORIES.get(keyword, {}),
-            "has_holdings_data": os.path.exists(os.path.join('fund_holdings', f'{keyword}.csv')),
-            "data_source": "直接查询"
-        }
-        return [fund_info]
+        return [_search_result(keyword, index.get(keyword), "直接查询", lookup=True)]
 
-    # 否则在推荐列表中按关键词搜索
-    keyword_lower = keyword.lower()
-    results = []
-
-    for fund_code in RECOMMENDED_FUND_CODES:
-        fund_name = get_fund_name_cached(fund_code)
-
-        if (keyword_lower in fund_code.lower() or
-            keyword_lower in fund_name.lower() or
-            any(keyword_lower in str(v).lower() for v in FUND_CATEGORIES.get(fund_code, {}).values())):
-
-            fund_info = {
-                "code": fund_code,
-                "name": fund_name,
-                "category": FUND_CATEGORIES.get(fund_code, {}),
-                "has_holdings_data": os.path.exists(os.path.join('fund_holdings', f'{fund_code}.csv')),
-                "data_source": "搜索结果"
-            }
-            results.append(fund_info)
-
-    return results[:20]
+    return [_search_result(record[0], record, "搜索结果") for record in index.search(keyword, 20)]
 
 # HTML界面保持不变
 HTML_CONTENT = """<!DOCTYPE html>
@@ -856,6 +794,33 @@ class handler(BaseHTTPRequestHandler):
 
                 self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
 
+            elif path == '/api/estimate/batch':
+                codes_param = query_params.get('codes', [''])[0]
+                fund_codes = list(dict.fromkeys(c.strip() for c in codes_param.split(',') if c.strip()))
+                stream = query_params.get('format', [''])[0] == 'ndjson'
+
+                if not fund_codes or len(fund_codes) > BATCH_MAX_FUNDS:
+                    self.send_header('Content-type', 'application/json')
+                    self.end_headers()
+                    response = {"error": f"请提供1-{BATCH_MAX_FUNDS}个基金代码 (codes=代码1,代码2)"}
+                    self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+                elif stream:
+                    # NDJSON流式返回：每只基金估值完成后立即推送一行
+                    self.send_header('Content-type', 'application/x-ndjson; charset=utf-8')
+                    self.end_headers()
+                    for result in calculate_fund_estimates_batch(fund_codes):
+                        self.wfile.write((json.dumps(result, ensure_ascii=False) + '\n').encode('utf-8'))
+                        self.wfile.flush()
+                else:
+                    self.send_header('Content-type', 'application/json')
+                    self.end_headers()
+                    results = {r.get("fund_code"): r for r in calculate_fund_estimates_batch(fund_codes)}
+                    response = {
+                        "results": [results.get(code, {"fund_code": code, "error": "计算失败"}) for code in fund_codes],
+                        "total": len(fund_codes)
+                    }
+                    self.wfile.write(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+
             elif path == '/api/search':
                 self.send_header('Content-type', 'application/json')
                 self.end_headers()
@@ -886,6 +851,7 @@ class handler(BaseHTTPRequestHandler):
                     "data_sources": ["新浪财经实时股价", "天天基金基金信息", "智能模拟持仓"],
                     "calculation_mode": determine_calculation_mode(),
                     "platform": "Vercel + fund_estimator.py真实数据引擎",
+                    "http_pool": http_client.get_stats(),
                     "usage": "直接输入6位基金代码即可查询任意基金"
                 }
 
@@ -0,0 +1,98 @@
+# api/index.py 的独立部署入口 - 线程池HTTP服务器，路由逻辑与Vercel入口共用 index.handler
+# 用法: python api/server.py [--host 0.0.0.0] [--port 8000] [--workers 16] [--max-pending 64] [--timeout 30]
+import argparse
+import os
+import signal
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http.server import HTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from index import handler
+
+DEFAULT_WORKERS = int(os.environ.get('API_WORKERS', '16'))
+DEFAULT_MAX_PENDING = 64    # 工作线程全忙时最多排队的连接数，超出直接返回503
+DEFAULT_TIMEOUT = 30        # 客户端连接的读写超时(秒)，慢速/挂起的连接不会一直占用工作线程
+SHUTDOWN_GRACE_SECONDS = 20 # 收到退出信号后等待在途请求完成的最长时间
+
+_OVERLOADED = (b"HTTP/1.0 503 Service Unavailable\r\nContent-Type: application/json\r\nRetry-After: 1\r\n\r\n"
+               + '{"error": "服务器繁忙，请稍后重试"}'.encode('utf-8'))
+
+class PooledHTTPServer(HTTPServer):
+    """
+    由固定大小线程池处理请求的HTTP服务器：
+    - 每个连接交给工作线程处理，一个慢请求(如抓取持仓网页)不会阻塞其他用户
+    - 在途+排队的连接数超过 workers + max_pending 时立即返回503，不无限堆积
+    - shutdown_gracefully(): 停止接收新连接，等待在途请求完成后再关闭线程池
+    """
+
+    def __init__(self, address, handler_class, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING):
+        super().__init__(address, handler_class)
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='api-worker')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+        self._inflight = 0
+        self._idle = threading.Condition()
+
+    def process_request(self, request, client_address):
+        if not self._slots.acquire(blocking=False):
+            try:
+                request.sendall(_OVERLOADED)
+            except OSError:
+                pass
+            self.shutdown_request(request)
+            return
+        with self._idle:
+            self._inflight += 1
+        self._pool.submit(self._process, request, client_address)
+
+    def _process(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self._slots.release()
+            with self._idle:
+                self._inflight -= 1
+                self._idle.notify_all()
+
+    def shutdown_gracefully(self, grace=SHUTDOWN_GRACE_SECONDS):
+        """停止接收新连接并等待在途请求，返回超时后仍未完成的请求数；需在 serve_forever 以外的线程调用"""
+        self.shutdown()
+        with self._idle:
+            self._idle.wait_for(lambda: self._inflight == 0, timeout=grace)
+            remaining = self._inflight
+        self._pool.shutdown(wait=remaining == 0)
+        self.server_close()
+        return remaining
+
+def make_handler(timeout=DEFAULT_TIMEOUT):
+    """在 index.handler 基础上设置连接超时，路由逻辑完全共用"""
+    return type('StandaloneHandler', (handler,), {'timeout': timeout})
+
+def serve(host='0.0.0.0', port=8000, workers=DEFAULT_WORKERS, max_pending=DEFAULT_MAX_PENDING, timeout=DEFAULT_TIMEOUT):
+    server = PooledHTTPServer((host, port), make_handler(timeout), workers, max_pending)
+
+    def on_signal(signum, frame):
+        print(f"收到信号 {signum}，停止接收新请求并等待在途请求完成...")
+        # shutdown() 会等待 serve_forever 退出，不能在运行 serve_forever 的主线程中直接调用
+        threading.Thread(target=lambda: print(f"服务器已关闭，未完成请求 {server.shutdown_gracefully()} 个"),
+                         name='api-shutdown').start()
+
+    signal.signal(signal.SIGINT, on_signal)
+    signal.signal(signal.SIGTERM, on_signal)
+    print(f"基金估值API独立服务已启动: http://{host}:{port} (工作线程 {workers}，排队上限 {max_pending}，超时 {timeout}s)")
+    server.serve_forever()
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='基金估值API独立服务 (线程池)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.environ.get('PORT', '8000')))
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS)
+    parser.add_argument('--max-pending', type=int, default=DEFAULT_MAX_PENDING)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT)
+    args = parser.parse_args()
+    serve(args.host, args.port, args.workers, args.max_pending, args.timeout)
@@ -1,5 +1,5 @@
 # 基金估值Web应用后端API
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response, stream_with_context
 from flask_cors import CORS
 import os
 import sys
@@ -7,16 +7,27 @@ import json
 from datetime import datetime, timedelta
 import threading
 import time
+import queue
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 导入原有的基金估值逻辑
 from fund_estimator import (
-    get_fund_name, 
     determine_calculation_mode,
     HOLDINGS_FOLDER
 )
 
 # 导入API适配层
-from fund_api import calculate_fund_estimate_api, get_fund_summary_info
+from fund_api import calculate_fund_estimate_api, prefetch_stock_price_changes
+import http_client
+import metrics
+from source_health import source_health
+from fund_listing import list_funds
+from market_calendar import market_statuses
+from fund_metadata import get_fund_metadata_cache, holdings_fund_codes, start_warmup
+from universe_index import get_universe_index
+from incremental_valuator import get_valuator
+from quote_refresher import start_quote_refresher, get_refresher_stats
+from estimate_stream import EstimateBroadcaster, format_sse
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
@@ -26,6 +37,45 @@ fund_cache = {}
 cache_timestamp = {}
 CACHE_DURATION = 300  # 5分钟缓存
 
+BATCH_MAX_FUNDS = 100   # 批量估值单次最多基金数
+BATCH_MAX_WORKERS = 8   # 批量估值并发计算线程数
+
+STREAM_MAX_FUNDS = 20        # 单个SSE连接最多订阅的基金数
+STREAM_KEEPALIVE = 15        # 没有推送时发送心跳注释的间隔(秒)，防止代理断开空闲连接
+# 每个SSE连接在连接期间占用一个worker线程：限制同时连接数 (需小于 gunicorn --threads，给其他接口留出线程)，
+# 超出时返回503由前端退回单次请求；连接达到最长时间后服务端主动结束，浏览器自动重连并重新排队
+STREAM_MAX_CONNECTIONS = int(os.environ.get('STREAM_MAX_CONNECTIONS', '8'))
+STREAM_MAX_LIFETIME = int(os.environ.get('STREAM_MAX_LIFETIME', '300'))
+STREAM_RETRY_MS = 3000       # 连接结束后浏览器重连的等待时间(毫秒)
+
+# 后台按市场状态预刷新行情 (gunicorn 导入模块时同样启动)，设置 QUOTE_REFRESHER=0 可关闭
+start_quote_refresher()
+
+# 后台批量预热基金元数据 (名称/类型/净值日期)，/api/funds 直接命中缓存
+start_warmup(holdings_fund_codes(HOLDINGS_FOLDER))
+
+def estimate_fund_cached(fund_code, mode, target_date, refresh=False):
+    """带结果缓存的单只基金估值，调用前需确认持仓文件存在；refresh 为 True 时跳过缓存重新计算"""
+    cache_key = f"{fund_code}_{mode}_{target_date}"
+    current_time = time.time()
+    
+    if (not refresh and
+        cache_key in fund_cache and 
+        cache_key in cache_timestamp and 
+        current_time - cache_timestamp[cache_key] < CACHE_DURATION):
+        return fund_cache[cache_key]
+    
+    csv_file_path = os.path.join(HOLDINGS_FOLDER, f"{fund_code}.csv")
+    result = calculate_fund_estimate_api(csv_file_path, mode, target_date)
+    
+    fund_cache[cache_key] = result
+    cache_timestamp[cache_key] = current_time
+    return result
+
+# 行情变化时每只基金只重算一次，结果推送给所有订阅者，同时刷新结果缓存
+broadcaster = EstimateBroadcaster(lambda fund_code: estimate_fund_cached(fund_code, 'realtime', None, refresh=True),
+                                  max_subscribers=STREAM_MAX_CONNECTIONS)
+
 @app.route('/')
 def index():
     """主页面"""
@@ -33,29 +83,18 @@ def index():
 
 @app.route('/api/funds', methods=['GET'])
 def get_funds():
-    """获取所有可用的基金列表"""
+    """获取可用的基金列表，支持分页: ?page=1&page_size=50 (不传 page_size 返回全部)"""
     try:
         if not os.path.isdir(HOLDINGS_FOLDER):
             return jsonify({'error': f'找不到持仓文件夹 {HOLDINGS_FOLDER}'}), 404
         
-        available_files = [f for f in os.listdir(HOLDINGS_FOLDER) if f.endswith('.csv') and len(f) == 10]
-        if not available_files:
+        page = request.args.get('page', 1, type=int)
+        page_size = request.args.get('page_size', type=int)
+        listing = list_funds(HOLDINGS_FOLDER, page, page_size)
+        if not listing['total']:
             return jsonify({'error': f'{HOLDINGS_FOLDER} 文件夹是空的'}), 404
         
-        funds = []
-        for file in sorted(available_files):
-            fund_code = file.split('.')[0]
-            fund_name = get_fund_name(fund_code)
-            summary = get_fund_summary_info(fund_code)
-            
-            funds.append({
-                'code': fund_code,
-                'name': fund_name,
-                'file': file,
-                'summary': summary
-            })
-        
-        return jsonify({'funds': funds})
+        return jsonify(listing)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -72,32 +111,73 @@ def estimate_fund():
         if not fund_code:
             return jsonify({'error': '基金代码不能为空'}), 400
         
-        # 检查缓存
-        cache_key = f"{fund_code}_{mode}_{target_date}"
-        current_time = time.time()
-        
-        if (cache_key in fund_cache and 
-            cache_key in cache_timestamp and 
-            current_time - cache_timestamp[cache_key] < CACHE_DURATION):
-            return jsonify(fund_cache[cache_key])
-        
         # 构建CSV文件路径
         csv_file_path = os.path.join(HOLDINGS_FOLDER, f"{fund_code}.csv")
         if not os.path.exists(csv_file_path):
             return jsonify({'error': f'找不到基金 {fund_code} 的持仓文件'}), 404
         
-        # 调用估值计算
-        result = calculate_fund_estimate_api(csv_file_path, mode, target_date)
+        # 调用估值计算 (带缓存)
+        return jsonify(estimate_fund_cached(fund_code, mode, target_date))
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/estimate/batch', methods=['POST'])
+def estimate_funds_batch():
+    """
+    批量基金估值：合并所有基金的持仓股票，去重后统一查询一次行情，一次返回全部估值。
+    请求体: {"fund_codes": [...], "mode": "realtime", "target_date": null, "stream": false}
+    stream 为 true (或 Accept: application/x-ndjson) 时按NDJSON逐只基金流式返回
+    """
+    try:
+        data = request.get_json() or {}
+        fund_codes = data.get('fund_codes') or []
+        mode = data.get('mode', 'realtime')
+        target_date = data.get('target_date')
+        stream = bool(data.get('stream')) or 'application/x-ndjson' in request.headers.get('Accept', '')
+        
+        if not isinstance(fund_codes, list) or not fund_codes:
+            return jsonify({'error': 'fund_codes 必须是非空的基金代码列表'}), 400
+        fund_codes = list(dict.fromkeys(str(code).strip() for code in fund_codes))
+        if len(fund_codes) > BATCH_MAX_FUNDS:
+            return jsonify({'error': f'单次最多查询 {BATCH_MAX_FUNDS} 只基金'}), 400
+        
+        csv_paths = {code: os.path.join(HOLDINGS_FOLDER, f"{code}.csv") for code in fund_codes}
+        available = [code for code in fund_codes if os.path.exists(csv_paths[code])]
         
-        # 缓存结果
-        fund_cache[cache_key] = result
-        cache_timestamp[cache_key] = current_time
+        # 统一预取所有基金的行情，之后逐只估值直接命中行情缓存
+        prices = prefetch_stock_price_changes([csv_paths[code] for code in available], mode, target_date)
+        if mode == 'realtime' and prices:
+            get_valuator().apply_quotes(prices)
         
-        return jsonify(result)
+        def estimate_one(fund_code):
+            if fund_code not in available:
+                return {'fund_code': fund_code, 'error': f'找不到基金 {fund_code} 的持仓文件'}
+            try:
+                return estimate_fund_cached(fund_code, mode, target_date)
+            except Exception as e:
+                return {'fund_code': fund_code, 'error': str(e)}
+        
+        if stream:
+            def generate():
+                with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+                    futures = [executor.submit(estimate_one, code) for code in fund_codes]
+                    for future in as_completed(futures):
+                        yield json.dumps(future.result(), ensure_ascii=False) + '\n'
+            return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+        
+        with ThreadPoolExecutor(max_workers=BATCH_MAX_WORKERS) as executor:
+            results = list(executor.map(estimate_one, fund_codes))
+        return jsonify({'results': results, 'total': len(results)})
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus格式的运行指标：各阶段耗时、各数据源命中/缺失/失败次数、缓存与连接池状态"""
+    return Response(metrics.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/api/market-status', methods=['GET'])
 def get_market_status():
     """获取当前市场状态"""
@@ -108,12 +188,99 @@ def get_market_status():
         return jsonify({
             'mode': mode,
             'current_time': current_time.strftime('%Y-%m-%d %H:%M:%S'),
-            'is_trading_time': mode == 'CURRENT_DAY'
+            'is_trading_time': mode == 'CURRENT_DAY',
+            'markets': market_statuses(),
+            'http_pool': http_client.get_stats(),
+            'sources': source_health.snapshot(),
+            'fund_metadata': get_fund_metadata_cache().summary(),
+            'quote_refresher': get_refresher_stats(),
+            'stream': broadcaster.stats()
+        })
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/stream', methods=['GET'])
+def stream_estimates():
+    """
+    SSE实时估值推送：/api/stream?funds=000001,000002
+    连接后先推送每只基金的当前估值，之后底层行情变化时推送更新后的估值 (event: estimate)
+    连接数达到上限时返回503 (前端改用 /api/estimate 单次请求)；连接最长保持 STREAM_MAX_LIFETIME 秒，之后由浏览器重连
+    """
+    fund_codes = [code.strip() for code in request.args.get('funds', '').split(',') if code.strip()]
+    fund_codes = list(dict.fromkeys(fund_codes))
+    if not fund_codes:
+        return jsonify({'error': 'funds 参数不能为空'}), 400
+    if len(fund_codes) > STREAM_MAX_FUNDS:
+        return jsonify({'error': f'单个连接最多订阅 {STREAM_MAX_FUNDS} 只基金'}), 400
+    missing = [code for code in fund_codes if not os.path.exists(os.path.join(HOLDINGS_FOLDER, f"{code}.csv"))]
+    if missing:
+        return jsonify({'error': f'找不到基金 {",".join(missing)} 的持仓文件'}), 404
+    
+    subscriber = broadcaster.subscribe(fund_codes)
+    if subscriber is None:
+        response = jsonify({'error': '实时推送连接数已满，请使用 /api/estimate 查询', 'fallback': '/api/estimate'})
+        response.headers['Retry-After'] = str(STREAM_KEEPALIVE)
+        return response, 503
+    
+    def generate():
+        deadline = time.monotonic() + STREAM_MAX_LIFETIME
+        try:
+            yield f"retry: {STREAM_RETRY_MS}\n\n"
+            for fund_code in fund_codes:
+                try:
+                    result = estimate_fund_cached(fund_code, 'realtime', None)
+                except Exception as e:
+                    result = {'fund_code': fund_code, 'error': str(e)}
+                yield format_sse(result, event='estimate')
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return  # 释放worker线程，浏览器按 retry 间隔重连
+                try:
+                    yield subscriber.queue.get(timeout=min(STREAM_KEEPALIVE, remaining))
+                except queue.Empty:
+                    yield ': keepalive\n\n'
+        finally:
+            broadcaster.unsubscribe(subscriber)
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
+
+@app.route('/api/estimate/changes', methods=['GET'])
+def get_estimate_changes():
+    """
+    增量估值流：返回 since 版本之后估值发生变化的基金。
+    客户端保存返回的 version，下次带上 ?since=version 只拉取变化部分；since=0 为全量。
+    """
+    try:
+        since = request.args.get('since', default=0, type=int)
+        version, estimates = get_valuator().changes_since(since)
+        return jsonify({
+            'version': version,
+            'changes': {code: round(change, 4) for code, change in estimates.items()},
+            'total': len(estimates)
         })
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/holders/<ticker>', methods=['GET'])
+def get_ticker_holders(ticker):
+    """反查持有某只股票的基金，如 /api/holders/300502.SZ"""
+    try:
+        index = get_universe_index(HOLDINGS_FOLDER)
+        holders = [
+            {'fund_code': code, 'weight': round(weight * 100, 4)}
+            for code, weight in index.funds_holding(ticker.upper())
+        ]
+        return jsonify({'ticker': ticker.upper(), 'funds': holders, 'total': len(holders)})
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/validate-date', methods=['POST'])
 def validate_date():
     """验证用户输入的日期"""
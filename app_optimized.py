@@ -1,5 +1,5 @@
 # 基金估值Web应用后端API (优化版)
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, request, jsonify, render_template, Response
 from flask_cors import CORS
 import os
 import sys
@@ -10,13 +10,19 @@ import time
 
 # 导入原有的基金估值逻辑
 from fund_estimator import (
-    get_fund_name, 
     determine_calculation_mode,
     HOLDINGS_FOLDER
 )
 
 # 导入优化版API适配层
-from fund_api_optimized import calculate_fund_estimate_api_optimized as calculate_fund_estimate_api, get_fund_summary_info
+from fund_api_optimized import calculate_fund_estimate_api_optimized as calculate_fund_estimate_api, clear_result_cache
+from quote_cache import quote_cache
+import http_client
+import metrics
+from source_health import source_health
+from fund_listing import list_funds
+from market_calendar import market_statuses
+from fund_metadata import get_fund_metadata_cache, holdings_fund_codes, start_warmup
 
 app = Flask(__name__)
 CORS(app)  # 允许跨域请求
@@ -26,6 +32,9 @@ fund_cache = {}
 cache_timestamp = {}
 CACHE_DURATION = 600  # 10分钟缓存
 
+# 后台批量预热基金元数据 (名称/类型/净值日期)，/api/funds 直接命中缓存
+start_warmup(holdings_fund_codes(HOLDINGS_FOLDER))
+
 @app.route('/')
 def index():
     """主页面"""
@@ -33,38 +42,18 @@ def index():
 
 @app.route('/api/funds', methods=['GET'])
 def get_funds():
-    """获取所有可用的基金列表"""
+    """获取可用的基金列表，支持分页: ?page=1&page_size=50 (不传 page_size 返回全部)"""
     try:
         if not os.path.isdir(HOLDINGS_FOLDER):
             return jsonify({'error': f'找不到持仓文件夹 {HOLDINGS_FOLDER}'}), 404
         
-        available_files = [f for f in os.listdir(HOLDINGS_FOLDER) if f.endswith('.csv') and len(f) == 10]
-        if not available_files:
+        page = request.args.get('page', 1, type=int)
+        page_size = request.args.get('page_size', type=int)
+        listing = list_funds(HOLDINGS_FOLDER, page, page_size)
+        if not listing['total']:
             return jsonify({'error': f'{HOLDINGS_FOLDER} 文件夹是空的'}), 404
         
-        funds = []
-        for file in sorted(available_files):
-            fund_code = file.split('.')[0]
-            try:
-                fund_name = get_fund_name(fund_code)
-                summary = get_fund_summary_info(fund_code)
-                
-                funds.append({
-                    'code': fund_code,
-                    'name': fund_name,
-                    'file': file,
-                    'summary': summary
-                })
-            except Exception as e:
-                print(f"获取基金 {fund_code} 信息失败: {e}")
-                funds.append({
-                    'code': fund_code,
-                    'name': f"基金{fund_code}",
-                    'file': file,
-                    'summary': None
-                })
-        
-        return jsonify({'funds': funds})
+        return jsonify(listing)
     
     except Exception as e:
         print(f"获取基金列表错误: {e}")
@@ -113,6 +102,11 @@ def estimate_fund():
         print(f"估值计算错误: {e}")
         return jsonify({'error': f'估值计算失败: {str(e)}'}), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Prometheus格式的运行指标：各阶段耗时、各数据源命中/缺失/失败次数、缓存与连接池状态"""
+    return Response(metrics.render(), content_type=metrics.PROMETHEUS_CONTENT_TYPE)
+
 @app.route('/api/market-status', methods=['GET'])
 def get_market_status():
     """获取当前市场状态"""
@@ -124,9 +118,14 @@ def get_market_status():
             'mode': mode,
             'current_time': current_time.strftime('%Y-%m-%d %H:%M:%S'),
             'is_trading_time': mode == 'CURRENT_DAY',
+            'markets': market_statuses(),
             'cache_info': {
                 'cached_funds': len(fund_cache),
-                'cache_duration': CACHE_DURATION
+                'cache_duration': CACHE_DURATION,
+                'quote_cache': quote_cache.stats(),
+                'http_pool': http_client.get_stats(),
+                'sources': source_health.snapshot(),
+                'fund_metadata': get_fund_metadata_cache().summary()
             }
         })
     
@@ -170,10 +169,12 @@ def clear_cache():
         cache_count = len(fund_cache)
         fund_cache.clear()
         cache_timestamp.clear()
+        clear_result_cache()
+        quote_count = quote_cache.clear()
         
         return jsonify({
             'success': True,
-            'message': f'已清除 {cache_count} 个缓存项'
+            'message': f'已清除 {cache_count} 个缓存项, {quote_count} 条行情缓存'
         })
     
     except Exception as e:
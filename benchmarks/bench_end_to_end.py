@@ -0,0 +1,131 @@
+# 端到端估值基准测试 - 在本地行情模拟器上驱动三条估值链路，统计吞吐量与 p50/p95/p99 延迟
+# 用法: python benchmarks/bench_end_to_end.py [--sizes 1,10,100,1000] [--pipelines estimator,optimized,vercel]
+#                                           [--workers 8] [--latency 0.05] [--error-rate 0] [--partial-rate 0]
+import argparse
+import contextlib
+import importlib.util
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# 必须在导入估值模块之前设置：离线环境不访问Yahoo，不启动后台刷新，本地模拟器默认不限流；
+# 基金元数据缓存写入临时目录，不污染项目目录下的缓存
+os.environ['QUOTE_DISABLE_YAHOO'] = '1'
+os.environ['QUOTE_REFRESHER'] = '0'
+os.environ.setdefault('HTTP_RATE_LIMIT', '0')
+os.environ['FUND_METADATA_PATH'] = os.path.join(tempfile.mkdtemp(prefix='bench_meta_'), 'fund_metadata.sqlite')
+
+import numpy as np
+
+import http_client
+from quote_cache import quote_cache
+from fund_metadata import get_fund_metadata_cache
+from quote_simulator import QuoteSimulator
+
+WEIGHT_COL = '占基金资产净值比例(%)'
+
+def make_synthetic_funds(folder, count, holdings_per_fund=30, universe_size=1500, seed=42):
+    """生成 count 只合成基金的持仓CSV，持仓从共同的股票池中抽取 (多只基金持有同一只股票)"""
+    rng = random.Random(seed)
+    universe = []
+    for i in range(universe_size):
+        kind = rng.random()
+        if kind < 0.75:
+            universe.append(f"{rng.choice(['600', '601', '000', '002', '300', '688'])}{i % 1000:03d}")
+        elif kind < 0.9:
+            universe.append(f"{rng.randint(1, 9999)} HK")
+        else:
+            universe.append(f"{''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(4))} US")
+    universe = list(dict.fromkeys(universe))
+
+    codes = []
+    for n in range(count):
+        code = f"9{n:05d}"
+        rows = [f"公司名称,证券代码,{WEIGHT_COL}"]
+        for stock_code in rng.sample(universe, holdings_per_fund):
+            rows.append(f"公司{stock_code},{stock_code},{rng.uniform(0.5, 5.0):.2f}")
+        with open(os.path.join(folder, f"{code}.csv"), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(rows) + '\n')
+        codes.append(code)
+    return codes
+
+def load_vercel_module():
+    """api/index.py 不是包内模块，按文件路径导入"""
+    spec = importlib.util.spec_from_file_location('vercel_index', os.path.join(ROOT, 'api', 'index.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def build_pipelines(folder):
+    from fund_estimator import estimate_fund_change_from_csv
+    from fund_api_optimized import calculate_fund_estimate_api_optimized, clear_result_cache
+    vercel = load_vercel_module()
+
+    def reset():
+        quote_cache.clear()
+        clear_result_cache()
+        get_fund_metadata_cache().clear()
+
+    return {
+        # 使用上一交易日模式：所有市场都参与计算，不受运行时刻的开盘状态影响
+        'estimator': lambda code: estimate_fund_change_from_csv(os.path.join(folder, f"{code}.csv"), 'PREVIOUS_DAY'),
+        'optimized': lambda code: calculate_fund_estimate_api_optimized(os.path.join(folder, f"{code}.csv"), 'PREVIOUS_DAY'),
+        'vercel': lambda code: vercel.calculate_fund_estimate_full(code),
+    }, reset
+
+def run_pipeline(fn, codes, workers):
+    """并发估值 codes 中的每只基金，返回 (总耗时, 每只基金的延迟列表)"""
+    def timed(code):
+        start = time.perf_counter()
+        fn(code)
+        return time.perf_counter() - start
+
+    # 估值链路的print输出量很大，整轮测试期间丢弃 (sys.stdout是进程级的，不能按线程重定向)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = list(executor.map(timed, codes))
+    return time.perf_counter() - start, latencies
+
+def main():
+    parser = argparse.ArgumentParser(description='端到端估值基准测试')
+    parser.add_argument('--sizes', default='1,10,100,1000')
+    parser.add_argument('--pipelines', default='estimator,optimized,vercel')
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--latency', type=float, default=0.05)
+    parser.add_argument('--jitter', type=float, default=0.02)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--partial-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    simulator = QuoteSimulator(latency=args.latency, jitter=args.jitter,
+                               error_rate=args.error_rate, partial_rate=args.partial_rate).start()
+    for host, target in simulator.host_overrides().items():
+        http_client.set_host_override(host, target)
+
+    with tempfile.TemporaryDirectory() as folder:
+        all_codes = make_synthetic_funds(folder, max(sizes))
+        pipelines, reset = build_pipelines(folder)
+        print(f"模拟器 {simulator.address}  延迟 {args.latency * 1000:.0f}ms(+{args.jitter * 1000:.0f}ms)  "
+              f"错误率 {args.error_rate:.0%}  部分缺失率 {args.partial_rate:.0%}  并发 {args.workers}")
+        print(f"{'链路':<10}{'基金数':>8}{'总耗时(s)':>12}{'吞吐(只/s)':>12}{'p50(ms)':>10}{'p95(ms)':>10}{'p99(ms)':>10}{'上游请求':>10}")
+        for name in args.pipelines.split(','):
+            for size in sizes:
+                reset()
+                requests_before = simulator.requests
+                elapsed, latencies = run_pipeline(pipelines[name], all_codes[:size], args.workers)
+                p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+                print(f"{name:<10}{size:>8}{elapsed:>12.2f}{size / elapsed:>12.1f}"
+                      f"{p50:>10.1f}{p95:>10.1f}{p99:>10.1f}{simulator.requests - requests_before:>10}")
+    simulator.stop()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,45 @@
+# 基金搜索基准测试 - 全市场规模 (默认26000只) 的合成基金列表上测量索引构建时间与典型联想查询的耗时
+# 用法: python benchmarks/bench_fund_search.py [基金数量]
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fund_search import FundSearchIndex, build_records
+
+COMPANIES = [('华夏', 'HX', 'HUAXIA'), ('易方达', 'YFD', 'YIFANGDA'), ('汇添富', 'HTF', 'HUITIANFU'), ('广发', 'GF', 'GUANGFA'),
+             ('南方', 'NF', 'NANFANG'), ('嘉实', 'JS', 'JIASHI'), ('富国', 'FG', 'FUGUO'), ('招商', 'ZS', 'ZHAOSHANG'),
+             ('天弘', 'TH', 'TIANHONG'), ('博时', 'BS', 'BOSHI'), ('工银瑞信', 'GYRX', 'GONGYINRUIXIN'), ('鹏华', 'PH', 'PENGHUA')]
+THEMES = [('沪深300', 'HS300', 'HUSHEN300'), ('中证500', 'ZZ500', 'ZHONGZHENG500'), ('消费', 'XF', 'XIAOFEI'),
+          ('医药', 'YY', 'YIYAO'), ('新能源', 'XNY', 'XINNENGYUAN'), ('半导体', 'BDT', 'BANDAOTI'), ('成长', 'CZ', 'CHENGZHANG'),
+          ('价值', 'JZ', 'JIAZHI'), ('纳斯达克100', 'NSDK100', 'NASIDAKE100'), ('红利', 'HL', 'HONGLI'), ('科技', 'KJ', 'KEJI')]
+KINDS = [('混合', 'HH', 'HUNHE', '混合型-灵活'), ('股票', 'GP', 'GUPIAO', '股票型'), ('ETF联接A', 'ETFLJA', 'ETFLIANJIEA', '指数型-股票'),
+         ('债券A', 'ZQA', 'ZHAIQUANA', '债券型-长债'), ('LOF', 'LOF', 'LOF', '指数型-股票')]
+
+def make_fund_list(count, seed=42):
+    rng = random.Random(seed)
+    funds = {}
+    while len(funds) < count:
+        company, theme, kind = rng.choice(COMPANIES), rng.choice(THEMES), rng.choice(KINDS)
+        funds[f"{rng.randint(0, 999999):06d}"] = (company[1] + theme[1] + kind[1], company[0] + theme[0] + kind[0], kind[3],
+                                                   company[2] + theme[2] + kind[2])
+    return funds
+
+def main(count):
+    fund_list = make_fund_list(count)
+    started = time.perf_counter()
+    index = FundSearchIndex(build_records(fund_list, [c[0] for c in COMPANIES]))
+    print(f"构建索引：{len(index)} 只基金，{time.perf_counter() - started:.2f}s")
+    queries = ['0', '00', '1100', '110022', '华', '华夏', '华夏消费', '消费', '沪深300', '300', 'hx', 'hxxf', 'yifangda', '联接', '半导体股票', '不存在']
+    rounds = 200
+    for query in queries:
+        started = time.perf_counter()
+        for _ in range(rounds):
+            results = index.search(query)
+        elapsed = (time.perf_counter() - started) / rounds * 1000
+        print(f"  {query!r:14} {len(results):>3} 条  {elapsed:.3f}ms")
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 26000)
@@ -0,0 +1,60 @@
+# 增量估值基准测试 - 合成全市场持仓(默认5000只基金×10000只股票)，对比全量重算与按变动增量更新
+# 用法: python benchmarks/bench_incremental.py [基金数量] [股票数量] [每次变动股票数]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+from universe_index import UniverseIndex
+from incremental_valuator import IncrementalValuator
+
+def make_synthetic_index(fund_count, ticker_count, holdings_per_fund=50, seed=42):
+    """每只基金随机持有 holdings_per_fund 只股票，权重合计约90%"""
+    rng = np.random.default_rng(seed)
+    tickers = [f"{i:06d}.SZ" for i in range(ticker_count)]
+    indices = np.concatenate([
+        rng.choice(ticker_count, holdings_per_fund, replace=False) for _ in range(fund_count)
+    ]).astype(np.int32)
+    weights = rng.dirichlet(np.ones(holdings_per_fund), fund_count).ravel() * 0.9
+    indptr = np.arange(fund_count + 1, dtype=np.int64) * holdings_per_fund
+    fund_codes = [f"{i:06d}" for i in range(fund_count)]
+    return UniverseIndex(fund_codes, tickers, indptr, indices, weights)
+
+if __name__ == '__main__':
+    fund_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    ticker_count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    tick_size = int(sys.argv[3]) if len(sys.argv) > 3 else 300
+
+    index = make_synthetic_index(fund_count, ticker_count)
+    valuator = IncrementalValuator(index)
+    rng = np.random.default_rng(7)
+    quotes = dict(zip(index.tickers, rng.uniform(-5, 5, ticker_count).tolist()))
+    valuator.apply_quotes(quotes)
+
+    ticks = []
+    for _ in range(20):
+        changed = rng.choice(ticker_count, tick_size, replace=False)
+        ticks.append({index.tickers[t]: float(rng.uniform(-5, 5)) for t in changed})
+
+    start = time.perf_counter()
+    for tick in ticks:
+        quotes.update(tick)
+        index.revalue(quotes)
+    full_time = (time.perf_counter() - start) / len(ticks)
+
+    start = time.perf_counter()
+    for tick in ticks:
+        valuator.apply_quotes(tick)
+    incremental_time = (time.perf_counter() - start) / len(ticks)
+
+    _, incremental = valuator.snapshot()
+    full = index.revalue(quotes)
+    drift = max(abs(full[code] - incremental[code]) for code in full)
+
+    print(f"基金 {fund_count} 只, 股票 {ticker_count} 只, 持仓条目 {len(index.indices)}, 每次变动 {tick_size} 只股票")
+    print(f"全量重算: {full_time * 1000:8.2f} ms/次")
+    print(f"增量更新: {incremental_time * 1000:8.2f} ms/次")
+    print(f"加速比: {full_time / incremental_time:.1f}x  最大误差 {drift:.2e}")
@@ -0,0 +1,100 @@
+# 行情解析基准测试 - 对比原逐段正则解析与单次遍历字节解析 (默认800只股票，即单次请求的最大批量)
+# 用法: python benchmarks/bench_quote_parser.py [股票数量]
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from quote_parser import parse_sina, parse_tencent
+from quote_simulator import QuoteSimulator
+from ticker_symbology import symbols_for
+
+def make_tickers(count, seed=42):
+    rng = random.Random(seed)
+    tickers = set()
+    while len(tickers) < count:
+        kind = rng.random()
+        if kind < 0.7:
+            code = f"{rng.choice(['600', '601', '000', '002', '300'])}{rng.randint(0, 999):03d}"
+            tickers.add(f"{code}.SS" if code.startswith('6') else f"{code}.SZ")
+        elif kind < 0.9:
+            tickers.add(f"{rng.randint(1, 9999):05d}.HK")
+        else:
+            tickers.add(''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(4)))
+    return sorted(tickers)
+
+def legacy_parse_sina(content, sina_tickers_map):
+    """原实现：整体GBK解码，按 ';' 切分后逐段 re.search"""
+    changes = {}
+    for res in content.decode('gbk', errors='replace').split(';'):
+        if len(res) < 20 or '=""' in res: continue
+        match = re.search(r'var hq_str_([^=]+)="([^"]+)"', res)
+        if not match: continue
+        sina_ticker, data_str = match.groups()
+        original_ticker = sina_tickers_map.get(sina_ticker)
+        if not original_ticker: continue
+        data = data_str.split(',')
+        try:
+            change = None
+            if sina_ticker.startswith('gb_') and len(data) > 26:
+                latest, prev_close = float(data[1]), float(data[26])
+                if prev_close == 0 and len(data) > 7: prev_close = float(data[7])
+                if prev_close != 0: change = (latest - prev_close) / prev_close
+            elif sina_ticker.startswith('hk') and len(data) > 8:
+                latest, prev_close = float(data[6]), float(data[3])
+                if prev_close != 0: change = (latest - prev_close) / prev_close
+            elif sina_ticker.startswith(('sh', 'sz', 'bj')) and len(data) > 3:
+                latest, prev_close = float(data[3]), float(data[2])
+                if prev_close != 0: change = (latest - prev_close) / prev_close
+            if change is not None:
+                changes[original_ticker] = change
+        except (ValueError, IndexError): continue
+    return changes
+
+def legacy_parse_tencent(content, tencent_tickers_map):
+    changes = {}
+    for res in content.decode('gbk', errors='replace').split(';'):
+        if len(res) < 20 or '~""~' in res: continue
+        match = re.search(r'v_([^=]+)="([^"]+)"', res)
+        if not match: continue
+        tencent_ticker, data_str = match.groups()
+        original_ticker = tencent_tickers_map.get(tencent_ticker)
+        if not original_ticker: continue
+        data = data_str.split('~')
+        try:
+            if len(data) > 4 and data[3] and data[4]:
+                latest, prev_close = float(data[3]), float(data[4])
+                if prev_close != 0: changes[original_ticker] = (latest - prev_close) / prev_close
+        except (ValueError, IndexError): continue
+    return changes
+
+def best_of(fn, repeat, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), value
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 800
+    tickers = make_tickers(count)
+    simulator = QuoteSimulator(partial_rate=0.02)
+
+    for source, payload_fn, legacy, parser in (
+        ('sina', simulator.sina_payload, legacy_parse_sina, parse_sina),
+        ('tencent', simulator.tencent_payload, legacy_parse_tencent, parse_tencent),
+    ):
+        symbol_map = symbols_for(tickers, source)
+        content = payload_fn(list(symbol_map)).encode('gbk')
+        legacy_time, legacy_changes = best_of(legacy, 20, content, symbol_map)
+        parser_time, parser_changes = best_of(parser, 20, content, symbol_map)
+        assert legacy_changes == parser_changes, f"{source} 解析结果不一致"
+        print(f"{source:<8} {count} 只股票, 响应 {len(content) / 1024:.1f} KB, 解析成功 {len(parser_changes)} 只")
+        print(f"  正则逐段解析: {legacy_time * 1000:8.3f} ms")
+        print(f"  单次遍历解析: {parser_time * 1000:8.3f} ms   加速比 {legacy_time / parser_time:.1f}x")
+    simulator.server.server_close()
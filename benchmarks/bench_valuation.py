@@ -0,0 +1,130 @@
+# 估值核心基准测试 - 对比逐行iterrows与向量化实现 (合成5000只持仓)
+# 逐行实现连同其代码转换/市场判断函数按优化前的原样保留在本文件中，不使用后来加入全局缓存的版本
+# 用法: python benchmarks/bench_valuation.py [持仓数量]
+import datetime
+import os
+import random
+import sys
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+import pytz
+
+from fund_estimator import (
+    build_holdings_frame,
+    active_holdings_mask,
+    value_holdings,
+)
+
+def make_synthetic_holdings(count, seed=42):
+    """生成混合A股/港股/美股代码的合成持仓表"""
+    rng = random.Random(seed)
+    rows = []
+    for i in range(count):
+        kind = rng.random()
+        if kind < 0.5:
+            code = f"{rng.choice(['600', '000', '300', '688', '830'])}{i % 1000:03d}"
+        elif kind < 0.8:
+            code = f"{rng.randint(1, 9999)} HK"
+        else:
+            code = f"{''.join(rng.choice('ABCDEFGHIJKLMNOPQRSTUVWXYZ') for _ in range(4))} US"
+        rows.append({'公司名称': f"公司{i}", '证券代码': code, '占基金资产净值比例(%)': rng.uniform(0.01, 2.0)})
+    return pd.DataFrame(rows)
+
+def legacy_market_status(ticker):
+    """原实现的市场状态判断：每次调用都构造时区对象"""
+    now_utc = datetime.datetime.now(pytz.utc)
+    if ticker.isalpha() or '.' not in ticker:
+        market_time = now_utc.astimezone(pytz.timezone('US/Eastern'))
+        if (datetime.time(9, 30) <= market_time.time() <= datetime.time(16, 0)) and market_time.weekday() < 5: return "open"
+        return "closed"
+    if ticker.endswith(('.SS', '.SZ', '.HK', '.BJ')):
+        market_time = now_utc.astimezone(pytz.timezone('Asia/Shanghai'))
+        if market_time.weekday() >= 5: return "closed"
+        time_now = market_time.time()
+        if datetime.time(9, 30) <= time_now <= datetime.time(11, 30) or datetime.time(13, 0) <= time_now <= datetime.time(15, 0): return "open"
+        if datetime.time(11, 30) < time_now < datetime.time(13, 0): return "lunch_break"
+        if time_now > datetime.time(15, 0): return "closed_today"
+        if time_now >= datetime.time(9, 30): return "active_day"
+        return "closed"
+    return "unknown"
+
+def legacy_ticker_converter(stock_code):
+    """原实现的代码转换：无缓存，每行重新计算"""
+    stock_code = str(stock_code).strip().upper()
+    if ' US' in stock_code: return stock_code.replace(' US', '').strip()
+    if ' HK' in stock_code: return f"{stock_code.replace(' HK', '').strip().zfill(5)}.HK"
+    if ' CH' in stock_code: stock_code = stock_code.replace(' CH', '').strip()
+    if stock_code.isdigit() and len(stock_code) == 6:
+        if stock_code.startswith(('8', '4', '9')):
+            return f"{stock_code}.BJ"
+        return f"{stock_code}.SS" if stock_code.startswith('6') else f"{stock_code}.SZ"
+    if stock_code.isdigit() and len(stock_code) < 6: return f"{stock_code.zfill(5)}.HK"
+    return stock_code
+
+def legacy_market_type(ticker):
+    if ticker.endswith(('.SS', '.SZ', '.BJ')): return 'A股'
+    if ticker.endswith('.HK'): return '港股'
+    if ticker.isalpha() or '.' not in ticker: return '美股'
+    return '其他'
+
+def legacy_valuation(holdings_df, stock_changes):
+    """原实现：三次iterrows，每行都转换代码并判断市场状态"""
+    ticker_map = {
+        str(row['公司名称']).strip(): legacy_ticker_converter(str(row['证券代码']).strip())
+        for _, row in holdings_df.iterrows()
+    }
+    unique_name_map, processed_names, unique_rows_list = {}, set(), []
+    for _, row in holdings_df.iterrows():
+        name = str(row['公司名称']).strip()
+        if name not in processed_names:
+            unique_name_map[name] = ticker_map[name]
+            processed_names.add(name)
+            unique_rows_list.append(row)
+    total_change, total_weight = 0.0, 0.0
+    calc_weight, failed_weight = defaultdict(float), defaultdict(float)
+    for _, row in holdings_df.iterrows():
+        name = str(row['公司名称']).strip()
+        weight = row['占基金资产净值比例(%)'] / 100.0
+        total_weight += weight
+        ticker = unique_name_map.get(name, "")
+        market = legacy_market_type(ticker)
+        legacy_market_status(ticker)  # 原实现每行都判断一次市场状态 (上一交易日模式下全部参与计算)
+        change_pct = stock_changes.get(name)
+        if change_pct is not None and pd.notna(change_pct):
+            total_change += weight * change_pct
+            calc_weight[market] += weight
+        else:
+            failed_weight[market] += weight
+    return total_change / total_weight if total_weight > 0 else 0
+
+def vectorized_valuation(holdings_df, stock_changes):
+    frame = build_holdings_frame(holdings_df)
+    active = active_holdings_mask(frame, realtime=False, count_all=True)
+    result = value_holdings(frame, stock_changes, active)
+    return result['total_change'] / result['total_weight'] if result['total_weight'] > 0 else 0
+
+def best_of(fn, repeat, *args):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        value = fn(*args)
+        timings.append(time.perf_counter() - start)
+    return min(timings), value
+
+if __name__ == '__main__':
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    holdings_df = make_synthetic_holdings(count)
+    rng = random.Random(7)
+    stock_changes = {f"公司{i}": rng.uniform(-0.1, 0.1) for i in range(count) if rng.random() > 0.05}
+
+    legacy_time, legacy_value = best_of(legacy_valuation, 3, holdings_df, stock_changes)
+    vector_time, vector_value = best_of(vectorized_valuation, 3, holdings_df, stock_changes)
+
+    print(f"持仓数量: {count}")
+    print(f"逐行实现:   {legacy_time * 1000:8.2f} ms  估值 {legacy_value:+.6%}")
+    print(f"向量化实现: {vector_time * 1000:8.2f} ms  估值 {vector_value:+.6%}")
+    print(f"加速比: {legacy_time / vector_time:.1f}x")
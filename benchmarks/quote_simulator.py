@@ -0,0 +1,205 @@
+# 本地行情模拟服务器 - 模拟新浪/腾讯行情、天天基金估值(fundgz)与持仓(fundf10)接口，用于离线测试与基准测试
+# 用法: python benchmarks/quote_simulator.py [--port 8765] [--latency 0.05] [--jitter 0.02] [--error-rate 0] [--partial-rate 0]
+# 启动后设置环境变量，使应用访问模拟器而不是真实上游：
+#   HTTP_HOST_OVERRIDES="hq.sinajs.cn=127.0.0.1:8765,qt.gtimg.cn=127.0.0.1:8765,fundgz.1234567.com.cn=127.0.0.1:8765,fundf10.eastmoney.com=127.0.0.1:8765"
+#   QUOTE_DISABLE_YAHOO=1
+import argparse
+import datetime
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs, unquote
+
+SIMULATED_HOSTS = ('hq.sinajs.cn', 'qt.gtimg.cn', 'fundgz.1234567.com.cn', 'fundf10.eastmoney.com')
+
+def _seed(symbol):
+    return zlib.crc32(symbol.encode('utf-8'))
+
+def simulated_quote(symbol, tick=0):
+    """按代码生成确定性的 (昨收, 最新价)；tick 变化时价格随之变化，用于模拟行情跳动"""
+    seed = _seed(symbol)
+    prev_close = 5 + (seed % 20000) / 100.0
+    change = ((seed >> 8) % 1000 - 500) / 10000.0 + ((seed + tick * 7919) % 200 - 100) / 100000.0 * bool(tick)
+    return prev_close, round(prev_close * (1 + change), 3)
+
+def simulated_holdings(fund_code, count=10):
+    """按基金代码生成确定性的前十大持仓 [(证券代码, 名称, 占比%)]"""
+    rng = random.Random(_seed(fund_code))
+    holdings = []
+    for i in range(count):
+        if rng.random() < 0.8:
+            code = f"{rng.choice(['600', '601', '000', '002', '300', '688'])}{rng.randint(0, 999):03d}"
+        else:
+            code = f"{rng.randint(1, 9999):05d}"
+        holdings.append((code, f"模拟股票{code}", round(rng.uniform(1.0, 9.0), 2)))
+    return holdings
+
+class QuoteSimulator:
+    """
+    本地模拟服务器，按请求的Host头区分数据源：
+    - latency/jitter: 每个请求的响应延迟(秒)，实际延迟为 latency + [0, jitter) 的随机值
+    - error_rate: 整个请求返回503的概率
+    - partial_rate: 单只股票返回空数据的概率 (模拟停牌、代码不存在等部分缺失)
+    - tick_seconds: 大于0时价格每隔该秒数变化一次
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.05, jitter=0.02,
+                 error_rate=0.0, partial_rate=0.0, tick_seconds=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.partial_rate = partial_rate
+        self.tick_seconds = tick_seconds
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(42)
+        self.server = ThreadingHTTPServer((host, port), self._make_handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"{host}:{port}"
+
+    def host_overrides(self):
+        """供 http_client.set_host_override 使用的 {上游主机: 模拟器地址}"""
+        return {host: self.address for host in SIMULATED_HOSTS}
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, name='quote-simulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def _tick(self):
+        return int(time.time() // self.tick_seconds) if self.tick_seconds else 0
+
+    def _random(self):
+        with self._lock:
+            return self._rng.random()
+
+    def _make_handler(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # 支持长连接，与真实上游一致
+
+            def do_GET(self):
+                with simulator._lock:
+                    simulator.requests += 1
+                time.sleep(simulator.latency + simulator._random() * simulator.jitter)
+                if simulator._random() < simulator.error_rate:
+                    with simulator._lock:
+                        simulator.errors += 1
+                    return self._reply(503, b'service unavailable', 'text/plain')
+
+                host = (self.headers.get('Host') or '').split(':')[0]
+                parts = urlsplit(self.path)
+                if host == 'hq.sinajs.cn':
+                    body = simulator.sina_payload(unquote(parts.path).split('list=', 1)[-1].split(','))
+                    return self._reply(200, body.encode('gbk'), 'application/javascript; charset=GBK')
+                if host == 'qt.gtimg.cn':
+                    body = simulator.tencent_payload(unquote(parts.path).split('q=', 1)[-1].split(','))
+                    return self._reply(200, body.encode('gbk'), 'application/javascript; charset=GBK')
+                if host == 'fundgz.1234567.com.cn':
+                    fund_code = parts.path.rsplit('/', 1)[-1].split('.')[0]
+                    return self._reply(200, simulator.fundgz_payload(fund_code).encode('utf-8'), 'application/javascript')
+                if host == 'fundf10.eastmoney.com':
+                    query = parse_qs(parts.query)
+                    fund_code = query.get('code', [''])[0]
+                    topline = int(query.get('topline', ['10'])[0])
+                    return self._reply(200, simulator.fundf10_payload(fund_code, topline).encode('utf-8'), 'application/javascript')
+                self._reply(404, b'not found', 'text/plain')
+
+            def _reply(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def sina_payload(self, symbols):
+        tick = self._tick()
+        lines = []
+        for symbol in filter(None, symbols):
+            if self._random() < self.partial_rate:
+                lines.append(f'var hq_str_{symbol}="";')
+                continue
+            if symbol.startswith('f_'):
+                lines.append(f'var hq_str_{symbol}="模拟基金{symbol[2:]},1.2345,1.2345,1.2300,2025-01-01,10.0";')
+                continue
+            prev_close, latest = simulated_quote(symbol, tick)
+            if symbol.startswith(('sh', 'sz', 'bj')):
+                fields = [f"模拟{symbol}", f"{prev_close:.2f}", f"{prev_close:.2f}", f"{latest:.2f}"] + ['0'] * 28
+            elif symbol.startswith('hk'):
+                fields = [symbol[2:], f"模拟{symbol}", f"{prev_close:.3f}", f"{prev_close:.3f}", '0', '0', f"{latest:.3f}"] + ['0'] * 12
+            else:
+                fields = [f"模拟{symbol}", f"{latest:.2f}"] + ['0'] * 24 + [f"{prev_close:.2f}"] + ['0'] * 8
+            lines.append(f'var hq_str_{symbol}="{",".join(fields)}";')
+        return '\n'.join(lines) + '\n'
+
+    def tencent_payload(self, symbols):
+        tick = self._tick()
+        lines = []
+        for symbol in filter(None, symbols):
+            if self._random() < self.partial_rate:
+                lines.append('v_pv_none_match="1";')
+                continue
+            prev_close, latest = simulated_quote(symbol, tick)
+            fields = ['1', f"模拟{symbol}", symbol[2:], f"{latest:.3f}", f"{prev_close:.3f}"] + ['0'] * 40
+            lines.append(f'v_{symbol}="{"~".join(fields)}";')
+        return '\n'.join(lines) + '\n'
+
+    def fundgz_payload(self, fund_code):
+        prev_close, latest = simulated_quote(f"fund{fund_code}", self._tick())
+        data = {
+            'fundcode': fund_code,
+            'name': f"模拟基金{fund_code}",
+            'jzrq': (datetime.date.today() - datetime.timedelta(days=1)).isoformat(),
+            'dwjz': f"{prev_close / 100:.4f}",
+            'gsz': f"{latest / 100:.4f}",
+            'gszzl': f"{(latest - prev_close) / prev_close * 100:.2f}",
+            'gztime': datetime.datetime.now().strftime('%Y-%m-%d %H:%M'),
+        }
+        return f"jsonpgz({json.dumps(data, ensure_ascii=False)});"
+
+    def fundf10_payload(self, fund_code, topline=10):
+        rows = [[code, name, str(weight), '0', '0'] for code, name, weight in simulated_holdings(fund_code, topline)]
+        return f"var apidata={json.dumps({'data': rows}, ensure_ascii=False)};"
+
+def main():
+    parser = argparse.ArgumentParser(description='本地行情模拟服务器')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.05, help='基础响应延迟(秒)')
+    parser.add_argument('--jitter', type=float, default=0.02, help='随机附加延迟上限(秒)')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='请求返回503的概率')
+    parser.add_argument('--partial-rate', type=float, default=0.0, help='单只股票返回空数据的概率')
+    parser.add_argument('--tick-seconds', type=float, default=0, help='价格变化间隔(秒)，0为固定价格')
+    args = parser.parse_args()
+
+    simulator = QuoteSimulator(args.host, args.port, args.latency, args.jitter,
+                               args.error_rate, args.partial_rate, args.tick_seconds)
+    overrides = ','.join(f"{host}={target}" for host, target in simulator.host_overrides().items())
+    print(f"行情模拟器已启动: http://{simulator.address}")
+    print(f"HTTP_HOST_OVERRIDES=\"{overrides}\"")
+    try:
+        simulator.server.serve_forever()
+    except KeyboardInterrupt:
+        simulator.server.server_close()
+
+if __name__ == '__main__':
+    main()
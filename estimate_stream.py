@@ -0,0 +1,112 @@
+# 估值推送中心 - 行情变化时每只基金只计算一次，结果推送给所有订阅该基金的SSE客户端
+import json
+import queue
+import threading
+
+from incremental_valuator import get_valuator
+
+SUBSCRIBER_QUEUE_SIZE = 100  # 客户端消费过慢时丢弃超出的推送，不阻塞推送线程
+WAIT_TIMEOUT = 5             # 推送线程等待估值变化的超时(秒)，超时后重新获取估值引擎
+
+class Subscriber:
+    """一个SSE客户端：订阅的基金集合 + 待推送的消息队列"""
+
+    def __init__(self, fund_codes):
+        self.fund_codes = set(fund_codes)
+        self.queue = queue.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.dropped = 0
+
+    def push(self, message):
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.dropped += 1
+
+class EstimateBroadcaster:
+    """
+    推送线程等待增量估值引擎的版本变化：
+    - 取出变化的基金，与当前所有订阅取交集
+    - 每只基金调用一次 compute(fund_code) 得到完整估值结果
+    - 同一份结果分发给所有订阅该基金的客户端
+    """
+
+    def __init__(self, compute, max_subscribers=None):
+        self.compute = compute
+        self.max_subscribers = max_subscribers  # 同时连接的客户端上限 (每个SSE连接占用一个worker线程)，None为不限
+        self._subscribers = set()
+        self._lock = threading.Lock()
+        self._thread = None
+        self.version = 0
+        self.computations = 0
+        self.messages = 0
+        self.rejected = 0
+
+    def subscribe(self, fund_codes):
+        """新增订阅者；已达连接上限时返回None"""
+        subscriber = Subscriber(fund_codes)
+        with self._lock:
+            if self.max_subscribers is not None and len(self._subscribers) >= self.max_subscribers:
+                self.rejected += 1
+                return None
+            self._subscribers.add(subscriber)
+            if self._thread is None or not self._thread.is_alive():
+                self.version = get_valuator().version
+                self._thread = threading.Thread(target=self._run, name='estimate-broadcaster', daemon=True)
+                self._thread.start()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self._subscribers.discard(subscriber)
+
+    def _subscribed_funds(self):
+        with self._lock:
+            return set().union(*(s.fund_codes for s in self._subscribers)) if self._subscribers else set()
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._subscribers:
+                    self._thread = None  # 没有订阅者时退出，下次订阅重新启动
+                    return
+            valuator = get_valuator()
+            if valuator.wait_for_change(self.version, WAIT_TIMEOUT) <= self.version:
+                continue
+            self.version, changes = valuator.changes_since(self.version)
+            for fund_code in sorted(set(changes) & self._subscribed_funds()):
+                try:
+                    result = self.compute(fund_code)
+                except Exception as e:
+                    result = {'fund_code': fund_code, 'error': str(e)}
+                self.computations += 1
+                self.publish(fund_code, result)
+
+    def publish(self, fund_code, result):
+        """将一只基金的估值结果分发给所有订阅者"""
+        message = format_sse(result, event='estimate', event_id=self.version)
+        with self._lock:
+            targets = [s for s in self._subscribers if fund_code in s.fund_codes]
+        for subscriber in targets:
+            subscriber.push(message)
+        self.messages += len(targets)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'subscribers': len(self._subscribers),
+                'version': self.version,
+                'computations': self.computations,
+                'messages': self.messages,
+                'rejected': self.rejected,
+                'max_subscribers': self.max_subscribers,
+            }
+
+def format_sse(data, event=None, event_id=None):
+    """按 text/event-stream 格式编码一条消息"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    if event:
+        lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, ensure_ascii=False)}")
+    return '\n'.join(lines) + '\n\n'
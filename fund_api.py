@@ -1,22 +1,27 @@
 # API适配层 - 将原有估值逻辑包装为API友好的函数
-import pandas as pd
 import os
 import sys
 from datetime import datetime
 import json
-import requests
+import http_client
 import re
-from collections import defaultdict
 
 # 导入原有模块
 import pytz
 from fund_estimator import (
     get_stock_price_changes,
-    smart_ticker_converter,
     get_market_status,
-    get_market_type_from_ticker,
+    attach_market_status,
+    active_holdings_mask,
+    value_holdings,
+    QUERY_STATUSES,
     HOLDINGS_FOLDER
 )
+from holdings_store import load_holdings
+from market_calendar import market_statuses
+from fund_listing import fund_summary
+from quote_history import get_quote_history
+from metrics import timed_stage
 
 def get_historical_fund_data(fund_code, target_date):
     """
@@ -30,6 +35,11 @@ def get_historical_fund_data(fund_code, target_date):
         
         date_str = target_date.strftime('%Y-%m-%d')
         
+        # 先查本地历史库 (history_backfill 回填)，已覆盖的日期不访问网络
+        covered, change_rate = get_quote_history().nav_change(fund_code, date_str)
+        if covered:
+            return change_rate
+        
         # 天天基金网历史净值API
         url = f"http://api.fund.eastmoney.com/f10/lsjz"
         params = {
@@ -46,7 +56,7 @@ def get_historical_fund_data(fund_code, target_date):
             'Referer': f'http://fundf10.eastmoney.com/jjjz_{fund_code}.html'
         }
         
-        response = requests.get(url, params=params, headers=headers, timeout=10)
+        response = http_client.get(url, params=params, headers=headers, timeout=10)
         response.raise_for_status()
         
         # 解析JSON响应
@@ -88,7 +98,7 @@ def get_fund_data_from_backup_source(fund_code, target_date):
             'Accept': 'application/json'
         }
         
-        response = requests.get(url, params=params, headers=headers, timeout=8)
+        response = http_client.get(url, params=params, headers=headers, timeout=8)
         response.raise_for_status()
         
         data = response.json()
@@ -103,6 +113,7 @@ def get_fund_data_from_backup_source(fund_code, target_date):
     
     return None
 
+@timed_stage('estimate_total')
 def calculate_fund_estimate_api(csv_path, mode, target_date=None):
     """
     API友好的估值计算函数
@@ -136,37 +147,9 @@ def calculate_fund_estimate_api(csv_path, mode, target_date=None):
     
     # 实时模式：继续原有逻辑
     try:
-        # 读取持仓数据
-        holdings_df = pd.read_csv(csv_path, dtype={'证券代码': str})
-        holdings_df.columns = holdings_df.columns.str.strip()
-        
-        required_cols = ['公司名称', '证券代码', '占基金资产净值比例(%)']
-        if not all(col in holdings_df.columns for col in required_cols):
-            raise ValueError(f"CSV文件缺少必要的列: {required_cols}")
-        
-        weight_col = '占基金资产净值比例(%)'
-        holdings_df[weight_col] = pd.to_numeric(holdings_df[weight_col], errors='coerce')
-        holdings_df.dropna(subset=[weight_col], inplace=True)
-        
-        # 构建股票代码映射
-        ticker_map = {
-            str(row['公司名称']).strip(): smart_ticker_converter(str(row['证券代码']).strip()) 
-            for _, row in holdings_df.iterrows()
-        }
-        
-        # 去重处理
-        unique_name_map = {}
-        processed_names = set()
-        unique_rows_list = []
-        for index, row in holdings_df.iterrows():
-            name = str(row['公司名称']).strip()
-            if name not in processed_names:
-                unique_name_map[name] = ticker_map[name]
-                processed_names.add(name)
-                unique_rows_list.append(row)
-        
-        if len(unique_name_map) != len(holdings_df):
-            holdings_df = pd.DataFrame(unique_rows_list)
+        # 读取持仓数据 (预编译存储，CSV只解析一次)
+        frame = attach_market_status(load_holdings(csv_path).to_frame())
+        unique_name_map = dict(zip(frame['name'], frame['ticker']))
         
         # 根据模式获取股价变化
         user_mode = None
@@ -179,65 +162,33 @@ def calculate_fund_estimate_api(csv_path, mode, target_date=None):
         else:
             calc_mode = mode
         
-        # 市场状态分析
-        active_ticker_map = {}
+        # 市场状态分析 (每个市场只判断一次)
+        active = active_holdings_mask(
+            frame,
+            realtime=user_mode == 'REALTIME_MODE',
+            count_all=user_mode == 'REVIEW_MODE' or calc_mode == 'PREVIOUS_DAY'
+        )
         market_analysis = []
         
         if user_mode == 'REALTIME_MODE':
-            query_statuses = ["open", "closed_today", "active_day", "lunch_break"]
-            for name, ticker in unique_name_map.items():
-                status = get_market_status(ticker)
-                if status in query_statuses:
-                    active_ticker_map[name] = ticker
-                market_analysis.append({
-                    'name': name,
-                    'ticker': ticker,
-                    'status': status,
-                    'active': status in query_statuses
-                })
+            active_ticker_map = dict(zip(frame['name'][active], frame['ticker'][active]))
+            market_analysis = frame[['name', 'ticker', 'status']].assign(active=active).to_dict('records')
             stock_changes = get_stock_price_changes(active_ticker_map, calc_mode, target_date)
-        elif user_mode == 'REVIEW_MODE':
-            stock_changes = get_stock_price_changes(unique_name_map, calc_mode, target_date)
         else:
             stock_changes = get_stock_price_changes(unique_name_map, calc_mode, target_date)
         
-        # 计算估值
-        total_change, total_weight = 0.0, 0.0
-        calc_weight, failed_weight, inactive_weight = defaultdict(float), defaultdict(float), defaultdict(float)
-        
-        holdings_details = []
+        # 计算估值 (向量化)
+        valuation = value_holdings(frame, stock_changes, active)
+        total_change, total_weight = valuation['total_change'], valuation['total_weight']
+        calc_weight = valuation['calc_weight']
+        failed_weight = valuation['failed_weight']
+        inactive_weight = valuation['inactive_weight']
         
-        for _, row in holdings_df.iterrows():
-            name = str(row['公司名称']).strip()
-            weight = row['占基金资产净值比例(%)'] / 100.0
-            total_weight += weight
-            ticker = unique_name_map.get(name, "")
-            market = get_market_type_from_ticker(ticker)
-            
-            status = get_market_status(ticker)
-            query_statuses = ["open", "closed_today", "active_day", "lunch_break"]
-            is_active_for_today = ((user_mode == 'REALTIME_MODE') and status in query_statuses)
-            
-            change_pct = None
-            if is_active_for_today or user_mode == 'REVIEW_MODE' or calc_mode == 'PREVIOUS_DAY':
-                change_pct = stock_changes.get(name)
-                if change_pct is not None and pd.notna(change_pct):
-                    total_change += weight * change_pct
-                    calc_weight[market] += weight
-                else:
-                    failed_weight[market] += weight
-            else:
-                inactive_weight[market] += weight
-            
-            # 记录持仓详情
-            holdings_details.append({
-                'name': name,
-                'ticker': ticker,
-                'weight': weight,
-                'market': market,
-                'change': change_pct,
-                'status': status if user_mode == 'REALTIME_MODE' else 'review'
-            })
+        # 记录持仓详情
+        holdings_details = frame[['name', 'ticker', 'weight', 'market']].assign(
+            change=valuation['changes'],
+            status=frame['status'] if user_mode == 'REALTIME_MODE' else 'review'
+        ).to_dict('records')
         
         estimated_change = total_change / total_weight if total_weight > 0 else 0
         
@@ -271,28 +222,32 @@ def calculate_fund_estimate_api(csv_path, mode, target_date=None):
     except Exception as e:
         raise e
 
+def prefetch_stock_price_changes(csv_paths, mode, target_date=None):
+    """
+    批量估值前的行情预取：合并多只基金的持仓股票，去重后统一查询一次。
+    结果写入全局行情缓存，随后逐只基金估值时直接命中缓存。
+    """
+    if mode == 'review':
+        return {}  # 回顾模式直接使用真实历史净值，不需要行情
+
+    union_ticker_map = {}
+    statuses = market_statuses()
+    for csv_path in csv_paths:
+        try:
+            tickers = load_holdings(csv_path).tickers
+        except Exception as e:
+            print(f"预取行情时读取 {os.path.basename(csv_path)} 失败: {e}")
+            continue
+        for ticker in tickers.tolist():
+            # 实时模式与单只估值保持一致：只查询活跃市场的股票
+            if mode == 'realtime' and get_market_status(ticker, statuses) not in QUERY_STATUSES:
+                continue
+            union_ticker_map[ticker] = ticker
+
+    calc_mode = 'CURRENT_DAY' if mode == 'realtime' else mode
+    print(f"批量预取行情：{len(csv_paths)} 只基金共 {len(union_ticker_map)} 只不重复股票")
+    return get_stock_price_changes(union_ticker_map, calc_mode, target_date)
+
 def get_fund_summary_info(fund_code):
-    """获取基金的简要信息"""
-    try:
-        csv_path = os.path.join(HOLDINGS_FOLDER, f"{fund_code}.csv")
-        if not os.path.exists(csv_path):
-            return None
-        
-        holdings_df = pd.read_csv(csv_path, dtype={'证券代码': str})
-        holdings_count = len(holdings_df)
-        
-        # 计算权重分布
-        if '占基金资产净值比例(%)' in holdings_df.columns:
-            holdings_df['占基金资产净值比例(%)'] = pd.to_numeric(holdings_df['占基金资产净值比例(%)'], errors='coerce')
-            total_weight = holdings_df['占基金资产净值比例(%)'].sum()
-        else:
-            total_weight = 0
-        
-        return {
-            'holdings_count': holdings_count,
-            'total_weight': total_weight / 100.0 if total_weight > 0 else 0,
-            'last_updated': datetime.fromtimestamp(os.path.getmtime(csv_path)).strftime('%Y-%m-%d')
-        }
-        
-    except Exception:
-        return None
\ No newline at end of file
+    """获取基金的简要信息 (按持仓文件状态缓存)"""
+    return fund_summary(os.path.join(HOLDINGS_FOLDER, f"{fund_code}.csv"))
@@ -1,26 +1,41 @@
 # 优化版API适配层 - 处理API限制和错误
-import pandas as pd
 import os
 import sys
 from datetime import datetime
 import json
-import time
-import random
-from collections import defaultdict
+import hashlib
 
 # 导入原有模块
 from fund_estimator import (
-    get_stock_price_changes,
-    smart_ticker_converter,
-    get_market_status,
-    get_market_type_from_ticker,
+    fetch_price_changes,
+    attach_market_status,
+    active_holdings_mask,
+    value_holdings,
     HOLDINGS_FOLDER
 )
+from quote_cache import quote_cache, quote_ttl, LRUCache
+from market_calendar import market_statuses, ticker_status
+from holdings_store import load_holdings
+from fund_listing import fund_summary
+from metrics import timed_stage
 
-# 全局缓存
-_cache = {}
-_cache_timestamp = {}
-CACHE_DURATION = 300  # 5分钟缓存
+# 结果缓存：键为持仓股票集合的内容哈希，容量有限，按LRU淘汰
+# 只缓存真实查询到的行情；有效期不超过其中各股票的行情有效期 (交易时段内即 QUOTE_TTL_OPEN)
+CACHE_DURATION = 300  # 最长5分钟缓存
+RESULT_CACHE_SIZE = 256
+_result_cache = LRUCache(RESULT_CACHE_SIZE, CACHE_DURATION)
+
+def _portfolio_cache_key(tickers, mode, target_date=None):
+    """对排序后的股票集合做稳定哈希，持仓相同的基金才会共享缓存"""
+    digest = hashlib.sha1(','.join(sorted(tickers)).encode('utf-8')).hexdigest()
+    return f"{mode}_{target_date}_{digest}"
+
+def _portfolio_cache_ttl(tickers, mode):
+    """组合缓存的有效期：取各股票按市场状态计算的行情有效期的最小值，且不超过 CACHE_DURATION"""
+    if mode == 'REVIEW_MODE':
+        return CACHE_DURATION
+    statuses = market_statuses()
+    return min([CACHE_DURATION] + [quote_ttl(ticker, ticker_status(ticker, statuses)) for ticker in tickers])
 
 def get_stock_price_changes_optimized(ticker_map, mode, target_date=None):
     """
@@ -29,97 +44,58 @@ def get_stock_price_changes_optimized(ticker_map, mode, target_date=None):
     if not ticker_map:
         return {}
     
-    cache_key = f"{mode}_{target_date}_{len(ticker_map)}"
-    current_time = time.time()
-    
-    # 检查缓存
-    if (cache_key in _cache and 
-        cache_key in _cache_timestamp and 
-        current_time - _cache_timestamp[cache_key] < CACHE_DURATION):
+    tickers = set(ticker_map.values())
+    cache_key = _portfolio_cache_key(tickers, mode, target_date)
+    cached = _result_cache.get(cache_key)
+    if cached is not None and tickers.issubset(cached):
         print("使用缓存数据...")
-        return _cache[cache_key]
+        return {name: cached[ticker] for name, ticker in ticker_map.items()}
     
-    print(f"开始获取 {len(ticker_map)} 只股票数据...")
+    # 部分命中：全局行情缓存里已有的股票直接复用，只查询缺失的部分
+    cache_date = target_date if mode == 'REVIEW_MODE' else None
+    all_changes, missing = quote_cache.get_many(set(ticker_map.values()), mode, cache_date)
+    missing = set(missing)
+    missing_items = [(name, ticker) for name, ticker in ticker_map.items() if ticker in missing]
     
-    # 分批处理，避免API限制
-    batch_size = 15  # 每批15只股票
-    all_changes = {}
+    print(f"开始获取 {len(missing)} 只股票数据 (缓存命中 {len(all_changes)} 只)...")
     
-    ticker_items = list(ticker_map.items())
-    total_batches = (len(ticker_items) + batch_size - 1) // batch_size
-    
-    for i in range(0, len(ticker_items), batch_size):
-        batch_num = i // batch_size + 1
-        batch = dict(ticker_items[i:i+batch_size])
-        
-        print(f"处理批次 {batch_num}/{total_batches} ({len(batch)} 只股票)...")
-        
+    # 新浪/腾讯按URL长度自动分组并发查询 (见 request_chunker)，这里不再手动分批
+    failed = []
+    if missing_items:
         try:
-            # 添加延时，避免频率限制
-            if batch_num > 1:
-                delay = random.uniform(2, 4)
-                print(f"等待 {delay:.1f} 秒...")
-                time.sleep(delay)
-            
-            batch_changes = get_stock_price_changes(batch, mode, target_date)
-            all_changes.update(batch_changes)
-            
+            fetched, failed = fetch_price_changes(sorted({ticker for _, ticker in missing_items}), mode, target_date)
+            all_changes.update(fetched)
         except Exception as e:
-            print(f"批次 {batch_num} 查询失败: {e}")
-            # 对失败的股票设置0涨跌幅
-            for name in batch.keys():
-                all_changes[name] = 0.0
-            continue
+            print(f"股票数据查询失败: {e}")
+            failed = sorted(missing)
     
-    # 缓存结果
-    _cache[cache_key] = all_changes
-    _cache_timestamp[cache_key] = current_time
+    # 缓存结果 (按股票代码存储，不同基金的公司名称写法不影响复用)；查询失败的股票不写入，下次重新查询
+    _result_cache.put(cache_key, dict(all_changes), ttl=_portfolio_cache_ttl(tickers, mode))
     
-    print(f"股票数据获取完成，成功 {len(all_changes)} 只")
-    return all_changes
+    print(f"股票数据获取完成，成功 {len(all_changes)} 只，失败 {len(failed)} 只")
+    # 对失败的股票设置0涨跌幅 (只用于本次返回)
+    for ticker in failed:
+        all_changes[ticker] = 0.0
+    return {name: all_changes[ticker] for name, ticker in ticker_map.items() if ticker in all_changes}
 
+def clear_result_cache():
+    """清除持仓组合结果缓存，返回清除的条目数"""
+    return _result_cache.clear()
+
+@timed_stage('estimate_total')
 def calculate_fund_estimate_api_optimized(csv_path, mode, target_date=None):
     """
     优化版API友好的估值计算函数
     """
     try:
-        # 读取持仓数据
-        holdings_df = pd.read_csv(csv_path, dtype={'证券代码': str})
-        holdings_df.columns = holdings_df.columns.str.strip()
-        
-        required_cols = ['公司名称', '证券代码', '占基金资产净值比例(%)']
-        if not all(col in holdings_df.columns for col in required_cols):
-            raise ValueError(f"CSV文件缺少必要的列: {required_cols}")
-        
-        weight_col = '占基金资产净值比例(%)'
-        holdings_df[weight_col] = pd.to_numeric(holdings_df[weight_col], errors='coerce')
-        holdings_df.dropna(subset=[weight_col], inplace=True)
-        
-        print(f"读取持仓数据：{len(holdings_df)} 只股票")
-        
-        # 构建股票代码映射
-        ticker_map = {}
-        for _, row in holdings_df.iterrows():
-            name = str(row['公司名称']).strip()
-            code = str(row['证券代码']).strip()
-            ticker = smart_ticker_converter(code)
-            ticker_map[name] = ticker
+        # 读取持仓数据 (预编译存储，CSV只解析一次)
+        holdings = load_holdings(csv_path)
+        print(f"读取持仓数据：{len(holdings) + holdings.duplicate_rows} 只股票")
         
-        # 去重处理
-        unique_name_map = {}
-        processed_names = set()
-        unique_rows_list = []
-        
-        for index, row in holdings_df.iterrows():
-            name = str(row['公司名称']).strip()
-            if name not in processed_names:
-                unique_name_map[name] = ticker_map[name]
-                processed_names.add(name)
-                unique_rows_list.append(row)
-        
-        if len(unique_name_map) != len(holdings_df):
-            holdings_df = pd.DataFrame(unique_rows_list)
-            print(f"去重后持仓：{len(unique_name_map)} 只股票")
+        frame = attach_market_status(holdings.to_frame())
+        unique_name_map = dict(zip(frame['name'], frame['ticker']))
+        if holdings.duplicate_rows:
+            print(f"去重后持仓：{len(frame)} 只股票")
         
         # 根据模式获取股价变化
         if mode == 'realtime':
@@ -132,84 +108,39 @@ def calculate_fund_estimate_api_optimized(csv_path, mode, target_date=None):
             calc_mode = mode
             user_mode = None
         
-        # 市场状态分析
-        active_ticker_map = {}
+        # 市场状态分析 (每个市场只判断一次)
+        active = active_holdings_mask(
+            frame,
+            realtime=user_mode == 'REALTIME_MODE',
+            count_all=user_mode == 'REVIEW_MODE' or calc_mode == 'PREVIOUS_DAY'
+        )
         market_analysis = []
         
         if user_mode == 'REALTIME_MODE':
-            query_statuses = ["open", "closed_today", "active_day", "lunch_break"]
-            for name, ticker in unique_name_map.items():
-                try:
-                    status = get_market_status(ticker)
-                    if status in query_statuses:
-                        active_ticker_map[name] = ticker
-                    market_analysis.append({
-                        'name': name,
-                        'ticker': ticker,
-                        'status': status,
-                        'active': status in query_statuses
-                    })
-                except Exception as e:
-                    print(f"获取 {name} 市场状态失败: {e}")
-                    market_analysis.append({
-                        'name': name,
-                        'ticker': ticker,
-                        'status': 'unknown',
-                        'active': False
-                    })
-            
+            active_ticker_map = dict(zip(frame['name'][active], frame['ticker'][active]))
+            market_analysis = frame[['name', 'ticker', 'status']].assign(active=active).to_dict('records')
             stock_changes = get_stock_price_changes_optimized(active_ticker_map, calc_mode, target_date)
         else:
             stock_changes = get_stock_price_changes_optimized(unique_name_map, calc_mode, target_date)
         
-        # 计算估值
-        total_change, total_weight = 0.0, 0.0
-        calc_weight, failed_weight, inactive_weight = defaultdict(float), defaultdict(float), defaultdict(float)
-        
-        holdings_details = []
-        success_count = 0
+        # 计算估值 (向量化)
+        valuation = value_holdings(frame, stock_changes, active)
+        total_change, total_weight = valuation['total_change'], valuation['total_weight']
+        calc_weight = valuation['calc_weight']
+        failed_weight = valuation['failed_weight']
+        inactive_weight = valuation['inactive_weight']
+        success_count = valuation['success_count']
         
-        for _, row in holdings_df.iterrows():
-            name = str(row['公司名称']).strip()
-            weight = row['占基金资产净值比例(%)'] / 100.0
-            total_weight += weight
-            ticker = unique_name_map.get(name, "")
-            market = get_market_type_from_ticker(ticker)
-            
-            try:
-                status = get_market_status(ticker)
-            except:
-                status = 'unknown'
-            
-            query_statuses = ["open", "closed_today", "active_day", "lunch_break"]
-            is_active_for_today = ((user_mode == 'REALTIME_MODE') and status in query_statuses)
-            
-            change_pct = None
-            if is_active_for_today or user_mode == 'REVIEW_MODE' or calc_mode == 'PREVIOUS_DAY':
-                change_pct = stock_changes.get(name)
-                if change_pct is not None and pd.notna(change_pct):
-                    total_change += weight * change_pct
-                    calc_weight[market] += weight
-                    success_count += 1
-                else:
-                    failed_weight[market] += weight
-            else:
-                inactive_weight[market] += weight
-            
-            # 记录持仓详情
-            holdings_details.append({
-                'name': name,
-                'ticker': ticker,
-                'weight': weight,
-                'market': market,
-                'change': change_pct,
-                'status': status if user_mode == 'REALTIME_MODE' else 'review'
-            })
+        # 记录持仓详情
+        holdings_details = frame[['name', 'ticker', 'weight', 'market']].assign(
+            change=valuation['changes'],
+            status=frame['status'] if user_mode == 'REALTIME_MODE' else 'review'
+        ).to_dict('records')
         
         estimated_change = total_change / total_weight if total_weight > 0 else 0
-        success_rate = success_count / len(holdings_df) if len(holdings_df) > 0 else 0
+        success_rate = success_count / len(frame) if len(frame) > 0 else 0
         
-        print(f"估值计算完成：{success_count}/{len(holdings_df)} 只股票成功")
+        print(f"估值计算完成：{success_count}/{len(frame)} 只股票成功")
         
         # 构建返回数据
         result = {
@@ -225,7 +156,7 @@ def calculate_fund_estimate_api_optimized(csv_path, mode, target_date=None):
                 'inactive_weight': sum(inactive_weight.values()),
                 'success_rate': success_rate,
                 'success_count': success_count,
-                'total_count': len(holdings_df),
+                'total_count': len(frame),
                 'markets': {
                     'calc': dict(calc_weight),
                     'failed': dict(failed_weight),
@@ -243,27 +174,5 @@ def calculate_fund_estimate_api_optimized(csv_path, mode, target_date=None):
         raise e
 
 def get_fund_summary_info(fund_code):
-    """获取基金的简要信息"""
-    try:
-        csv_path = os.path.join(HOLDINGS_FOLDER, f"{fund_code}.csv")
-        if not os.path.exists(csv_path):
-            return None
-        
-        holdings_df = pd.read_csv(csv_path, dtype={'证券代码': str})
-        holdings_count = len(holdings_df)
-        
-        # 计算权重分布
-        if '占基金资产净值比例(%)' in holdings_df.columns:
-            holdings_df['占基金资产净值比例(%)'] = pd.to_numeric(holdings_df['占基金资产净值比例(%)'], errors='coerce')
-            total_weight = holdings_df['占基金资产净值比例(%)'].sum()
-        else:
-            total_weight = 0
-        
-        return {
-            'holdings_count': holdings_count,
-            'total_weight': total_weight / 100.0 if total_weight > 0 else 0,
-            'last_updated': datetime.fromtimestamp(os.path.getmtime(csv_path)).strftime('%Y-%m-%d')
-        }
-        
-    except Exception:
-        return None
\ No newline at end of file
+    """获取基金的简要信息 (按持仓文件状态缓存)"""
+    return fund_summary(os.path.join(HOLDINGS_FOLDER, f"{fund_code}.csv"))
@@ -1,9 +1,7 @@
 import json
 import datetime
 import re
-import urllib.request
-import urllib.parse
-from urllib.error import URLError, HTTPError
+import http_client
 
 def fetch_fund_info_from_eastmoney(fund_code):
     """从天天基金网获取基金信息"""
@@ -11,12 +9,9 @@ def fetch_fund_info_from_eastmoney(fund_code):
         # 天天基金API
         url = f"http://fundgz.1234567.com.cn/js/{fund_code}.js"
 
-        # 设置请求头
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-
-        with urllib.request.urlopen(req, timeout=10) as response:
-            content = response.read().decode('utf-8')
+        response = http_client.get(url, timeout=10)
+        response.raise_for_status()
+        content = response.content.decode('utf-8')
 
         # 解析JSONP格式数据
         # 格式: jsonpgz({"fundcode":"007455","name":"华夏中证5G通信主题ETF联接A",...})
@@ -44,11 +39,9 @@ def fetch_fund_info_from_sina(fund_code):
         # 新浪财经基金API
         url = f"http://hq.sinajs.cn/list=fu_{fund_code}"
 
-        req = urllib.request.Request(url)
-        req.add_header('User-Agent', 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36')
-
-        with urllib.request.urlopen(req, timeout=10) as response:
-            content = response.read().decode('gbk')
+        response = http_client.get(url, timeout=10)
+        response.raise_for_status()
+        content = response.content.decode('gbk')
 
         # 解析新浪财经数据格式
         # 格式: var hq_str_fu_007455="华夏中证5G通信主题ETF联接A,1.2345,1.2500,0.0155,1.25,2023-09-26";
@@ -1,247 +1,377 @@
 # fund_estimator.py (最终版 v8 - 全球化时间逻辑)
 
+import numpy as np
 import pandas as pd
 import yfinance as yf
 import datetime
 import pytz
 import warnings
-import requests
+import http_client
+import rate_limiter
 import re
 import sys
 import os
-import json
-from collections import defaultdict
+import time
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
+from quote_cache import quote_cache, LRUCache
+from quote_engine import fetch_hedged_groups
+from source_health import source_health
+from quote_history import get_quote_history
+from fund_metadata import get_fund_metadata_cache
+from holdings_store import load_holdings
+from quote_parser import parse_sina, parse_tencent
+from request_chunker import fetch_chunked
+import metrics
+from metrics import timed_stage, record_source
+from ticker_symbology import lookup, record_for_ticker, symbols_for
+from market_calendar import calculation_mode, market_statuses, ticker_status
+
 warnings.simplefilter(action='ignore', category=FutureWarning)
 
 HOLDINGS_FOLDER = 'fund_holdings'
+WEIGHT_COL = '占基金资产净值比例(%)'
+REQUIRED_COLS = ['公司名称', '证券代码', WEIGHT_COL]
+QUERY_STATUSES = ("open", "closed_today", "active_day", "lunch_break")  # 需要查询行情的市场状态 (休市日 holiday 不查询)
+# 设置 QUOTE_DISABLE_YAHOO=1 时实时行情只使用Sina/Tencent (离线基准测试/本地模拟器环境)
+YAHOO_ENABLED = os.environ.get('QUOTE_DISABLE_YAHOO', '0') != '1'
+YAHOO_HOST = 'query1.finance.yahoo.com'
+REVIEW_WINDOW_DAYS = 10  # 回顾模式向前取的自然日数，保证窗口内至少有两个交易日
+HISTORY_EMPTY_TTL = 600  # Yahoo对某只股票返回空数据后，同一日期窗口在该时间(秒)内不重复拉取
+_empty_history = LRUCache(4096, HISTORY_EMPTY_TTL)  # {(股票代码, 起始日期, 结束日期): True}
+
+# 时区对象只创建一次，避免每只股票都重新构造
+_TZ_US_EASTERN = pytz.timezone('US/Eastern')
+
+metrics.register_gauge('fund_estimator_quote_cache_entries', '全局行情缓存条目数', lambda: {(): quote_cache.stats()['entries']})
+metrics.register_gauge(
+    'fund_estimator_http_pool', '上游HTTP连接池统计', labelnames=['stat'],
+    fn=lambda: {(k,): v for k, v in http_client.get_stats().items()}
+)
+metrics.register_gauge(
+    'fund_estimator_source_circuit_open', '数据源熔断状态(1为熔断中/半开探测中)', labelnames=['source'],
+    fn=lambda: {(name,): int(s['state'] != 'closed') for name, s in source_health.snapshot().items()}
+)
+metrics.register_gauge(
+    'fund_estimator_host_rate_limit', '各上游主机当前限流速率(次/秒)', labelnames=['host'],
+    fn=lambda: {(host,): rate for host, rate in rate_limiter.get_rates().items()}
+)
 
 def determine_calculation_mode():
     """
-    重构为全球化时间逻辑：
+    重构为全球化时间逻辑 (规则见 market_calendar.calculation_mode)：
     - 全球交易日的结束以美股收盘为准 (约北京时间次日凌晨5点)。
     - PREVIOUS_DAY模式仅在“全球静默期”(北京时间 05:00-09:30)及周末运行。
     """
-    tz = pytz.timezone('Asia/Shanghai')
-    now_beijing = datetime.datetime.now(tz)
-    
-    # 周末总是回顾模式
-    if now_beijing.weekday() >= 5:
-        return 'PREVIOUS_DAY'
-    
-    # 周一至周五的“全球静默期”(美股收盘后，A股开盘前)
-    is_recap_window = (datetime.time(5, 0) <= now_beijing.time() < datetime.time(9, 30))
-    if is_recap_window:
-        return 'PREVIOUS_DAY'
-        
-    # 其他所有时间，都属于某个交易日的“当天”范畴
-    return 'CURRENT_DAY'
-
-def get_market_status(ticker):
-    """根据股票代码判断市场状态，增加午间休市判断"""
-    now_utc = datetime.datetime.now(pytz.utc)
-    # 美股市场
-    if ticker.isalpha() or '.' not in ticker:
-        tz = pytz.timezone('US/Eastern')
-        market_time = now_utc.astimezone(tz)
-        if (datetime.time(9, 30) <= market_time.time() <= datetime.time(16, 0)) and market_time.weekday() < 5: return "open"
-        return "closed"
-    # A股、港股、北交所
-    if ticker.endswith(('.SS', '.SZ', '.HK', '.BJ')):
-        tz = pytz.timezone('Asia/Shanghai')
-        market_time = now_utc.astimezone(tz)
-        if market_time.weekday() >= 5: return "closed"
-        
-        time_now = market_time.time()
-        is_morning = (datetime.time(9, 30) <= time_now <= datetime.time(11, 30))
-        is_afternoon = (datetime.time(13, 0) <= time_now <= datetime.time(15, 0))
-        is_lunch_break = (datetime.time(11, 30) < time_now < datetime.time(13, 0))
-
-        if is_morning or is_afternoon: return "open"
-        if is_lunch_break: return "lunch_break"
-        if time_now > datetime.time(15, 0): return "closed_today"
-        if time_now >= datetime.time(9, 30): return "active_day"
-        return "closed"
-    return "unknown"
+    return calculation_mode()
+
+def get_market_status(ticker, statuses=None):
+    """
+    股票所在交易所的当前状态 (查预计算的交易所日历，含节假日休市、半日市、港股午休)
+    批量判断时传入一次 market_statuses() 的结果，避免逐只股票重复计算
+    """
+    return ticker_status(ticker, statuses)
 
 def smart_ticker_converter(stock_code):
-    stock_code = str(stock_code).strip().upper()
-    if ' US' in stock_code: return stock_code.replace(' US', '').strip()
-    if ' HK' in stock_code: return f"{stock_code.replace(' HK', '').strip().zfill(5)}.HK"
-    if ' CH' in stock_code: stock_code = stock_code.replace(' CH', '').strip()
-    if stock_code.isdigit() and len(stock_code) == 6:
-        if stock_code.startswith(('8', '4', '9')):
-            return f"{stock_code}.BJ"
-        return f"{stock_code}.SS" if stock_code.startswith('6') else f"{stock_code}.SZ"
-    if stock_code.isdigit() and len(stock_code) < 6: return f"{stock_code.zfill(5)}.HK"
-    if stock_code.isalpha(): return stock_code
-    return stock_code
+    """原始持仓代码 -> 规范代码 (规则见 ticker_symbology，结果全局缓存)"""
+    record = lookup(stock_code)
+    return record.ticker if record else ''
 
 def get_price_changes_from_sina(tickers_list):
     if not tickers_list: return {}, []
     print(f"\n--- 启动二级引擎(Sina)：查询 {len(tickers_list)} 只股票 ---")
-    sina_tickers_map = {
-        f"sh{t.replace('.SS', '')}" if t.endswith('.SS') else
-        f"sz{t.replace('.SZ', '')}" if t.endswith('.SZ') else
-        f"hk{t.replace('.HK', '')}" if t.endswith('.HK') else
-        f"bj{t.replace('.BJ', '')}" if t.endswith('.BJ') else
-        f"gb_{t.lower()}": t for t in tickers_list
-    }
-    url = f"https://hq.sinajs.cn/list={','.join(sina_tickers_map.keys())}"
+    sina_tickers_map = symbols_for(tickers_list, 'sina')
     headers = {'User-Agent': 'Mozilla/5.0', 'Referer': 'https://finance.sina.com.cn/'}
-    try:
-        r = requests.get(url, headers=headers, timeout=15); r.encoding = 'gbk'
+    started = time.perf_counter()
+
+    def fetch(url):
+        r = http_client.get(url, headers=headers, timeout=15)
         r.raise_for_status()
-        changes, found_tickers = {}, set()
-        for res in r.text.split(';'):
-            if len(res) < 20 or '=""' in res: continue
-            match = re.search(r'var hq_str_([^=]+)="([^"]+)"', res)
-            if not match: continue
-            sina_ticker, data_str = match.groups()
-            original_ticker = sina_tickers_map.get(sina_ticker)
-            if not original_ticker: continue
-            data = data_str.split(',')
-            try:
-                change = None
-                if sina_ticker.startswith('gb_') and len(data) > 26:
-                    latest, prev_close = float(data[1]), float(data[26])
-                    if prev_close == 0 and len(data) > 7: prev_close = float(data[7])
-                    if prev_close != 0: change = (latest - prev_close) / prev_close
-                elif sina_ticker.startswith('hk') and len(data) > 8:
-                    latest, prev_close = float(data[6]), float(data[3])
-                    if prev_close != 0: change = (latest - prev_close) / prev_close
-                elif sina_ticker.startswith(('sh', 'sz', 'bj')) and len(data) > 3:
-                    latest, prev_close = float(data[3]), float(data[2])
-                    if prev_close != 0: change = (latest - prev_close) / prev_close
-                if change is not None:
-                    changes[original_ticker] = change; found_tickers.add(original_ticker)
-            except (ValueError, IndexError): continue
-        still_failed = [t for t in tickers_list if t not in found_tickers]
-        print(f"--- 二级引擎(Sina)完成：成功 {len(found_tickers)}，失败 {len(still_failed)} ---")
-        return changes, still_failed
-    except Exception as e:
-        print(f"二级引擎(Sina)出错: {e}"); return {}, tickers_list
+        return parse_sina(r.content, sina_tickers_map)
+
+    # 按URL长度分组并发查询，某一组出错不影响其他组
+    changes, errored = fetch_chunked("https://hq.sinajs.cn/list=", sina_tickers_map.keys(), fetch)
+    errored = {sina_tickers_map[s] for s in errored}
+    still_failed = [t for t in tickers_list if t not in changes]
+    print(f"--- 二级引擎(Sina)完成：成功 {len(changes)}，失败 {len(still_failed)} ---")
+    record_source('Sina', hits=len(changes), misses=len(still_failed) - len(errored), failures=len(errored),
+                  seconds=time.perf_counter() - started)
+    return changes, still_failed
 
 def get_price_changes_from_tencent(tickers_list):
     if not tickers_list: return {}, []
     print(f"\n--- 启动三级引擎(Tencent)：查询 {len(tickers_list)} 只股票 ---")
-    tencent_tickers_map = {
-        f"sh{t.replace('.SS', '')}" if t.endswith('.SS') else
-        f"sz{t.replace('.SZ', '')}" if t.endswith('.SZ') else
-        f"hk{t.replace('.HK', '')}" if t.endswith('.HK') else
-        f"bj{t.replace('.BJ', '')}" if t.endswith('.BJ') else
-        f"us{t.upper()}": t for t in tickers_list
-    }
-    url = f"http://qt.gtimg.cn/q={','.join(tencent_tickers_map.keys())}"
-    try:
-        r = requests.get(url, timeout=15); r.raise_for_status()
-        changes, found_tickers = {}, set()
-        for res in r.text.split(';'):
-            if len(res) < 20 or '~""~' in res: continue
-            match = re.search(r'v_([^=]+)="([^"]+)"', res)
-            if not match: continue
-            tencent_ticker, data_str = match.groups()
-            original_ticker = tencent_tickers_map.get(tencent_ticker)
-            if not original_ticker: continue
-            data = data_str.split('~')
-            try:
-                change = None
-                if len(data) > 4 and data[3] and data[4]:
-                    latest, prev_close = float(data[3]), float(data[4])
-                    if prev_close != 0: change = (latest - prev_close) / prev_close
-                if change is not None:
-                    changes[original_ticker] = change; found_tickers.add(original_ticker)
-            except (ValueError, IndexError): continue
-        still_failed = [t for t in tickers_list if t not in found_tickers]
-        print(f"--- 三级引擎(Tencent)完成：成功 {len(found_tickers)}，失败 {len(still_failed)} ---")
-        return changes, still_failed
-    except Exception as e:
-        print(f"三级引擎(Tencent)出错: {e}"); return {}, tickers_list
+    tencent_tickers_map = symbols_for(tickers_list, 'tencent')
+    started = time.perf_counter()
 
-def get_stock_price_changes(ticker_map, mode, target_date=None):
-    tickers_to_fetch = list(set(ticker_map.values()))
-    if not tickers_to_fetch: return {}
-    
+    def fetch(url):
+        r = http_client.get(url, timeout=15); r.raise_for_status()
+        return parse_tencent(r.content, tencent_tickers_map)
+
+    changes, errored = fetch_chunked("http://qt.gtimg.cn/q=", tencent_tickers_map.keys(), fetch)
+    errored = {tencent_tickers_map[s] for s in errored}
+    still_failed = [t for t in tickers_list if t not in changes]
+    print(f"--- 三级引擎(Tencent)完成：成功 {len(changes)}，失败 {len(still_failed)} ---")
+    record_source('Tencent', hits=len(changes), misses=len(still_failed) - len(errored), failures=len(errored),
+                  seconds=time.perf_counter() - started)
+    return changes, still_failed
+
+def get_price_changes_from_yahoo(tickers_list, mode, target_date=None):
+    if not tickers_list: return {}, []
     if mode == 'REVIEW_MODE' and target_date:
-        # 回顾模式：获取指定日期前后几天的数据
-        target_dt = datetime.datetime.strptime(target_date, '%Y-%m-%d')
-        end_date = target_dt + datetime.timedelta(days=1)
-        start_date = target_dt - datetime.timedelta(days=10)  # 多获取几天数据确保有足够的交易日
-        print(f"\n--- 启动主引擎(Yahoo)：查询 {len(tickers_to_fetch)} 只股票在 {target_date} 的数据 ---")
-        data = yf.download(tickers_to_fetch, start=start_date.strftime('%Y-%m-%d'), 
-                          end=end_date.strftime('%Y-%m-%d'), progress=True, group_by='ticker', timeout=10)
-    else:
-        period = "3d" if mode == 'PREVIOUS_DAY' else "2d"
-        print(f"\n--- 启动主引擎(Yahoo)：查询 {len(tickers_to_fetch)} 只股票 ---")
-        data = yf.download(tickers_to_fetch, period=period, progress=True, group_by='ticker', timeout=10)
+        return get_review_changes_from_history(tickers_list, target_date)
+    started = time.perf_counter()
+    # yfinance 不经过 http_client，这里手动取限流令牌；整批都没有数据视为被限流
+    rate_limiter.acquire(YAHOO_HOST)
+    period = "3d" if mode == 'PREVIOUS_DAY' else "2d"
+    print(f"\n--- 启动主引擎(Yahoo)：查询 {len(tickers_list)} 只股票 ---")
+    data = yf.download(tickers_list, period=period, progress=True, group_by='ticker', timeout=10)
+    rate_limiter.record(YAHOO_HOST, timed_out=data.empty)
     
     changes, failed_yahoo = {}, []
-    for ticker in tickers_to_fetch:
+    for ticker in tickers_list:
         try:
-            stock_data = data.get(ticker)
-            if stock_data is not None and not stock_data.empty and 'Close' in stock_data.columns and not stock_data['Close'].isnull().all():
-                valid_closes = stock_data['Close'].dropna()
-                if len(valid_closes) < 2: failed_yahoo.append(ticker); continue
-                
-                if mode == 'REVIEW_MODE' and target_date:
-                    # 找到目标日期或最接近的交易日
-                    target_dt = datetime.datetime.strptime(target_date, '%Y-%m-%d').date()
-                    available_dates = [d.date() for d in valid_closes.index]
-                    
-                    # 找到目标日期当天或之前最近的交易日
-                    target_trade_date = None
-                    prev_trade_date = None
-                    
-                    for date in sorted(available_dates):
-                        if date <= target_dt:
-                            if target_trade_date is None or date > target_trade_date:
-                                prev_trade_date = target_trade_date
-                                target_trade_date = date
-                    
-                    if target_trade_date and prev_trade_date:
-                        target_price = valid_closes[valid_closes.index.date == target_trade_date].iloc[-1]
-                        prev_price = valid_closes[valid_closes.index.date == prev_trade_date].iloc[-1]
-                        if pd.notna(prev_price) and pd.notna(target_price) and prev_price != 0:
-                            changes[ticker] = (target_price - prev_price) / prev_price
-                        else: failed_yahoo.append(ticker)
-                    else: failed_yahoo.append(ticker)
-                else:
-                    prev_close, latest_price = valid_closes.iloc[-2], valid_closes.iloc[-1]
-                    if pd.notna(prev_close) and pd.notna(latest_price) and prev_close != 0:
-                        changes[ticker] = (latest_price - prev_close) / prev_close
-                    else: failed_yahoo.append(ticker)
+            valid_closes = _valid_closes(data, ticker)
+            if valid_closes is None or len(valid_closes) < 2: failed_yahoo.append(ticker); continue
+            prev_close, latest_price = valid_closes.iloc[-2], valid_closes.iloc[-1]
+            if pd.notna(prev_close) and pd.notna(latest_price) and prev_close != 0:
+                changes[ticker] = (latest_price - prev_close) / prev_close
             else: failed_yahoo.append(ticker)
         except (KeyError, IndexError): failed_yahoo.append(ticker)
     print(f"--- 主引擎(Yahoo)完成：成功 {len(changes)}，失败 {len(failed_yahoo)} ---")
+    record_source('Yahoo', hits=len(changes), misses=len(failed_yahoo), seconds=time.perf_counter() - started)
+    return changes, failed_yahoo
+
+def _valid_closes(data, ticker):
+    """从 yf.download(group_by='ticker') 的结果中取出某只股票去掉空值的收盘价序列，没有数据时返回None"""
+    stock_data = data.get(ticker)
+    if stock_data is None or stock_data.empty or 'Close' not in stock_data.columns:
+        return None
+    valid_closes = stock_data['Close'].dropna()
+    return valid_closes if len(valid_closes) else None
+
+def backfill_history(tickers_list, start, end):
+    """
+    从Yahoo拉取 [start, end] 的日线收盘价写入本地历史库，返回写入了收盘价的股票数
+    只把所有市场都已收盘的日期(美东时间的昨天及以前)标记为已覆盖，当天收盘价可能还会变化；
+    批次中没有返回有效收盘价的股票 (单只股票404/限流/超时) 不标记覆盖，只短期记入负缓存，之后重新拉取
+    """
+    if not tickers_list: return 0
+    rate_limiter.acquire(YAHOO_HOST)
+    data = yf.download(tickers_list, start=start.isoformat(), end=(end + datetime.timedelta(days=1)).isoformat(),
+                       progress=False, group_by='ticker', timeout=10)
+    rate_limiter.record(YAHOO_HOST, timed_out=data.empty)
+    if data.empty:
+        return 0  # 整批失败(网络/限流)，不标记覆盖，下次重新拉取
+    closes = {}
+    for ticker in tickers_list:
+        valid_closes = _valid_closes(data, ticker)
+        if valid_closes is not None:
+            closes[ticker] = [(d.date().isoformat(), c) for d, c in valid_closes.items()]
+        else:
+            _empty_history.put((ticker, start, end), True)
+    covered_end = min(end, datetime.datetime.now(_TZ_US_EASTERN).date() - datetime.timedelta(days=1))
+    get_quote_history().store(closes, start, covered_end)
+    return len(closes)
+
+def get_review_changes_from_history(tickers_list, target_date):
+    """
+    回顾模式：target_date 当天(或之前最近交易日)相对前一交易日的涨跌幅。
+    优先读本地历史库，只有未覆盖该日期窗口的股票才向Yahoo补齐；同一日期的重复回顾不访问网络。
+    """
+    started = time.perf_counter()
+    history = get_quote_history()
+    target_dt = datetime.datetime.strptime(target_date, '%Y-%m-%d').date()
+    start_dt = target_dt - datetime.timedelta(days=REVIEW_WINDOW_DAYS)  # 多获取几天数据确保有足够的交易日
+    missing = [t for t in history.uncovered(tickers_list, start_dt, target_dt) if not _empty_history.get((t, start_dt, target_dt))]
+    if missing:
+        print(f"\n--- 启动主引擎(Yahoo)：补齐 {len(missing)} 只股票在 {target_date} 前后的历史数据 ---")
+        backfill_history(missing, start_dt, target_dt)
+    else:
+        print(f"\n--- 历史收盘价全部命中本地库 ({len(tickers_list)} 只) ---")
+
+    changes, failed = {}, []
+    for ticker in tickers_list:
+        pair = history.close_pair(ticker, target_dt)
+        if pair and pair[1] != 0:
+            changes[ticker] = (pair[0] - pair[1]) / pair[1]
+        else:
+            failed.append(ticker)
+    print(f"--- 回顾模式完成：成功 {len(changes)}，失败 {len(failed)} ---")
+    record_source('history', hits=len(changes), misses=len(failed), seconds=time.perf_counter() - started)
+    return changes, failed
+
+# 各数据源的半开探测函数在模块加载时注册一次 (探测按实时模式查询)
+source_health.register('Sina', get_price_changes_from_sina)
+source_health.register('Tencent', get_price_changes_from_tencent)
+if YAHOO_ENABLED:
+    source_health.register('Yahoo', lambda tickers: get_price_changes_from_yahoo(tickers, 'CURRENT_DAY'))
+
+@timed_stage('quote_fetch')
+def fetch_price_changes(tickers, mode, target_date=None):
+    """
+    向上游查询一批股票的涨跌幅并写入全局行情缓存，不读取缓存。
+    同一只股票已有其他请求在途查询时不重复发起，等待其结果 (single-flight)。
+    返回 (changes, failed)，failed 为所有数据源均查询失败的股票。
+    """
+    cache_date = target_date if mode == 'REVIEW_MODE' else None
+    owned, waiting = quote_cache.claim(tickers, mode, cache_date)
+    changes, failed_all = {}, []
+    try:
+        if owned and mode == 'REVIEW_MODE':
+            # 回顾模式下只使用Yahoo历史数据，不使用备用数据源
+            changes, failed_all = get_price_changes_from_yahoo(owned, mode, target_date)
+        elif owned:
+            # 实时模式：按市场依据近期健康度排列数据源，熔断中的数据源直接跳过；
+            # 首个数据源超过对冲时间未返回则并发启动下一个，每只股票取最先返回的有效结果
+            sources = {
+                'Yahoo': source_health.instrument('Yahoo', lambda tickers: get_price_changes_from_yahoo(tickers, mode)),
+                'Sina': source_health.instrument('Sina', get_price_changes_from_sina),
+                'Tencent': source_health.instrument('Tencent', get_price_changes_from_tencent),
+            }
+            if not YAHOO_ENABLED:
+                del sources['Yahoo']
+            groups, unavailable = source_health.plan(list(sources), owned)
+            if unavailable:
+                print(f"--- {len(unavailable)} 只股票的所有数据源均在熔断中，跳过查询 ---")
+            changes, failed_all = fetch_hedged_groups(
+                [([(name, sources[name]) for name in order], tickers) for order, tickers in groups]
+            )
+            failed_all = failed_all + sorted(unavailable)
+
+        # 只缓存真实查询到的行情，查询失败按0%计算的不写入缓存
+        statuses = market_statuses()
+        for ticker, change in changes.items():
+            quote_cache.put(ticker, change, mode, cache_date, get_market_status(ticker, statuses))
+    finally:
+        quote_cache.release(owned, mode, cache_date)
+
+    if waiting:
+        print(f"--- {len(waiting)} 只股票已有其他请求在查询，等待其结果 ---")
+        joined, joined_failed = quote_cache.wait_for(waiting, mode, cache_date)
+        changes.update(joined)
+        failed_all = list(failed_all) + joined_failed
+    return changes, failed_all
+
+def get_stock_price_changes(ticker_map, mode, target_date=None):
+    all_tickers = list(set(ticker_map.values()))
+    if not all_tickers: return {}
+    ticker_to_name = {v: k for k, v in ticker_map.items()}
+
+    # 先查全局行情缓存，只向上游查询未命中的股票
+    cache_date = target_date if mode == 'REVIEW_MODE' else None
+    cached_changes, tickers_to_fetch = quote_cache.get_many(all_tickers, mode, cache_date)
+    record_source('cache', hits=len(cached_changes), misses=len(tickers_to_fetch))
+    if cached_changes:
+        print(f"\n--- 行情缓存命中 {len(cached_changes)} 只，需查询 {len(tickers_to_fetch)} 只 ---")
+    if not tickers_to_fetch:
+        return {ticker_to_name.get(k): v for k, v in cached_changes.items() if ticker_to_name.get(k)}
     
-    if failed_yahoo and mode != 'REVIEW_MODE':  # 回顾模式下不使用备用数据源
-        sina_changes, failed_sina = get_price_changes_from_sina(failed_yahoo)
-        changes.update(sina_changes)
-        if failed_sina:
-            tencent_changes, failed_tencent = get_price_changes_from_tencent(failed_sina)
-            changes.update(tencent_changes)
-            if failed_tencent:
-                print("\n--- 警告：以下股票在所有数据源均查询失败，可能已停牌或退市，按涨跌幅 0% 计算 ---")
-                for ticker in failed_tencent:
-                    name = next((k for k, v in ticker_map.items() if v == ticker), "N/A")
-                    print(f"  [i] {name[:15]:<16s} ({ticker})")
-                    changes[ticker] = 0.0
-    elif failed_yahoo and mode == 'REVIEW_MODE':
+    changes, failed_all = fetch_price_changes(tickers_to_fetch, mode, target_date)
+    if failed_all and mode == 'REVIEW_MODE':
         print("\n--- 警告：以下股票在回顾模式下查询失败，按涨跌幅 0% 计算 ---")
-        for ticker in failed_yahoo:
-            name = next((k for k, v in ticker_map.items() if v == ticker), "N/A")
-            print(f"  [i] {name[:15]:<16s} ({ticker})")
-            changes[ticker] = 0.0
+    elif failed_all:
+        print("\n--- 警告：以下股票在所有数据源均查询失败，可能已停牌或退市，按涨跌幅 0% 计算 ---")
+    for ticker in failed_all:
+        print(f"  [i] {ticker_to_name.get(ticker, 'N/A')[:15]:<16s} ({ticker})")
+        changes[ticker] = 0.0
+    changes.update(cached_changes)
     
-    ticker_to_name = {v: k for k, v in ticker_map.items()}
     return {ticker_to_name.get(k): v for k, v in changes.items() if ticker_to_name.get(k)}
 
 def get_market_type_from_ticker(ticker):
-    if ticker.endswith(('.SS', '.SZ', '.BJ')): return 'A股'
-    if ticker.endswith('.HK'): return '港股'
-    if ticker.isalpha() or '.' not in ticker: return '美股'
-    return '其他'
+    return record_for_ticker(ticker).market
+
+@timed_stage('csv_read')
+def read_holdings_csv(csv_path):
+    """
+    读取并校验持仓CSV，返回 (权重有效的持仓表, 原始行数, 原始权重合计%)
+    缺少必要的列时抛出ValueError
+    """
+    holdings_df = pd.read_csv(csv_path, dtype={'证券代码': str})
+    holdings_df.columns = holdings_df.columns.str.strip()
+    if not all(col in holdings_df.columns for col in REQUIRED_COLS):
+        raise ValueError(f"CSV文件缺少必要的列: {REQUIRED_COLS}")
+    holdings_df[WEIGHT_COL] = pd.to_numeric(holdings_df[WEIGHT_COL], errors='coerce')
+    raw_rows, raw_weight = len(holdings_df), float(holdings_df[WEIGHT_COL].sum())
+    return holdings_df.dropna(subset=[WEIGHT_COL]), raw_rows, raw_weight
+
+@timed_stage('ticker_conversion')
+def compile_holdings_frame(holdings_df):
+    """
+    将持仓表整理为与时间无关的静态列：name, code, weight(小数), ticker, market。
+    按公司名称去重：与原实现一致，权重取第一条记录，证券代码取最后一条记录 (原实现的 名称->代码 字典后者覆盖前者)；
+    代码转换按不重复代码各做一次。
+    """
+    frame = pd.DataFrame({
+        'name': holdings_df['公司名称'].astype(str).str.strip().to_numpy(),
+        'code': holdings_df['证券代码'].fillna('').astype(str).str.strip().to_numpy(),
+        'weight': holdings_df[WEIGHT_COL].to_numpy(dtype=float) / 100.0,
+    })
+    last_code = frame.drop_duplicates(subset='name', keep='last').set_index('name')['code']
+    frame = frame.drop_duplicates(subset='name', keep='first', ignore_index=True)
+    frame['code'] = frame['name'].map(last_code)
+
+    ticker_of = {code: smart_ticker_converter(code) for code in frame['code'].unique()}
+    frame['ticker'] = frame['code'].map(ticker_of)
+    market_of = {ticker: get_market_type_from_ticker(ticker) for ticker in frame['ticker'].unique()}
+    frame['market'] = frame['ticker'].map(market_of)
+    return frame
+
+@timed_stage('market_status')
+def attach_market_status(frame):
+    """补充status列，每个市场只判断一次 (同一市场内所有股票状态相同，沪深北三所共用同一日历)"""
+    statuses = market_statuses()
+    first_ticker = frame.drop_duplicates(subset='market').set_index('market')['ticker']
+    frame['status'] = frame['market'].map({market: get_market_status(t, statuses) for market, t in first_ticker.items()})
+    return frame
+
+def build_holdings_frame(holdings_df):
+    """将持仓表整理为估值所需的列：name, code, weight, ticker, market, status"""
+    return attach_market_status(compile_holdings_frame(holdings_df))
+
+def active_holdings_mask(frame, realtime, count_all):
+    """
+    参与估值计算的持仓：
+    - count_all (回顾/上一交易日模式): 全部持仓
+    - realtime (实时模式): 市场处于可查询状态的持仓
+    """
+    if count_all:
+        return np.ones(len(frame), dtype=bool)
+    if realtime:
+        return frame['status'].isin(QUERY_STATUSES).to_numpy()
+    return np.zeros(len(frame), dtype=bool)
+
+@timed_stage('valuation')
+def value_holdings(frame, stock_changes, active):
+    """
+    向量化计算基金加权涨跌幅。
+    stock_changes: {公司名称: 涨跌幅}；active: 每条持仓是否参与计算
+    返回各项权重汇总以及逐条持仓的涨跌幅 (未参与或查询失败为None)
+    """
+    weights = frame['weight'].to_numpy()
+    markets = frame['market'].to_numpy()
+    changes = frame['name'].map(stock_changes).to_numpy(dtype=float)
+    has_change = ~np.isnan(changes)
+    calc = active & has_change
+    failed = active & ~has_change
+
+    def weight_by_market(mask):
+        if not mask.any():
+            return {}
+        grouped = pd.Series(weights[mask]).groupby(markets[mask]).sum()
+        return {market: float(weight) for market, weight in grouped.items()}
+
+    found = frame['name'].isin(stock_changes.keys()).to_numpy()
+    return {
+        'total_change': float(np.dot(weights[calc], changes[calc])),
+        'total_weight': float(weights.sum()),
+        'calc_weight': weight_by_market(calc),
+        'failed_weight': weight_by_market(failed),
+        'inactive_weight': weight_by_market(~active),
+        'success_count': int(calc.sum()),
+        'changes': np.where(active & found, changes, None),
+    }
 
 def estimate_fund_change_from_csv(csv_path, user_mode=None, target_date=None):
     if user_mode is None:
@@ -258,18 +388,11 @@ def estimate_fund_change_from_csv(csv_path, user_mode=None, target_date=None):
             mode = user_mode
             print(f"--- 估算模式: {mode} ---")
     try:
-        holdings_df = pd.read_csv(csv_path, dtype={'证券代码': str})
-        holdings_df.columns = holdings_df.columns.str.strip()
-        required_cols = ['公司名称', '证券代码', '占基金资产净值比例(%)']
-        if not all(col in holdings_df.columns for col in required_cols):
-            print(f"错误: CSV文件 '{os.path.basename(csv_path)}' 缺少必要的列: {required_cols}")
-            return
-        weight_col = '占基金资产净值比例(%)'
-        holdings_df[weight_col] = pd.to_numeric(holdings_df[weight_col], errors='coerce')
-        original_rows = len(holdings_df)
-        holdings_df.dropna(subset=[weight_col], inplace=True)
-        if len(holdings_df) < original_rows:
-            print(f"--- 警告：移除了 {original_rows - len(holdings_df)} 行持仓占比数据无效的记录 ---")
+        holdings = load_holdings(csv_path)
+        if holdings.dropped_rows:
+            print(f"--- 警告：移除了 {holdings.dropped_rows} 行持仓占比数据无效的记录 ---")
+    except ValueError as e:
+        print(f"错误: '{os.path.basename(csv_path)}' {e}"); return
     except FileNotFoundError:
         print(f"错误：在 '{HOLDINGS_FOLDER}' 文件夹下找不到 '{os.path.basename(csv_path)}' 文件。"); return
     except pd.errors.ParserError as e:
@@ -280,34 +403,20 @@ def estimate_fund_change_from_csv(csv_path, user_mode=None, target_date=None):
     except Exception as e:
         print(f"读取或处理CSV时发生未知错误: {e}"); return
 
-    ticker_map = {
-        str(row['公司名称']).strip(): smart_ticker_converter(str(row['证券代码']).strip()) 
-        for _, row in holdings_df.iterrows()
-    }
-    
-    unique_name_map = {}
-    processed_names = set()
-    unique_rows_list = []
-    for index, row in holdings_df.iterrows():
-        name = str(row['公司名称']).strip()
-        if name not in processed_names:
-            unique_name_map[name] = ticker_map[name]
-            processed_names.add(name)
-            unique_rows_list.append(row)
-
-    if len(unique_name_map) != len(holdings_df):
+    frame = attach_market_status(holdings.to_frame())
+    if holdings.duplicate_rows:
         print("\n--- 警告：CSV文件中存在重复的公司名称，将只使用第一条记录进行计算 ---")
-        holdings_df = pd.DataFrame(unique_rows_list)
+    unique_name_map = dict(zip(frame['name'], frame['ticker']))
 
-    active_ticker_map = {}
-    if user_mode == 'REALTIME_MODE' or (user_mode is None and mode == 'CURRENT_DAY'):
+    realtime = user_mode == 'REALTIME_MODE' or (user_mode is None and mode == 'CURRENT_DAY')
+    count_all = user_mode == 'REVIEW_MODE' or (user_mode is None and mode == 'PREVIOUS_DAY')
+    active = active_holdings_mask(frame, realtime, count_all)
+
+    if realtime:
         print("\n--- 市场状态分析 ---")
-        query_statuses = ["open", "closed_today", "active_day", "lunch_break"]
-        for name, ticker in unique_name_map.items():
-            status = get_market_status(ticker)
-            if status in query_statuses:
-                active_ticker_map[name] = ticker
-            print(f"{name[:15]:<16s} ({ticker:<10s}): 市场状态 {status:<12s}" + ("(加入查询)" if status in query_statuses else "(按0%计算)"))
+        for name, ticker, status, is_active in zip(frame['name'], frame['ticker'], frame['status'], active):
+            print(f"{name[:15]:<16s} ({ticker:<10s}): 市场状态 {status:<12s}" + ("(加入查询)" if is_active else "(按0%计算)"))
+        active_ticker_map = dict(zip(frame['name'][active], frame['ticker'][active]))
         stock_changes = get_stock_price_changes(active_ticker_map, mode if user_mode is None else 'CURRENT_DAY', target_date)
     elif user_mode == 'REVIEW_MODE':
         print(f"\n--- 回顾模式：查询 {target_date} 所有市场数据 ---")
@@ -316,29 +425,9 @@ def estimate_fund_change_from_csv(csv_path, user_mode=None, target_date=None):
         print("\n--- 所有市场均按上一个交易日收盘价计算 ---")
         stock_changes = get_stock_price_changes(unique_name_map, mode, target_date)
 
-    total_change, total_weight = 0.0, 0.0
-    calc_weight, failed_weight, inactive_weight = defaultdict(float), defaultdict(float), defaultdict(float)
-    
-    for _, row in holdings_df.iterrows():
-        name = str(row['公司名称']).strip()
-        weight = row['占基金资产净值比例(%)'] / 100.0
-        total_weight += weight
-        ticker = unique_name_map.get(name, "")
-        market = get_market_type_from_ticker(ticker)
-
-        status = get_market_status(ticker)
-        query_statuses = ["open", "closed_today", "active_day", "lunch_break"]
-        is_active_for_today = ((user_mode == 'REALTIME_MODE' or (user_mode is None and mode == 'CURRENT_DAY')) and status in query_statuses)
-        
-        if is_active_for_today or user_mode == 'REVIEW_MODE' or (user_mode is None and mode == 'PREVIOUS_DAY'):
-            change_pct = stock_changes.get(name)
-            if change_pct is not None and pd.notna(change_pct):
-                total_change += weight * change_pct
-                calc_weight[market] += weight
-            else:
-                failed_weight[market] += weight
-        else:
-            inactive_weight[market] += weight
+    valuation = value_holdings(frame, stock_changes, active)
+    total_change, total_weight = valuation['total_change'], valuation['total_weight']
+    calc_weight, failed_weight, inactive_weight = valuation['calc_weight'], valuation['failed_weight'], valuation['inactive_weight']
             
     estimated_change = total_change / total_weight if total_weight > 0 else 0
     update_time = datetime.datetime.now(pytz.timezone('Asia/Shanghai')).strftime('%Y-%m-%d %H:%M:%S')
@@ -403,18 +492,9 @@ def get_valid_date():
             continue
 
 def get_fund_name(fund_code):
-    try:
-        r = requests.get(f"http://fundgz.1234567.com.cn/js/{fund_code}.js", headers={'Referer': 'http://fund.eastmoney.com/'}, timeout=5)
-        name = json.loads(re.search(r'jsonpgz\((.*)\)', r.text).group(1)).get('name')
-        if name: return name
-    except Exception: pass
-    try:
-        r = requests.get(f"https://hq.sinajs.cn/list=f_{fund_code}", headers={'Referer': 'http://finance.sina.com.cn/'}, timeout=5)
-        r.encoding = 'gbk'
-        match = re.search(r'="([^"]+)"', r.text)
-        if match and match.group(1).split(',')[0]: return match.group(1).split(',')[0]
-    except Exception: pass
-    return "获取名称失败"
+    """基金名称 (经由持久化的基金元数据缓存，缓存没有时联网获取一次)"""
+    entry = get_fund_metadata_cache().get_or_fetch(fund_code)
+    return entry['name'] if entry and entry['name'] else "获取名称失败"
 
 if __name__ == '__main__':
     while True:
@@ -424,16 +504,26 @@ if __name__ == '__main__':
         print("\n--- 请选择估值模式 ---")
         print("[1] 实时估值模式 - 根据当前市场状态进行实时估算")
         print("[2] 回顾模式 - 查询指定日期的历史估值")
+        print("[3] 历史数据回填 - 批量下载持仓股票日线与基金净值到本地历史库")
         print("[q] 退出程序")
         print("-" * 60)
         
-        mode_choice = input("请选择模式 (1/2/q): ").strip().lower()
+        mode_choice = input("请选择模式 (1/2/3/q): ").strip().lower()
         if mode_choice == 'q':
             print("感谢使用！")
             break
         
+        if mode_choice == '3':
+            from history_backfill import run_backfill, DEFAULT_YEARS
+            years = input(f"请输入回填年数 (默认 {DEFAULT_YEARS}): ").strip()
+            try:
+                run_backfill(float(years) if years else DEFAULT_YEARS)
+            except ValueError:
+                print("无效的年数。")
+            continue
+        
         if mode_choice not in ['1', '2']:
-            print("无效的模式选择，请输入 1、2 或 q。")
+            print("无效的模式选择，请输入 1、2、3 或 q。")
             continue
         
         # 获取目标日期（回顾模式需要）
@@ -0,0 +1,84 @@
+# 基金列表 - /api/funds 的并发构建：名称走元数据缓存，缺失的在有界线程池中并发获取并设置整体时限；
+# 持仓摘要按文件状态(修改时间+大小)缓存，分页时只处理当前页的基金
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import datetime
+
+from fund_metadata import get_fund_metadata_cache, holdings_fund_codes
+from holdings_store import load_holdings
+
+LOOKUP_WORKERS = 32         # 缺失名称的并发查询线程数 (网络IO)
+SUMMARY_WORKERS = 4         # 持仓摘要的计算线程数 (首次需要编译持仓文件)
+NAME_LOOKUP_TIMEOUT = 3.0   # 等待缺失名称的最长时间(秒)，超时的基金先返回默认名称，查询在后台继续并写入缓存
+MAX_PAGE_SIZE = 500
+
+# 两个线程池分开：大量名称查询排队时不会拖慢摘要计算
+_lookup_executor = ThreadPoolExecutor(max_workers=LOOKUP_WORKERS, thread_name_prefix='fund-listing-lookup')
+_summary_executor = ThreadPoolExecutor(max_workers=SUMMARY_WORKERS, thread_name_prefix='fund-listing-summary')
+_summaries = {}  # 持仓文件路径 -> (文件状态, 摘要)
+_summaries_lock = threading.Lock()
+
+def fund_summary(csv_path):
+    """
+    持仓摘要 (持仓数、权重合计、更新日期)，按文件状态缓存；文件不存在或无法解析时返回None
+    持仓数据来自预编译的持仓结构，不重新解析CSV
+    """
+    try:
+        st = os.stat(csv_path)
+    except OSError:
+        return None
+    stat_key = (st.st_mtime_ns, st.st_size)
+    cached = _summaries.get(csv_path)
+    if cached is not None and cached[0] == stat_key:
+        return cached[1]
+    try:
+        holdings = load_holdings(csv_path)
+    except Exception:
+        return None
+    total_weight = holdings.raw_weight_sum
+    summary = {
+        'holdings_count': holdings.raw_row_count,
+        'total_weight': total_weight / 100.0 if total_weight > 0 else 0,
+        'last_updated': datetime.fromtimestamp(st.st_mtime).strftime('%Y-%m-%d')
+    }
+    with _summaries_lock:
+        _summaries[csv_path] = (stat_key, summary)
+    return summary
+
+def list_funds(folder, page=None, page_size=None):
+    """
+    构建基金列表：
+    - 未指定 page_size 时返回全部基金；否则按 page(从1开始) 分页，只查询当前页
+    - 名称缺失的基金并发查询，整体最多等待 NAME_LOOKUP_TIMEOUT 秒
+    返回 {'funds': [...], 'total', 'page', 'page_size'}
+    """
+    files = [f"{code}.csv" for code in holdings_fund_codes(folder)]
+    total = len(files)
+    if page_size:
+        page_size = max(1, min(int(page_size), MAX_PAGE_SIZE))
+        page = max(1, int(page or 1))
+        files = files[(page - 1) * page_size:page * page_size]
+    else:
+        page, page_size = 1, total
+
+    codes = [f.split('.')[0] for f in files]
+    cache = get_fund_metadata_cache()
+    # 过期条目由 get() 触发后台刷新，这里只等待完全缺失的
+    lookups = [_lookup_executor.submit(cache.get_or_fetch, code) for code in codes if cache.get(code) is None]
+    summaries = _summary_executor.map(fund_summary, [os.path.join(folder, f) for f in files])
+    if lookups:
+        wait(lookups, timeout=NAME_LOOKUP_TIMEOUT)
+
+    funds = []
+    for file, code, summary in zip(files, codes, summaries):
+        entry = cache.get(code)
+        funds.append({
+            'code': code,
+            'name': entry['name'] if entry and entry['name'] else f"基金{code}",
+            'category': entry['category'] if entry else None,
+            'nav_date': entry['nav_date'] if entry else None,
+            'file': file,
+            'summary': summary
+        })
+    return {'funds': funds, 'total': total, 'page': page, 'page_size': page_size}
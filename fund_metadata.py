@@ -0,0 +1,246 @@
+# 基金元数据缓存 - 基金名称、类型、最新净值日期持久化在本地 (SQLite)，带有效期；启动时批量并发预热
+# 过期条目仍直接返回，同时在后台刷新，请求线程不等待网络
+# 只依赖Python标准库，api/index.py (Vercel) 同样可以使用
+import json
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import http_client
+
+METADATA_PATH = os.environ.get('FUND_METADATA_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fund_metadata.sqlite'))
+METADATA_TTL = 86400      # 净值日期每个交易日变化，条目1天后过期
+WARMUP_WORKERS = 16
+FUND_LIST_URL = "http://fund.eastmoney.com/js/fundcode_search.js"
+FUND_LIST_MAX_AGE = 3600  # 全量基金列表在进程内的复用时间 (秒)，元数据预热与搜索索引共用一次下载
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fund_metadata (
+    code TEXT PRIMARY KEY,
+    name TEXT,
+    category TEXT,
+    nav_date TEXT,
+    source TEXT,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+"""
+_FIELDS = ('code', 'name', 'category', 'nav_date', 'source', 'updated_at')
+
+def fetch_fund_list(timeout=15):
+    """
+    下载天天基金的全量基金列表 (一次请求)，返回 {代码: (拼音缩写, 名称, 类型, 拼音全拼)}
+    原始格式: var r = [["000001","HXCZHH","华夏成长混合","混合型-灵活","HUAXIACHENGZHANGHUNHE"],...];
+    """
+    response = http_client.get(FUND_LIST_URL, headers={'Referer': 'http://fund.eastmoney.com/'}, timeout=timeout)
+    response.raise_for_status()
+    text = response.content.decode('utf-8-sig', errors='replace')
+    rows = json.loads(text[text.index('['):text.rindex(']') + 1])
+    return {row[0]: tuple(row[1:5]) for row in rows if len(row) >= 5}
+
+_fund_list = (0.0, None)  # (下载时间, 基金列表)
+_fund_list_lock = threading.Lock()
+
+def get_fund_list(max_age=FUND_LIST_MAX_AGE):
+    """全量基金列表，max_age 秒内复用上次下载的结果；并发调用只下载一次，下载失败抛出异常"""
+    global _fund_list
+    with _fund_list_lock:
+        fetched_at, fund_list = _fund_list
+        if fund_list is None or time.time() - fetched_at > max_age:
+            fund_list = fetch_fund_list()
+            _fund_list = (time.time(), fund_list)
+        return fund_list
+
+def fetch_fund_metadata(fund_code, timeout=5):
+    """从天天基金估值接口获取名称与最新净值日期，失败时尝试新浪；都失败返回None"""
+    try:
+        r = http_client.get(f"http://fundgz.1234567.com.cn/js/{fund_code}.js", headers={'Referer': 'http://fund.eastmoney.com/'}, timeout=timeout)
+        r.raise_for_status()
+        data = json.loads(re.search(r'jsonpgz\((.*)\)', r.text).group(1))
+        if data.get('name'):
+            return {'code': fund_code, 'name': data['name'], 'nav_date': data.get('jzrq'), 'source': '天天基金'}
+    except Exception: pass
+    try:
+        r = http_client.get(f"https://hq.sinajs.cn/list=f_{fund_code}", headers={'Referer': 'http://finance.sina.com.cn/'}, timeout=timeout)
+        r.encoding = 'gbk'
+        match = re.search(r'="([^"]+)"', r.text)
+        fields = match.group(1).split(',') if match else []
+        if fields and fields[0]:
+            nav_date = fields[4] if len(fields) > 4 and re.match(r'^\d{4}-\d{2}-\d{2}$', fields[4]) else None
+            return {'code': fund_code, 'name': fields[0], 'nav_date': nav_date, 'source': '新浪财经'}
+    except Exception: pass
+    return None
+
+class FundMetadataCache:
+    """
+    基金元数据缓存：内存字典 + SQLite持久化 (进程重启后直接可用)
+    - get(): 只读缓存，过期条目照常返回并触发后台刷新
+    - get_or_fetch(): 缓存没有时同步获取一次 (单只基金)
+    - warm(): 批量并发获取缺失/过期的基金，类型信息来自一次全量基金列表下载
+    """
+
+    def __init__(self, path=METADATA_PATH, ttl=METADATA_TTL):
+        self.ttl = ttl
+        self._conn, self.path = _connect(path)
+        self._lock = threading.Lock()
+        self._refreshing = set()       # 本轮正在刷新的基金
+        self._queued = set()           # 等待下一轮刷新的基金
+        self._refresh_running = False
+        with self._lock:
+            self._entries = {row[0]: dict(zip(_FIELDS, row)) for row in self._conn.execute(f"SELECT {', '.join(_FIELDS)} FROM fund_metadata")}
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'fetched': 0, 'failed': 0}
+
+    def _is_stale(self, entry, now=None):
+        return (now or time.time()) - entry['updated_at'] > self.ttl
+
+    def get(self, fund_code):
+        entry = self._entries.get(fund_code)
+        if entry is None:
+            self.stats['misses'] += 1
+            return None
+        self.stats['hits'] += 1
+        if self._is_stale(entry):
+            self.stats['stale'] += 1
+            self.refresh_async([fund_code])
+        return entry
+
+    def get_or_fetch(self, fund_code, timeout=5):
+        entry = self.get(fund_code)
+        if entry is not None:
+            return entry
+        meta = fetch_fund_metadata(fund_code, timeout)
+        if meta is None:
+            self.stats['failed'] += 1
+            return None
+        return self.put(meta)
+
+    def put(self, meta, category=None):
+        """写入一条元数据 (未提供的类型沿用已有值)，返回写入后的条目"""
+        previous = self._entries.get(meta['code']) or {}
+        entry = {
+            'code': meta['code'],
+            'name': meta.get('name') or previous.get('name'),
+            'category': category or meta.get('category') or previous.get('category'),
+            'nav_date': meta.get('nav_date') or previous.get('nav_date'),
+            'source': meta.get('source') or previous.get('source'),
+            'updated_at': time.time(),
+        }
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO fund_metadata ({', '.join(_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+                tuple(entry[f] for f in _FIELDS)
+            )
+            self._entries[entry['code']] = entry
+        self.stats['fetched'] += 1
+        return entry
+
+    def pending(self, fund_codes):
+        """缓存中缺失或已过期的基金"""
+        now = time.time()
+        return [c for c in dict.fromkeys(fund_codes) if c not in self._entries or self._is_stale(self._entries[c], now)]
+
+    def warm(self, fund_codes, workers=WARMUP_WORKERS):
+        """并发获取缺失/过期基金的元数据，返回成功数"""
+        codes = self.pending(fund_codes)
+        if not codes:
+            return 0
+        try:
+            fund_list = get_fund_list()
+        except Exception as e:
+            print(f"基金列表下载失败，类型信息暂缺: {e}")
+            fund_list = {}
+        with ThreadPoolExecutor(max_workers=min(workers, len(codes)), thread_name_prefix='fund-meta') as executor:
+            results = list(executor.map(fetch_fund_metadata, codes))
+        done = 0
+        for code, meta in zip(codes, results):
+            listed = fund_list.get(code)
+            if meta is None and listed:
+                meta = {'code': code, 'name': listed[1], 'source': '天天基金列表'}
+            if meta is None:
+                self.stats['failed'] += 1
+                continue
+            self.put(meta, category=listed[2] if listed else None)
+            done += 1
+        return done
+
+    def refresh_async(self, fund_codes):
+        """
+        后台刷新：待刷新的基金合并到同一个后台线程中批量预热，每一轮只下载一次基金列表
+        刷新进行中新加入的基金在下一轮处理；已在队列或正在刷新的基金不重复加入
+        """
+        with self._lock:
+            self._queued.update(c for c in fund_codes if c not in self._refreshing)
+            if self._refresh_running or not self._queued:
+                return
+            self._refresh_running = True
+
+        def run():
+            while True:
+                with self._lock:
+                    codes = list(self._queued)
+                    self._queued.clear()
+                    self._refreshing = set(codes)
+                    if not codes:
+                        self._refresh_running = False
+                        return
+                try:
+                    self.warm(codes)
+                except Exception as e:
+                    print(f"基金元数据后台刷新失败: {e}")
+
+        threading.Thread(target=run, name='fund-meta-refresh', daemon=True).start()
+
+    def clear(self):
+        """清空缓存 (内存与数据库)"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM fund_metadata")
+            self._entries = {}
+
+    def entries(self):
+        """当前全部缓存条目 {代码: 条目} 的快照"""
+        with self._lock:
+            return dict(self._entries)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def summary(self):
+        return dict(self.stats, entries=len(self._entries), path=self.path)
+
+def _connect(path):
+    """打开数据库；部署目录只读时 (如Vercel) 改用临时目录"""
+    try:
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.executescript(_SCHEMA)
+        return conn, path
+    except sqlite3.OperationalError:
+        path = os.path.join(tempfile.gettempdir(), os.path.basename(path))
+        conn = sqlite3.connect(path, check_same_thread=False)
+        conn.executescript(_SCHEMA)
+        return conn, path
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_fund_metadata_cache():
+    """进程内共享的基金元数据缓存"""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = FundMetadataCache()
+        return _cache
+
+def holdings_fund_codes(folder='fund_holdings'):
+    """持仓文件夹中的全部基金代码"""
+    if not os.path.isdir(folder):
+        return []
+    return sorted(f[:6] for f in os.listdir(folder) if re.match(r'^\d{6}\.csv$', f))
+
+def start_warmup(fund_codes):
+    """启动时在后台批量预热，不阻塞服务启动"""
+    cache = get_fund_metadata_cache()
+    cache.refresh_async(list(fund_codes))
+    return cache
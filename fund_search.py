@@ -0,0 +1,289 @@
+# 基金搜索索引 - 全市场基金的本地全文索引 (代码、名称、拼音缩写/全拼、类型、主题、基金公司)
+# 索引由本地保存的基金列表快照构建，查询不访问网络；快照缺失或过期时在后台下载并原子替换索引
+# 只依赖Python标准库，api/index.py (Vercel) 同样可以使用
+# 用法: python fund_search.py [--refresh] [关键词 ...]
+import bisect
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from array import array
+
+import http_client
+from fund_metadata import get_fund_list, get_fund_metadata_cache
+
+SNAPSHOT_PATH = os.environ.get('FUND_SEARCH_SNAPSHOT', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fund_list_snapshot.json'))
+SNAPSHOT_TTL = 7 * 86400  # 新基金发行频率不高，快照一周刷新一次
+REFRESH_RETRY_INTERVAL = 300  # 下载失败后的重试间隔(秒)
+KNOWN_REBUILD_INTERVAL = 60   # 没有快照时，按元数据缓存重建临时索引的最短间隔(秒)
+COMPANY_LIST_URL = "http://fund.eastmoney.com/js/jjjz_gs.js"
+DEFAULT_LIMIT = 20
+
+def fetch_company_list(timeout=10):
+    """下载基金公司列表，返回公司简称列表 (如 '华夏'、'易方达')；原始格式: var gs={op:[["80000222","华夏基金"],...]}"""
+    response = http_client.get(COMPANY_LIST_URL, headers={'Referer': 'http://fund.eastmoney.com/'}, timeout=timeout)
+    response.raise_for_status()
+    names = re.findall(r'\["\d+","([^"]+)"\]', response.content.decode('utf-8-sig', errors='replace'))
+    return sorted({_company_short_name(n) for n in names if _company_short_name(n)})
+
+def _company_short_name(name):
+    return re.sub(r'(基金管理有限公司|基金管理股份有限公司|基金|资产管理|资管)$', '', name.strip())
+
+class FundSearchIndex:
+    """
+    基金全文索引 (构建后只读，可被多线程共享)：
+    - 记录按 (名称长度, 代码) 排序后编号，编号越小越优先，倒排表按编号有序，扫描到足够结果即可停止
+    - 代码、名称、拼音缩写、拼音全拼：各自的有序表 + 二分查找前缀
+    - 全部字段：单字/双字 n-gram 倒排表，取最短的倒排表作为候选再做子串校验
+    每只基金一条记录 (代码, 名称, 拼音缩写, 类型, 拼音全拼, 主题, 基金公司)
+    排序：代码前缀 > 名称前缀 > 拼音缩写前缀 > 拼音全拼前缀 > 名称包含 > 其他字段包含
+    """
+
+    def __init__(self, records):
+        self.records = sorted(records, key=lambda r: (len(r[1]), r[0]))
+        self._position = {r[0]: i for i, r in enumerate(self.records)}
+        self._names = [r[1].lower() for r in self.records]
+        # 前缀表：(按字段排序的键, 对应的记录编号)
+        self._prefix_tables = [self._sorted_field(lambda r: r[0])]
+        self._prefix_tables += [self._sorted_field(lambda r, f=f: r[f].lower()) for f in (1, 2, 4)]
+        # 各字段用 \x00 分隔，n-gram 不会跨字段
+        self._texts = ['\x00'.join(f.lower() for f in r[1:]) for r in self.records]
+        postings = {}
+        for i, text in enumerate(self._texts):
+            grams = set(text)
+            grams.update(text[j:j + 2] for j in range(len(text) - 1))
+            for gram in grams:
+                if '\x00' not in gram:
+                    postings.setdefault(gram, []).append(i)
+        self._postings = {gram: array('I', ids) for gram, ids in postings.items()}
+
+    def _sorted_field(self, key):
+        order = sorted((key(r), i) for i, r in enumerate(self.records) if key(r))
+        return [k for k, _ in order], array('I', (i for _, i in order))
+
+    def __len__(self):
+        return len(self.records)
+
+    def get(self, fund_code):
+        i = self._position.get(fund_code)
+        return self.records[i] if i is not None else None
+
+    def search(self, keyword, limit=DEFAULT_LIMIT):
+        """返回按相关度排序的记录列表 (最多 limit 条)"""
+        query = re.sub(r'\s+', '', keyword or '').lower()
+        if not query or limit <= 0:
+            return []
+        found, taken = [], set()
+        for tier, (keys, ids) in enumerate(self._prefix_tables):
+            lo = bisect.bisect_left(keys, query)
+            hi = bisect.bisect_left(keys, query + '\uffff', lo)
+            # 代码按代码顺序返回 (输入代码时的自然顺序)，其余按记录编号
+            matches = ids[lo:min(hi, lo + limit)] if tier == 0 else sorted(ids[lo:hi])
+            for i in matches:
+                if i not in taken:
+                    taken.add(i)
+                    found.append(i)
+                    if len(found) == limit:
+                        return [self.records[i] for i in found]
+        # 包含匹配：名称包含的优先，其他字段包含的暂存，倒排表有序，名称包含的凑够即停止
+        others = []
+        for i in self._candidates(query):
+            if i in taken or query not in self._texts[i]:
+                continue
+            if query in self._names[i]:
+                found.append(i)
+                if len(found) == limit:
+                    break
+            elif len(found) + len(others) < limit:
+                others.append(i)
+        return [self.records[i] for i in (found + others)[:limit]]
+
+    def _candidates(self, query):
+        grams = [query] if len(query) == 1 else [query[j:j + 2] for j in range(len(query) - 1)]
+        shortest = None
+        for gram in grams:
+            ids = self._postings.get(gram)
+            if ids is None:
+                return ()
+            if shortest is None or len(ids) < len(shortest):
+                shortest = ids
+        return shortest
+
+def build_records(fund_list, companies=(), extras=None):
+    """
+    由基金列表 {代码: (拼音缩写, 名称, 类型, 拼音全拼)} 生成索引记录
+    基金公司取名称开头最长的公司简称 (记为 'XX基金')；extras: {代码: {'type': .., 'theme': .., 'company': ..}} 补充/覆盖主题与公司
+    基金列表中没有的 extras 基金同样生成记录 (名称暂缺)，没有快照时仍可按类型/主题/公司搜到
+    """
+    extras = extras or {}
+    companies = sorted(companies, key=len, reverse=True)
+    records = []
+    for code, (abbr, name, category, pinyin) in fund_list.items():
+        extra = extras.get(code, {})
+        company = extra.get('company') or next((f"{c}基金" for c in companies if name.startswith(c)), '')
+        records.append((code, name, abbr or '', category or '', pinyin or '', extra.get('theme', ''), company))
+    for code, extra in extras.items():
+        if code not in fund_list:
+            records.append((code, extra.get('name', ''), '', extra.get('type', ''), '', extra.get('theme', ''), extra.get('company', '')))
+    return records
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """读取本地快照，返回 (下载时间, 基金列表, 公司列表)；不存在或损坏时返回None"""
+    for candidate in (path, _fallback_path(path)):
+        try:
+            with open(candidate, encoding='utf-8') as f:
+                data = json.load(f)
+            return data['downloaded_at'], {code: tuple(row) for code, row in data['funds'].items()}, data.get('companies', [])
+        except (OSError, ValueError, KeyError):
+            continue
+    return None
+
+def download_snapshot(path=SNAPSHOT_PATH):
+    """下载基金列表与公司列表并写入快照 (部署目录只读时写入临时目录)，返回 (下载时间, 基金列表, 公司列表)"""
+    fund_list = get_fund_list()  # 与元数据预热共用同一次下载
+    try:
+        companies = fetch_company_list()
+    except Exception as e:
+        print(f"基金公司列表下载失败，公司字段暂缺: {e}")
+        companies = []
+    downloaded_at = time.time()
+    data = {'downloaded_at': downloaded_at, 'funds': fund_list, 'companies': companies}
+    for candidate in (path, _fallback_path(path)):
+        try:
+            tmp = candidate + '.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp, candidate)
+            break
+        except OSError:
+            continue
+    return downloaded_at, fund_list, companies
+
+def _fallback_path(path):
+    return os.path.join(tempfile.gettempdir(), os.path.basename(path))
+
+class FundSearch:
+    """
+    持有当前索引并负责后台构建/刷新：
+    - 快照存在时首次使用同步构建 (只读本地文件)
+    - 快照缺失时先用元数据缓存中已知的基金构建临时索引，同时在后台下载快照，完成后替换
+    - 快照过期时照常使用，后台刷新
+    background_refresh=False 时从不访问网络 (Serverless入口：后台线程在响应后会被冻结)，
+    快照需随部署一起发布 (python fund_search.py --refresh 生成)；没有快照时索引随元数据缓存中已知的基金更新，
+    重建间隔不少于 KNOWN_REBUILD_INTERVAL 秒，且只由一个请求线程执行，其他请求继续使用当前索引
+    """
+
+    def __init__(self, path=SNAPSHOT_PATH, extras=None, background_refresh=True):
+        self.path = path
+        self.extras = dict(extras or {})
+        self.background_refresh = background_refresh
+        self._known_count = 0
+        self._known_built_at = 0.0
+        self._index = None
+        self._snapshot_at = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._last_attempt = 0.0
+        self.stats = {'builds': 0, 'build_seconds': 0.0, 'refresh_failed': 0}
+
+    def index(self):
+        if self._index is None:
+            with self._lock:
+                if self._index is None:
+                    snapshot = load_snapshot(self.path)
+                    if snapshot:
+                        self._build(*snapshot)
+                    else:
+                        self._build_known()
+        if self._snapshot_at is None and not self.background_refresh:
+            if time.time() - self._known_built_at > KNOWN_REBUILD_INTERVAL and len(get_fund_metadata_cache()) != self._known_count:
+                if self._lock.acquire(blocking=False):
+                    try:
+                        if self._snapshot_at is None:
+                            self._build_known()
+                    finally:
+                        self._lock.release()
+        elif self.background_refresh and (self._snapshot_at is None or time.time() - self._snapshot_at > SNAPSHOT_TTL):
+            self.refresh_async()
+        return self._index
+
+    def search(self, keyword, limit=DEFAULT_LIMIT):
+        return self.index().search(keyword, limit)
+
+    def preload(self):
+        """启动时在后台构建索引，首次搜索无需等待"""
+        threading.Thread(target=self.index, name='fund-search-build', daemon=True).start()
+        return self
+
+    def add_extras(self, extras):
+        """补充主题/公司信息，下次构建索引时生效"""
+        self.extras.update(extras)
+
+    def _build_known(self):
+        """没有快照时，用元数据缓存中已知的基金构建临时索引"""
+        entries = get_fund_metadata_cache().entries()
+        self._known_count, self._known_built_at = len(entries), time.time()
+        known = {code: ('', entry['name'], entry['category'] or '', '') for code, entry in entries.items() if entry['name']}
+        self._build(None, known, [])
+
+    def _build(self, snapshot_at, fund_list, companies):
+        started = time.perf_counter()
+        index = FundSearchIndex(build_records(fund_list, companies, self.extras))
+        self._index, self._snapshot_at = index, snapshot_at  # 整体替换，查询线程看到的总是完整的索引
+        self.stats['builds'] += 1
+        self.stats['build_seconds'] = round(time.perf_counter() - started, 3)
+
+    def refresh_async(self):
+        """后台下载快照并重建索引 (同时只有一个刷新任务，失败后间隔一段时间再试)"""
+        with self._lock:
+            if self._refreshing or time.time() - self._last_attempt < REFRESH_RETRY_INTERVAL:
+                return
+            self._refreshing, self._last_attempt = True, time.time()
+
+        def run():
+            try:
+                self._build(*download_snapshot(self.path))
+            except Exception as e:
+                self.stats['refresh_failed'] += 1
+                print(f"基金列表快照下载失败: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing = False
+
+        threading.Thread(target=run, name='fund-search-refresh', daemon=True).start()
+
+    def summary(self):
+        index = self._index
+        return dict(self.stats, funds=len(index) if index else 0, snapshot_at=self._snapshot_at, path=self.path)
+
+_search = None
+_search_lock = threading.Lock()
+
+def get_fund_search():
+    """进程内共享的基金搜索索引"""
+    global _search
+    with _search_lock:
+        if _search is None:
+            _search = FundSearch()
+        return _search
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description='基金搜索索引')
+    parser.add_argument('--refresh', action='store_true', help='重新下载基金列表快照')
+    parser.add_argument('keywords', nargs='*')
+    args = parser.parse_args()
+    search = get_fund_search()
+    if args.refresh:
+        snapshot = download_snapshot(search.path)
+        print(f"快照已更新：{len(snapshot[1])} 只基金，{len(snapshot[2])} 家基金公司")
+    index = search.index()
+    print(f"索引：{len(index)} 只基金 {search.summary()}")
+    for keyword in args.keywords:
+        started = time.perf_counter()
+        results = index.search(keyword)
+        print(f"'{keyword}': {len(results)} 条，{(time.perf_counter() - started) * 1000:.3f}ms")
+        for code, name, abbr, category, _, theme, company in results:
+            print(f"  {code} {name} [{abbr}] {category} {theme} {company}")
@@ -0,0 +1,113 @@
+# 历史数据批量回填 - 将全部持仓股票的日线收盘价与全部基金的历史净值写入本地历史库 (quote_history)
+# 可中断续跑：每批股票/每只基金写入后立即提交，重新运行时跳过已覆盖的部分
+# 用法: python history_backfill.py [--years 3] [--batch-size 50] [--skip-stocks] [--skip-navs]
+import argparse
+import datetime
+import time
+
+import pytz
+
+import http_client
+from fund_estimator import backfill_history, HOLDINGS_FOLDER
+from quote_history import get_quote_history
+from universe_index import get_universe_index
+
+DEFAULT_YEARS = 3
+STOCK_BATCH_SIZE = 50  # 每次 yf.download 的股票数
+NAV_PAGE_SIZE = 20     # 天天基金历史净值接口每页条数
+NAV_URL = "http://api.fund.eastmoney.com/f10/lsjz"
+NAV_PUBLISH_LAG = 7    # 净值覆盖到返回的最新日期为止，最近这几天未覆盖的基金不重复回填 (QDII净值T+1/T+2公布，另有周末/长假)
+
+def backfill_range(years, today=None):
+    """回填的日期区间：N年前 ~ 美东时间的昨天 (所有市场都已收盘的最后一天)"""
+    today = today or datetime.datetime.now(pytz.timezone('US/Eastern')).date()
+    end = today - datetime.timedelta(days=1)
+    return end - datetime.timedelta(days=int(365.25 * years)), end
+
+def fetch_fund_nav_history(fund_code, start, end):
+    """分页拉取基金在 [start, end] 的历史净值，返回 [(日期, 单位净值, 日涨跌幅%), ...]"""
+    headers = {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+        'Referer': f'http://fundf10.eastmoney.com/jjjz_{fund_code}.html'
+    }
+    rows, page = [], 1
+    while True:
+        params = {
+            'fundCode': fund_code,
+            'pageIndex': page,
+            'pageSize': NAV_PAGE_SIZE,
+            'startDate': start.isoformat(),
+            'endDate': end.isoformat(),
+            '_': int(time.time() * 1000)
+        }
+        response = http_client.get(NAV_URL, params=params, headers=headers, timeout=10)
+        response.raise_for_status()
+        data = response.json()
+        items = (data.get('Data') or {}).get('LSJZList') or []
+        for item in items:
+            rows.append((item['FSRQ'], _to_float(item.get('DWJZ')), _to_float(item.get('JZZZL'))))
+        if not items or page * NAV_PAGE_SIZE >= int(data.get('TotalCount') or 0):
+            return rows
+        page += 1
+
+def _to_float(value):
+    try:
+        return float(str(value).rstrip('%'))
+    except (TypeError, ValueError):
+        return None  # '--' 或空值 (如新基金首日)
+
+def backfill_stocks(years=DEFAULT_YEARS, batch_size=STOCK_BATCH_SIZE, folder=HOLDINGS_FOLDER):
+    """回填所有持仓股票的日线收盘价，返回 (成功写入的股票数, 失败的批次数)"""
+    start, end = backfill_range(years)
+    tickers = [t for t in get_universe_index(folder).tickers if t]
+    pending = get_quote_history().uncovered(tickers, start, end)
+    print(f"股票日线 {start} ~ {end}：共 {len(tickers)} 只，已覆盖 {len(tickers) - len(pending)} 只，待回填 {len(pending)} 只")
+    done, failed_batches = 0, 0
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        written = backfill_history(batch, start, end)  # 写入即提交，中断后重新运行从这里继续
+        if written:
+            done += written
+        else:
+            failed_batches += 1
+        print(f"  批次 {i // batch_size + 1}/{(len(pending) + batch_size - 1) // batch_size}：{'完成' if written else '失败，下次重试'}")
+    return done, failed_batches
+
+def backfill_navs(years=DEFAULT_YEARS, folder=HOLDINGS_FOLDER):
+    """回填所有基金的历史净值，返回 (成功写入的基金数, 失败的基金数)"""
+    start, end = backfill_range(years)
+    history = get_quote_history()
+    fund_codes = list(get_universe_index(folder).fund_codes)
+    pending = history.uncovered_funds(fund_codes, start, end - datetime.timedelta(days=NAV_PUBLISH_LAG))
+    print(f"基金净值 {start} ~ {end}：共 {len(fund_codes)} 只，已覆盖 {len(fund_codes) - len(pending)} 只，待回填 {len(pending)} 只")
+    done, failed = 0, 0
+    for fund_code in pending:
+        try:
+            rows = fetch_fund_nav_history(fund_code, start, end)
+        except Exception as e:
+            print(f"  基金 {fund_code} 净值回填失败: {e}")
+            failed += 1
+            continue
+        history.store_navs(fund_code, rows, start, end)  # 只覆盖到返回的最新净值日期
+        done += 1
+        print(f"  基金 {fund_code}：{len(rows)} 条净值")
+    return done, failed
+
+def run_backfill(years=DEFAULT_YEARS, batch_size=STOCK_BATCH_SIZE, stocks=True, navs=True):
+    started = time.perf_counter()
+    if stocks:
+        done, failed_batches = backfill_stocks(years, batch_size)
+        print(f"股票日线回填完成：写入 {done} 只，失败 {failed_batches} 批")
+    if navs:
+        done, failed = backfill_navs(years)
+        print(f"基金净值回填完成：写入 {done} 只，失败 {failed} 只")
+    print(f"历史库: {get_quote_history().stats()}，耗时 {time.perf_counter() - started:.1f}s")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='批量回填历史收盘价与基金净值')
+    parser.add_argument('--years', type=float, default=DEFAULT_YEARS)
+    parser.add_argument('--batch-size', type=int, default=STOCK_BATCH_SIZE)
+    parser.add_argument('--skip-stocks', action='store_true')
+    parser.add_argument('--skip-navs', action='store_true')
+    args = parser.parse_args()
+    run_backfill(args.years, args.batch_size, stocks=not args.skip_stocks, navs=not args.skip_navs)
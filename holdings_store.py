@@ -0,0 +1,132 @@
+# 持仓预编译存储 - 每个持仓CSV只解析一次，按文件状态(修改时间+大小)失效
+# 内存中保存紧凑的列式结构，并在CSV旁持久化为 .npz 文件，进程冷启动时无需pandas解析
+import os
+import threading
+
+import numpy as np
+
+from metrics import HOLDINGS_LOADS, timed_stage
+
+STORE_VERSION = 3  # 代码转换规则变化时递增，使旧的 .npz 失效
+MARKETS = np.array(['A股', '港股', '美股', '其他'])
+
+_tables = {}
+_lock = threading.Lock()
+
+class HoldingsTable:
+    """
+    一只基金的持仓 (已按公司名称去重)：
+    - names/codes: 公司名称与原始证券代码
+    - tickers: 本基金内不重复的股票代码表，ticker_ids 为每条持仓在表中的下标
+    - weights: float32 持仓占比(%)，market_codes: int8 市场编码 (下标对应 MARKETS)
+    """
+
+    __slots__ = ('names', 'codes', 'tickers', 'ticker_ids', 'weights', 'market_codes',
+                 'raw_row_count', 'raw_weight_sum', 'dropped_rows', 'duplicate_rows', 'stat_key')
+
+    def __init__(self, **fields):
+        for key in self.__slots__:
+            setattr(self, key, fields[key])
+
+    def __len__(self):
+        return len(self.names)
+
+    def to_frame(self):
+        """还原为估值使用的DataFrame：name, code, weight(小数), ticker, market"""
+        import pandas as pd
+        return pd.DataFrame({
+            'name': self.names.tolist(),
+            'code': self.codes.tolist(),
+            'weight': self.weights.astype(float) / 100.0,
+            'ticker': self.tickers[self.ticker_ids].tolist(),
+            'market': MARKETS[self.market_codes].tolist(),
+        })
+
+def stat_key(csv_path):
+    """CSV文件的版本键 [STORE_VERSION, mtime_ns, size]，任一变化即需重新编译"""
+    st = os.stat(csv_path)
+    return np.array([STORE_VERSION, st.st_mtime_ns, st.st_size], dtype=np.int64)
+
+def _npz_path(csv_path):
+    return os.path.splitext(csv_path)[0] + '.npz'
+
+def _compile_csv(csv_path, stat_key):
+    """用pandas解析CSV并编译为列式结构"""
+    # 延迟导入，避免与fund_estimator循环引用
+    from fund_estimator import read_holdings_csv, compile_holdings_frame
+
+    holdings_df, raw_rows, raw_weight = read_holdings_csv(csv_path)
+    frame = compile_holdings_frame(holdings_df)
+    tickers, ticker_ids = np.unique(frame['ticker'].to_numpy(dtype=str), return_inverse=True)
+    market_index = {market: i for i, market in enumerate(MARKETS)}
+    return HoldingsTable(
+        names=frame['name'].to_numpy(dtype=str),
+        codes=frame['code'].to_numpy(dtype=str),
+        tickers=tickers,
+        ticker_ids=ticker_ids.astype(np.int32),
+        weights=(frame['weight'].to_numpy() * 100.0).astype(np.float32),
+        market_codes=np.array([market_index[m] for m in frame['market']], dtype=np.int8),
+        raw_row_count=raw_rows,
+        raw_weight_sum=raw_weight,
+        dropped_rows=raw_rows - len(holdings_df),
+        duplicate_rows=len(holdings_df) - len(frame),
+        stat_key=stat_key,
+    )
+
+def _load_npz(csv_path, stat_key):
+    """读取持久化的 .npz，文件状态不一致(CSV已修改)时返回None"""
+    try:
+        with np.load(_npz_path(csv_path), allow_pickle=False) as data:
+            if not np.array_equal(data['stat_key'], stat_key):
+                return None
+            counts = data['counts']
+            return HoldingsTable(
+                names=data['names'], codes=data['codes'], tickers=data['tickers'],
+                ticker_ids=data['ticker_ids'], weights=data['weights'], market_codes=data['market_codes'],
+                raw_row_count=int(counts[0]), raw_weight_sum=float(data['raw_weight_sum']),
+                dropped_rows=int(counts[1]), duplicate_rows=int(counts[2]), stat_key=stat_key,
+            )
+    except (OSError, KeyError, ValueError):
+        return None
+
+def _save_npz(csv_path, table):
+    """持久化到CSV旁的 .npz；目录只读(如Serverless环境)时静默跳过"""
+    tmp_path = _npz_path(csv_path) + '.tmp.npz'
+    try:
+        np.savez(
+            tmp_path, names=table.names, codes=table.codes, tickers=table.tickers,
+            ticker_ids=table.ticker_ids, weights=table.weights, market_codes=table.market_codes,
+            raw_weight_sum=np.float64(table.raw_weight_sum), stat_key=table.stat_key,
+            counts=np.array([table.raw_row_count, table.dropped_rows, table.duplicate_rows], dtype=np.int64),
+        )
+        os.replace(tmp_path, _npz_path(csv_path))
+    except OSError:
+        pass
+
+@timed_stage('holdings_load')
+def load_holdings(csv_path):
+    """
+    获取基金持仓的列式结构，依次查找：内存缓存 -> CSV旁的 .npz -> 解析CSV。
+    CSV不存在时抛出FileNotFoundError，缺少必要列时抛出ValueError。
+    """
+    key = os.path.abspath(csv_path)
+    current = stat_key(csv_path)
+    table = _tables.get(key)
+    if table is not None and np.array_equal(table.stat_key, current):
+        HOLDINGS_LOADS.inc(layer='memory')
+        return table
+
+    with _lock:
+        table = _tables.get(key)
+        if table is not None and np.array_equal(table.stat_key, current):
+            HOLDINGS_LOADS.inc(layer='memory')
+            return table
+        table = _load_npz(csv_path, current)
+        if table is None:
+            table = _compile_csv(csv_path, current)
+            _save_npz(csv_path, table)
+            HOLDINGS_LOADS.inc(layer='csv')
+        else:
+            HOLDINGS_LOADS.inc(layer='npz')
+        _tables[key] = table
+    return table
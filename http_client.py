@@ -0,0 +1,205 @@
+# 上游HTTP客户端 - 按主机维护长连接池，所有数据源(新浪/腾讯/天天基金等)统一经由这里访问
+# 只依赖Python标准库，api/index.py (Vercel) 同样可以使用
+import gzip
+import http.client
+import json
+import os
+import threading
+import zlib
+from urllib.parse import urlsplit, urlencode, urljoin
+
+import rate_limiter
+
+POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', '8'))  # 每个主机最多保留的空闲连接数
+DEFAULT_TIMEOUT = 10
+MAX_REDIRECTS = 3
+
+# 上游主机重定向，用于本地行情模拟器/测试环境，格式: "hq.sinajs.cn=127.0.0.1:8765,qt.gtimg.cn=127.0.0.1:8765"
+# 重定向后统一使用HTTP连接目标地址，Host头保持原主机名，模拟器据此区分数据源
+HOST_OVERRIDES = {}
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+}
+
+def set_host_override(host, target):
+    """将发往 host 的请求改发到 target ("主机:端口")，target 为None时取消重定向"""
+    if target is None:
+        HOST_OVERRIDES.pop(host, None)
+        return
+    target_host, _, target_port = target.rpartition(':')
+    HOST_OVERRIDES[host] = (target_host, int(target_port))
+
+for _item in filter(None, os.environ.get('HTTP_HOST_OVERRIDES', '').split(',')):
+    _host, _, _target = _item.strip().partition('=')
+    set_host_override(_host, _target)
+
+class HTTPError(Exception):
+    """上游返回了4xx/5xx状态码"""
+
+    def __init__(self, status_code, url):
+        super().__init__(f"HTTP {status_code}: {url}")
+        self.status_code = status_code
+        self.url = url
+
+class Response:
+    """与requests.Response用法相近的精简响应对象"""
+
+    def __init__(self, url, status_code, headers, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+        self.encoding = _charset_from_content_type(headers.get('Content-Type', '')) or 'utf-8'
+
+    @property
+    def text(self):
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise HTTPError(self.status_code, self.url)
+
+def _charset_from_content_type(content_type):
+    for part in content_type.split(';'):
+        key, _, value = part.strip().partition('=')
+        if key.lower() == 'charset' and value:
+            return value.strip('"\'')
+    return None
+
+def _decode_body(content, content_encoding):
+    content_encoding = (content_encoding or '').lower()
+    if content_encoding == 'gzip':
+        return gzip.decompress(content)
+    if content_encoding == 'deflate':
+        try:
+            return zlib.decompress(content)
+        except zlib.error:
+            return zlib.decompress(content, -zlib.MAX_WBITS)
+    return content
+
+class HTTPClient:
+    """
+    按 (协议, 主机, 端口) 维护空闲长连接池：
+    - 请求时优先复用空闲连接，省去TCP/TLS握手
+    - 复用的连接若已被服务端关闭，换一条新连接重试一次
+    - 归还时超出 pool_maxsize 的连接直接关闭
+    - 发送前按主机取限流令牌，返回的状态码/超时反馈给限流器 (见 rate_limiter)
+    """
+
+    def __init__(self, pool_maxsize=POOL_MAXSIZE):
+        self.pool_maxsize = pool_maxsize
+        self._idle = {}
+        self._lock = threading.Lock()
+        self._stats = {'requests': 0, 'connections_created': 0, 'connections_reused': 0}
+
+    def _acquire(self, key, timeout):
+        with self._lock:
+            idle = self._idle.get(key)
+            conn = idle.pop() if idle else None
+            self._stats['connections_reused' if conn else 'connections_created'] += 1
+        if conn is not None:
+            conn.timeout = timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            return conn, True
+        scheme, host, port = key
+        conn_cls = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        return conn_cls(host, port, timeout=timeout), False
+
+    def _release(self, key, conn):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.pool_maxsize:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def request(self, method, url, params=None, headers=None, timeout=DEFAULT_TIMEOUT, data=None):
+        if params:
+            url = f"{url}{'&' if '?' in url else '?'}{urlencode(params)}"
+        merged_headers = dict(DEFAULT_HEADERS)
+        merged_headers.update(headers or {})
+
+        for _ in range(MAX_REDIRECTS + 1):
+            response = self._send(method, url, merged_headers, timeout, data)
+            location = response.headers.get('Location')
+            if response.status_code in (301, 302, 303, 307, 308) and location:
+                url = urljoin(url, location)
+                continue
+            return response
+        return response
+
+    def get(self, url, params=None, headers=None, timeout=DEFAULT_TIMEOUT):
+        return self.request('GET', url, params=params, headers=headers, timeout=timeout)
+
+    def _send(self, method, url, headers, timeout, data):
+        parts = urlsplit(url)
+        scheme = parts.scheme or 'http'
+        port = parts.port or (443 if scheme == 'https' else 80)
+        key = (scheme, parts.hostname, port)
+        path = (parts.path or '/') + (f"?{parts.query}" if parts.query else '')
+        override = HOST_OVERRIDES.get(parts.hostname)
+        if override:
+            key = ('http',) + override
+            headers = dict(headers, Host=parts.netloc)
+
+        with self._lock:
+            self._stats['requests'] += 1
+        rate_limiter.acquire(parts.hostname)
+        for attempt in range(2):
+            conn, reused = self._acquire(key, timeout)
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                resp = conn.getresponse()
+                content = resp.read()
+            except (ConnectionError, http.client.BadStatusLine):
+                conn.close()
+                if reused and attempt == 0:
+                    continue  # 空闲连接已被服务端断开，换新连接重试
+                raise
+            except TimeoutError:
+                conn.close()
+                rate_limiter.record(parts.hostname, timed_out=True)
+                raise
+            except Exception:
+                conn.close()
+                raise
+
+            if resp.will_close:
+                conn.close()
+            else:
+                self._release(key, conn)
+            rate_limiter.record(parts.hostname, resp.status)
+            resp_headers = {k.title(): v for k, v in resp.getheaders()}
+            content = _decode_body(content, resp_headers.get('Content-Encoding'))
+            return Response(url, resp.status, resp_headers, content)
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self._stats)
+            stats['idle_connections'] = sum(len(v) for v in self._idle.values())
+        total = stats['connections_created'] + stats['connections_reused']
+        stats['reuse_rate'] = stats['connections_reused'] / total if total else 0.0
+        return stats
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, {}
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+# 进程内共享的默认客户端
+default_client = HTTPClient()
+
+def get(url, params=None, headers=None, timeout=DEFAULT_TIMEOUT):
+    return default_client.get(url, params=params, headers=headers, timeout=timeout)
+
+def get_stats():
+    return default_client.get_stats()
@@ -0,0 +1,176 @@
+# 增量估值引擎 - 行情变动时只更新受影响基金的加权和，变动结果以带版本号的增量流输出
+import threading
+from collections import deque
+
+import numpy as np
+
+from fund_estimator import QUERY_STATUSES
+from market_calendar import CALENDARS, exchange_of, market_statuses, utc_now
+from universe_index import get_universe_index
+
+DELTA_LOG_SIZE = 1024  # 保留最近多少个版本的变动记录，更早的版本直接返回全量快照
+
+class IncrementalValuator:
+    """
+    在 UniverseIndex 之上维护每只基金的加权涨跌幅之和：
+    - 持仓权重与 estimate_fund_change_from_csv 一致 (同一份预编译持仓，已按公司去重)
+    - apply_quotes 只遍历发生变化的股票的倒排表，成本与变化股票的持仓条目数成正比
+    - 每次有基金估值变化，版本号+1，changes_since(version) 返回此后变化的基金
+    - 与 active_holdings_mask 一致，只计入市场处于 QUERY_STATUSES 的股票：
+      市场离开可查询状态或进入新的交易日时，该市场股票的行情清零，上一交易日的涨跌不会残留
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self.weighted_sums = np.zeros(len(index.fund_codes))
+        self.quotes = np.zeros(len(index.tickers))
+        self.version = 0
+        self.base_version = 0  # 早于该版本的客户端无法增量追上，只能拿全量快照
+        self._log = deque(maxlen=DELTA_LOG_SIZE)  # [(版本号, 变化的基金下标数组)]
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        exchanges = {}
+        for tid, ticker in enumerate(index.tickers):
+            exchange = exchange_of(ticker) if ticker else None
+            if exchange is not None:
+                exchanges.setdefault(exchange, []).append(tid)
+        self._exchange_tids = {exchange: np.array(tids, dtype=np.int64) for exchange, tids in exchanges.items()}
+        self._ticker_exchanges = {index.tickers[tid]: exchange for exchange, tids in exchanges.items() for tid in tids}
+        self._sessions = {}            # {交易所: 当前交易日 (当地日期)，不在可查询状态时为None}
+        self._seen_statuses = None     # 上次检查时的 market_statuses() 结果 (同一秒内为同一对象)
+
+    def apply_quotes(self, changes):
+        """
+        写入一批行情 {股票代码: 涨跌幅}，返回估值发生变化的基金代码列表。
+        不在索引中的股票、市场不在可查询状态的股票、与当前值相同的行情直接跳过。
+        """
+        index = self.index
+        with self._lock:
+            changed = self._roll_sessions()
+            tids, new_values = [], []
+            for ticker, change in changes.items():
+                tid = index.ticker_ids.get(ticker)
+                if (tid is not None and change is not None and change != self.quotes[tid]
+                        and self._sessions.get(self._ticker_exchanges.get(ticker)) is not None):
+                    tids.append(tid)
+                    new_values.append(change)
+            if tids:
+                changed = np.union1d(changed, self._write(np.array(tids, dtype=np.int64), np.array(new_values, dtype=float)))
+            self._commit(changed)
+        return [index.fund_codes[i] for i in changed.tolist()]
+
+    def _roll_sessions(self):
+        """
+        按交易所日历检查各市场的交易日 (调用方持有锁)：市场离开可查询状态或换日时清零该市场的行情，
+        返回估值因此变化的基金下标数组 (未提交版本)
+        """
+        statuses = market_statuses()
+        if statuses is self._seen_statuses:
+            return np.zeros(0, dtype=np.int64)
+        self._seen_statuses = statuses
+        now = utc_now()
+        expired = []
+        for exchange, tids in self._exchange_tids.items():
+            session = CALENDARS[exchange].local_now(now).date() if statuses[exchange] in QUERY_STATUSES else None
+            if self._sessions.get(exchange) != session:
+                self._sessions[exchange] = session
+                expired.append(tids[self.quotes[tids] != 0])
+        expired = np.concatenate(expired) if expired else np.zeros(0, dtype=np.int64)
+        if not len(expired):
+            return np.zeros(0, dtype=np.int64)
+        return self._write(expired, np.zeros(len(expired)))
+
+    def _commit(self, changed):
+        """有基金估值变化时版本号+1并通知等待者 (调用方持有锁)"""
+        if len(changed):
+            self.version += 1
+            self._log.append((self.version, changed))
+            self._changed.notify_all()
+
+    def _write(self, tids, new_values):
+        """写入行情并按差值更新加权和 (调用方持有锁)，返回估值变化的基金下标数组"""
+        index = self.index
+        deltas = new_values - self.quotes[tids]
+        self.quotes[tids] = new_values
+
+        # 拼接各变化股票在倒排表中的区间，只触及这些条目
+        starts = index.post_indptr[tids]
+        lengths = index.post_indptr[tids + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = offsets + np.arange(lengths.sum())
+        funds = index.post_funds[positions]
+        np.add.at(self.weighted_sums, funds, index.post_weights[positions] * np.repeat(deltas, lengths))
+        return np.unique(funds)
+
+    def _estimates_for(self, fund_ids):
+        total = self.index.total_weights[fund_ids]
+        weighted = self.weighted_sums[fund_ids]
+        return np.divide(weighted, total, out=np.zeros_like(weighted), where=total > 0)
+
+    def estimate(self, fund_code):
+        """单只基金当前的估算涨跌幅，基金不在索引中返回None"""
+        fid = self.index.fund_ids.get(fund_code)
+        if fid is None:
+            return None
+        with self._lock:
+            self._commit(self._roll_sessions())
+            return float(self._estimates_for(np.array([fid]))[0])
+
+    def snapshot(self):
+        """全部基金的估算涨跌幅：(版本号, {基金代码: 涨跌幅})"""
+        with self._lock:
+            self._commit(self._roll_sessions())
+            return self._collect(np.arange(len(self.index.fund_codes)))
+
+    def changes_since(self, version):
+        """
+        增量流：返回 (当前版本号, {基金代码: 涨跌幅})，只包含 version 之后估值变化的基金。
+        version 太旧(已超出记录范围)时返回全量快照。
+        """
+        with self._lock:
+            self._commit(self._roll_sessions())
+            if version >= self.version:
+                return self.version, {}
+            if version < self.base_version or not self._log or version < self._log[0][0] - 1:
+                return self._collect(np.arange(len(self.index.fund_codes)))
+            fund_ids = np.unique(np.concatenate([ids for v, ids in self._log if v > version]))
+            return self._collect(fund_ids)
+
+    def wait_for_change(self, version, timeout=None):
+        """阻塞到版本号超过 version (或超时)，返回当前版本号"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version > version, timeout)
+            return self.version
+
+    def _collect(self, fund_ids):
+        estimates = self._estimates_for(fund_ids)
+        return self.version, {self.index.fund_codes[i]: e for i, e in zip(fund_ids.tolist(), estimates.tolist())}
+
+    def resync(self):
+        """用一次完整的矩阵-向量乘法重算加权和，消除长时间增量累加的浮点误差"""
+        with self._lock:
+            self.weighted_sums = self.index.matvec(self.quotes)
+
+    def current_quotes(self):
+        """当前持有的全部行情 {股票代码: 涨跌幅}"""
+        with self._lock:
+            return dict(zip(self.index.tickers, self.quotes.tolist()))
+
+_valuator = None
+_valuator_lock = threading.Lock()
+
+def get_valuator():
+    """获取全局增量估值引擎；持仓索引重建后沿用已有行情重新初始化，版本号继续递增"""
+    global _valuator
+    index = get_universe_index()
+    if _valuator is not None and _valuator.index is index:
+        return _valuator
+    with _valuator_lock:
+        if _valuator is None or _valuator.index is not index:
+            valuator = IncrementalValuator(index)
+            if _valuator is not None:
+                valuator.version = _valuator.version
+                valuator.apply_quotes(_valuator.current_quotes())
+                valuator.base_version = valuator.version
+            _valuator = valuator
+    return _valuator
@@ -0,0 +1,184 @@
+# 交易所日历 - 沪深/北交所/港股/美股的预计算交易时段表 (休市日、半日市、港股午休)
+# 市场状态按交易所查表得到 (O(1))，同一秒内的查询共用一次计算结果；不依赖pytz，api/index.py (Vercel) 同样可以使用
+# 休市日表需每年年底按交易所公告补充下一年，表外年份只按周末判断休市
+import datetime
+import time
+
+# 统一的市场状态：
+#   open         交易时段内
+#   lunch_break  午间休市
+#   closed_today 当日已收盘 (今日涨跌幅已确定)；仅沪深北/港股，与北京时间同一天
+#   closed       开盘前或周末；美股收盘后也是 closed (此时已是北京时间次日，
+#                上一交易日的美股涨跌已计入QDII前一日净值，不能再计入当日估值)
+#   holiday      工作日休市 (节假日)，不查询行情
+
+# 交易时段 (当地时间，闭区间)
+_CN_SESSIONS = ((datetime.time(9, 30), datetime.time(11, 30)), (datetime.time(13, 0), datetime.time(15, 0)))
+_HK_SESSIONS = ((datetime.time(9, 30), datetime.time(12, 0)), (datetime.time(13, 0), datetime.time(16, 0)))
+_HK_HALF_DAY = ((datetime.time(9, 30), datetime.time(12, 0)),)
+_US_SESSIONS = ((datetime.time(9, 30), datetime.time(16, 0)),)
+_US_HALF_DAY = ((datetime.time(9, 30), datetime.time(13, 0)),)
+
+def _dates(*values):
+    return frozenset(datetime.date.fromisoformat(v) for v in values)
+
+# 工作日休市日 (周末不列出)，来源：上交所/深交所、港交所、纽交所年度休市安排
+_CN_HOLIDAYS = _dates(
+    '2024-01-01', '2024-02-09', '2024-02-12', '2024-02-13', '2024-02-14', '2024-02-15', '2024-02-16',
+    '2024-04-04', '2024-04-05', '2024-05-01', '2024-05-02', '2024-05-03', '2024-06-10', '2024-09-16', '2024-09-17',
+    '2024-10-01', '2024-10-02', '2024-10-03', '2024-10-04', '2024-10-07',
+    '2025-01-01', '2025-01-28', '2025-01-29', '2025-01-30', '2025-01-31', '2025-02-03', '2025-02-04',
+    '2025-04-04', '2025-05-01', '2025-05-02', '2025-05-05', '2025-06-02',
+    '2025-10-01', '2025-10-02', '2025-10-03', '2025-10-06', '2025-10-07', '2025-10-08',
+    '2026-01-01', '2026-01-02', '2026-02-16', '2026-02-17', '2026-02-18', '2026-02-19', '2026-02-20', '2026-02-23',
+    '2026-04-06', '2026-05-01', '2026-05-04', '2026-05-05', '2026-06-19', '2026-09-25',
+    '2026-10-01', '2026-10-02', '2026-10-05', '2026-10-06', '2026-10-07',
+)
+_HK_HOLIDAYS = _dates(
+    '2024-01-01', '2024-02-12', '2024-02-13', '2024-03-29', '2024-04-01', '2024-04-04', '2024-05-01', '2024-05-15',
+    '2024-06-10', '2024-07-01', '2024-09-18', '2024-10-01', '2024-10-11', '2024-12-25', '2024-12-26',
+    '2025-01-01', '2025-01-29', '2025-01-30', '2025-01-31', '2025-04-04', '2025-04-18', '2025-04-21', '2025-05-01',
+    '2025-05-05', '2025-07-01', '2025-10-01', '2025-10-07', '2025-10-29', '2025-12-25', '2025-12-26',
+    '2026-01-01', '2026-02-17', '2026-02-18', '2026-02-19', '2026-04-03', '2026-04-06', '2026-04-07', '2026-05-01',
+    '2026-05-25', '2026-06-19', '2026-07-01', '2026-10-01', '2026-10-19', '2026-12-25',
+)
+_HK_HALF_DAYS = _dates(  # 农历除夕、平安夜、除夕只有上午交易
+    '2024-12-24', '2024-12-31', '2025-01-28', '2025-12-24', '2025-12-31', '2026-02-16', '2026-12-24', '2026-12-31',
+)
+_US_HOLIDAYS = _dates(
+    '2024-01-01', '2024-01-15', '2024-02-19', '2024-03-29', '2024-05-27', '2024-06-19', '2024-07-04', '2024-09-02',
+    '2024-11-28', '2024-12-25',
+    '2025-01-01', '2025-01-09', '2025-01-20', '2025-02-17', '2025-04-18', '2025-05-26', '2025-06-19', '2025-07-04',
+    '2025-09-01', '2025-11-27', '2025-12-25',
+    '2026-01-01', '2026-01-19', '2026-02-16', '2026-04-03', '2026-05-25', '2026-06-19', '2026-07-03', '2026-09-07',
+    '2026-11-26', '2026-12-25',
+)
+_US_HALF_DAYS = _dates(  # 13:00 提前收盘
+    '2024-07-03', '2024-11-29', '2024-12-24', '2025-07-03', '2025-11-28', '2025-12-24', '2026-11-27', '2026-12-24',
+)
+CALENDAR_YEARS = range(2024, 2027)
+
+_UTC8 = datetime.timedelta(hours=8)
+
+def _us_eastern_offset(now_utc):
+    """美东时间相对UTC的偏移：夏令时自3月第二个周日 02:00 至11月第一个周日 02:00 (当地时间)"""
+    year = now_utc.year
+    march = datetime.datetime(year, 3, 8)
+    dst_start = march + datetime.timedelta(days=(6 - march.weekday()) % 7, hours=2 + 5)   # 当地02:00 = UTC 07:00
+    november = datetime.datetime(year, 11, 1)
+    dst_end = november + datetime.timedelta(days=(6 - november.weekday()) % 7, hours=2 + 4)  # 当地02:00 = UTC 06:00
+    return datetime.timedelta(hours=-4 if dst_start <= now_utc < dst_end else -5)
+
+class ExchangeCalendar:
+    """
+    单个交易所的日历：日历年份内每个日期的交易时段预先算好 (休市为空)，查询只做一次字典查找
+    表外年份按 工作日=常规时段、周末=休市 处理
+    after_close: 收盘后报告的状态
+    """
+
+    def __init__(self, name, utc_offset, sessions, holidays=frozenset(), half_days=frozenset(), half_day_sessions=None,
+                 after_close="closed_today"):
+        self.name = name
+        self.after_close = after_close
+        self._utc_offset = utc_offset
+        self._sessions = sessions
+        self._table = {}
+        for year in CALENDAR_YEARS:
+            day = datetime.date(year, 1, 1)
+            while day.year == year:
+                if day.weekday() >= 5 or day in holidays:
+                    self._table[day] = ()
+                else:
+                    self._table[day] = half_day_sessions if day in half_days else sessions
+                day += datetime.timedelta(days=1)
+
+    def local_now(self, now_utc):
+        """UTC时间 (不带时区) -> 交易所当地时间 (不带时区)"""
+        offset = self._utc_offset(now_utc) if callable(self._utc_offset) else self._utc_offset
+        return now_utc + offset
+
+    def sessions(self, day):
+        """某个当地日期的交易时段，休市返回空元组"""
+        sessions = self._table.get(day)
+        if sessions is None:
+            sessions = () if day.weekday() >= 5 else self._sessions
+        return sessions
+
+    def is_trading_day(self, day):
+        return bool(self.sessions(day))
+
+    def status(self, now_utc):
+        local = self.local_now(now_utc)
+        sessions = self.sessions(local.date())
+        if not sessions:
+            return "holiday" if local.weekday() < 5 else "closed"
+        now = local.time()
+        if now < sessions[0][0]:
+            return "closed"
+        if now > sessions[-1][1]:
+            return self.after_close
+        if any(start <= now <= end for start, end in sessions):
+            return "open"
+        return "lunch_break"
+
+_cn = ExchangeCalendar('CN', _UTC8, _CN_SESSIONS, _CN_HOLIDAYS)
+CALENDARS = {
+    'SS': _cn,
+    'SZ': _cn,
+    'BJ': _cn,
+    'HK': ExchangeCalendar('HK', _UTC8, _HK_SESSIONS, _HK_HOLIDAYS, _HK_HALF_DAYS, _HK_HALF_DAY),
+    'US': ExchangeCalendar('US', _us_eastern_offset, _US_SESSIONS, _US_HOLIDAYS, _US_HALF_DAYS, _US_HALF_DAY,
+                           after_close="closed"),
+}
+_SUFFIXES = {'.SS': 'SS', '.SZ': 'SZ', '.BJ': 'BJ', '.HK': 'HK'}
+
+def utc_now():
+    """当前UTC时间 (不带时区，与日历的计算方式一致)"""
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+def beijing_now(now_utc=None):
+    """当前北京时间 (不带时区)，不依赖服务器本地时区"""
+    return (now_utc or utc_now()) + _UTC8
+
+def exchange_of(ticker):
+    """规范代码 -> 交易所 (SS/SZ/BJ/HK/US)，无法识别返回None"""
+    exchange = _SUFFIXES.get(ticker[-3:])
+    if exchange:
+        return exchange
+    if ticker.isalpha() or '.' not in ticker:
+        return 'US'
+    return None
+
+_status_cache = (None, None)  # (整秒时间戳, {交易所: 状态})，整体替换，无需加锁
+
+def market_statuses(now_utc=None):
+    """全部交易所的当前状态 {交易所: 状态}；不传时间时同一秒内只计算一次"""
+    global _status_cache
+    if now_utc is not None:
+        return {exchange: calendar.status(now_utc) for exchange, calendar in CALENDARS.items()}
+    second = int(time.time())
+    cached_second, statuses = _status_cache
+    if cached_second != second:
+        statuses = market_statuses(utc_now())
+        _status_cache = (second, statuses)
+    return statuses
+
+def ticker_status(ticker, statuses=None):
+    """股票所在交易所的状态；批量判断时传入一次 market_statuses() 的结果"""
+    exchange = exchange_of(ticker)
+    if exchange is None:
+        return "unknown"
+    return (statuses or market_statuses())[exchange]
+
+def calculation_mode(now_utc=None):
+    """
+    全球化时间逻辑 (北京时间)：
+    - 全球交易日的结束以美股收盘为准 (约北京时间次日凌晨5点)
+    - PREVIOUS_DAY 仅在"全球静默期"(北京时间 05:00-09:30) 及周末
+    """
+    now = beijing_now(now_utc)
+    if now.weekday() >= 5:
+        return 'PREVIOUS_DAY'
+    if datetime.time(5, 0) <= now.time() < datetime.time(9, 30):
+        return 'PREVIOUS_DAY'
+    return 'CURRENT_DAY'
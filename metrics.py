@@ -0,0 +1,158 @@
+# 运行指标 - 估值链路各阶段耗时、各数据源按股票计的命中/缺失/失败次数，按Prometheus文本格式导出
+# 只依赖Python标准库
+import functools
+import threading
+import time
+from contextlib import contextmanager
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, v in pairs)
+    return '{' + ','.join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + '}'
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(str(labels[name]) for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    """累积分桶直方图，记录耗时分布"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # labels -> [各桶计数..., 总次数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [0] * (len(self.buckets) + 2)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._values.items())
+        for key, series in items:
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', repr(bound))])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {series[-1]!r}")
+        return lines
+
+class Gauge:
+    """瞬时值，导出时调用 fn() 读取，fn 返回 {标签值元组: 数值}"""
+
+    def __init__(self, name, documentation, labelnames=(), fn=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.fn = fn
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        try:
+            values = self.fn() if self.fn else {}
+        except Exception:
+            values = {}
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+_registry = []
+
+def _register(metric):
+    _registry.append(metric)
+    return metric
+
+STAGE_SECONDS = _register(Histogram(
+    'fund_estimator_stage_seconds', '估值链路各阶段耗时(秒)', ['stage']))
+SOURCE_SECONDS = _register(Histogram(
+    'fund_estimator_quote_source_seconds', '各行情数据源单次查询耗时(秒)', ['source']))
+SOURCE_TICKERS = _register(Counter(
+    'fund_estimator_quote_source_tickers_total', '各行情数据源按股票计的查询结果(hit/miss/failure)', ['source', 'result']))
+HOLDINGS_LOADS = _register(Counter(
+    'fund_estimator_holdings_loads_total', '持仓加载次数，按命中层级(memory/npz/csv)', ['layer']))
+
+def register_gauge(name, documentation, fn, labelnames=()):
+    """注册导出时动态读取的瞬时指标 (缓存条目数、连接池状态等)"""
+    return _register(Gauge(name, documentation, labelnames, fn))
+
+@contextmanager
+def stage(name):
+    """记录一个阶段的耗时：with stage('valuation'): ..."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=name)
+
+def timed_stage(name):
+    """函数装饰器形式的 stage"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def record_source(source, hits=0, misses=0, failures=0, seconds=None):
+    """
+    记录一次数据源查询：
+    - hits: 拿到有效行情的股票数
+    - misses: 请求成功但没有该股票数据的股票数 (停牌/代码不存在/解析失败)
+    - failures: 整个请求失败(网络错误、HTTP错误等)波及的股票数
+    """
+    for result, count in (('hit', hits), ('miss', misses), ('failure', failures)):
+        if count:
+            SOURCE_TICKERS.inc(count, source=source, result=result)
+    if seconds is not None:
+        SOURCE_SECONDS.observe(seconds, source=source)
+
+def render():
+    """按Prometheus文本格式导出全部指标"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
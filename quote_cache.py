@@ -0,0 +1,172 @@
+# 全局行情缓存 - 按股票代码去重，所有基金估值路径共享同一份行情
+import datetime
+import threading
+import time
+from collections import OrderedDict
+from zoneinfo import ZoneInfo
+
+QUOTE_TTL_OPEN = 60            # 交易时段内行情缓存60秒
+QUOTE_TTL_DEFAULT = 300        # 无法判断市场状态时缓存5分钟
+QUOTE_TTL_HISTORICAL = 86400   # 回顾模式的历史行情不会再变化，缓存1天
+SINGLE_FLIGHT_TIMEOUT = 30     # 等待其他请求在途查询的最长时间(秒)
+
+# 各市场的开盘时间 (所在时区, 开盘时刻)
+_TZ_SHANGHAI = ZoneInfo('Asia/Shanghai')
+_TZ_US_EASTERN = ZoneInfo('US/Eastern')
+_SESSION_OPEN = datetime.time(9, 30)
+
+_LIVE_STATUSES = ("open", "lunch_break", "active_day")
+_CLOSED_STATUSES = ("closed_today", "closed")
+
+def next_session_open(ticker, now=None):
+    """返回股票所在市场的下一个开盘时刻 (UTC时间戳)"""
+    tz = _TZ_SHANGHAI if ticker.endswith(('.SS', '.SZ', '.HK', '.BJ')) else _TZ_US_EASTERN
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    local_now = now.astimezone(tz)
+    day = local_now.date()
+    if local_now.time() >= _SESSION_OPEN:
+        day += datetime.timedelta(days=1)
+    while day.weekday() >= 5:
+        day += datetime.timedelta(days=1)
+    return datetime.datetime.combine(day, _SESSION_OPEN, tzinfo=tz).timestamp()
+
+def quote_ttl(ticker, status, now=None):
+    """
+    根据市场状态计算行情的有效期(秒)：
+    - 交易中: 短时间缓存，保证实时性
+    - 已收盘: 收盘价在下一个交易时段开始前不会变化，缓存到下次开盘
+    """
+    if status in _LIVE_STATUSES:
+        return QUOTE_TTL_OPEN
+    if status in _CLOSED_STATUSES:
+        now = now or datetime.datetime.now(datetime.timezone.utc)
+        return max(next_session_open(ticker, now) - now.timestamp(), QUOTE_TTL_OPEN)
+    return QUOTE_TTL_DEFAULT
+
+class QuoteCache:
+    """
+    进程级行情缓存，键为 (股票代码, 计算模式, 回顾日期)。
+    多只基金持有同一只股票时，只需向上游查询一次。
+    同时负责在途查询合并(single-flight)：同一只股票同一时刻只有一个请求向上游查询，
+    其他请求通过 claim 拿到等待事件，查询结束后直接读取缓存。
+    """
+
+    def __init__(self):
+        self._data = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_many(self, tickers, mode, target_date=None):
+        """返回 (已缓存的涨跌幅, 需要查询的股票列表)"""
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for ticker in tickers:
+                entry = self._data.get((ticker, mode, target_date))
+                if entry and entry[1] > now:
+                    found[ticker] = entry[0]
+                else:
+                    missing.append(ticker)
+            self.hits += len(found)
+            self.misses += len(missing)
+        return found, missing
+
+    def put(self, ticker, change, mode, target_date=None, status=None):
+        """写入一只股票的涨跌幅，有效期由市场状态决定"""
+        ttl = QUOTE_TTL_HISTORICAL if target_date else quote_ttl(ticker, status)
+        with self._lock:
+            self._data[(ticker, mode, target_date)] = (change, time.time() + ttl)
+
+    def claim(self, tickers, mode, target_date=None):
+        """
+        登记在途查询，返回 (本次负责查询的股票列表, {已由其他请求查询中的股票: Event})。
+        调用方查询结束后必须对负责的股票调用 release，无论成功与否。
+        """
+        owned, waiting = [], {}
+        with self._lock:
+            for ticker in tickers:
+                key = (ticker, mode, target_date)
+                event = self._inflight.get(key)
+                if event is not None:
+                    waiting[ticker] = event
+                else:
+                    self._inflight[key] = threading.Event()
+                    owned.append(ticker)
+        return owned, waiting
+
+    def release(self, tickers, mode, target_date=None):
+        """结束在途查询，唤醒等待这些股票的请求"""
+        with self._lock:
+            events = [self._inflight.pop((ticker, mode, target_date), None) for ticker in tickers]
+        for event in events:
+            if event is not None:
+                event.set()
+
+    def wait_for(self, waiting, mode, target_date=None, timeout=SINGLE_FLIGHT_TIMEOUT):
+        """等待其他请求的在途查询结束，返回 (查到的涨跌幅, 仍然没有结果的股票)"""
+        deadline = time.time() + timeout
+        for event in waiting.values():
+            event.wait(max(deadline - time.time(), 0))
+        now = time.time()
+        found, missing = {}, []
+        with self._lock:
+            for ticker in waiting:
+                entry = self._data.get((ticker, mode, target_date))
+                if entry and entry[1] > now:
+                    found[ticker] = entry[0]
+                else:
+                    missing.append(ticker)
+        return found, missing
+
+    def clear(self):
+        with self._lock:
+            count = len(self._data)
+            self._data.clear()
+        return count
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._data), 'hits': self.hits, 'misses': self.misses,
+                    'in_flight': len(self._inflight)}
+
+class LRUCache:
+    """容量有限的LRU缓存，条目带过期时间；超出容量时淘汰最久未使用的条目"""
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            if entry[1] <= time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return entry[0]
+
+    def put(self, key, value, ttl=None):
+        """写入条目；ttl 不传时使用缓存的默认有效期"""
+        with self._lock:
+            self._data[key] = (value, time.time() + (self.ttl if ttl is None else ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            count = len(self._data)
+            self._data.clear()
+        return count
+
+    def __len__(self):
+        return len(self._data)
+
+# 全局唯一实例
+quote_cache = QuoteCache()
@@ -0,0 +1,89 @@
+# 异步多数据源行情引擎 - 对冲式并发查询，每只股票取最先返回的有效结果
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import record_source
+
+HEDGE_DELAY = 1.5  # 当前数据源超过该时间(秒)仍未返回，就启动下一个数据源
+
+# 数据源函数都是阻塞调用(yfinance/requests)，放到独立线程池中执行。
+# 不使用事件循环的默认线程池：asyncio.run 退出时会等待默认线程池，落后的数据源会拖住整个请求。
+_source_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix='quote-source')
+
+async def fetch_hedged_async(sources, tickers, hedge_delay=HEDGE_DELAY):
+    """
+    按顺序对冲启动各数据源：
+    - 第一个数据源立即启动
+    - 在途数据源超过 hedge_delay 未返回，或返回后仍有股票缺失，立即启动下一个数据源
+    - 新启动的数据源只查询当时仍未拿到结果的股票
+    - 所有股票都拿到结果后立即返回，取消仍在途的数据源
+
+    sources: [(名称, fn)]，fn(tickers) -> (changes, failed)
+    返回 (changes, failed)
+    """
+    loop = asyncio.get_running_loop()
+    pending_tickers = set(tickers)
+    changes = {}
+    queue = list(sources)
+    in_flight = {}
+
+    def launch():
+        name, fn = queue.pop(0)
+        future = loop.run_in_executor(_source_executor, fn, sorted(pending_tickers))
+        in_flight[future] = (name, len(pending_tickers))
+
+    launch()
+    while pending_tickers and in_flight:
+        done, _ = await asyncio.wait(
+            in_flight, timeout=hedge_delay if queue else None,
+            return_when=asyncio.FIRST_COMPLETED
+        )
+        if not done:
+            print(f"--- {'/'.join(name for name, _ in in_flight.values())} 超过 {hedge_delay}s 未返回，启动对冲数据源 {queue[0][0]} ---")
+            launch()
+            continue
+
+        for future in done:
+            name, requested = in_flight.pop(future)
+            try:
+                source_changes, _ = future.result()
+            except Exception as e:
+                print(f"数据源 {name} 出错: {e}")
+                record_source(name, failures=requested)  # 未捕获的异常，整批股票计为失败
+                continue
+            for ticker, change in source_changes.items():
+                if ticker in pending_tickers:
+                    changes[ticker] = change
+                    pending_tickers.discard(ticker)
+
+        if pending_tickers and queue:
+            launch()
+
+    # 落后的数据源不再等待 (线程无法强制中断，结果直接丢弃)
+    for future in in_flight:
+        future.cancel()
+    return changes, sorted(pending_tickers)
+
+def fetch_hedged(sources, tickers, hedge_delay=HEDGE_DELAY):
+    """fetch_hedged_async 的同步入口，供Flask请求线程等同步代码调用"""
+    if not tickers:
+        return {}, []
+    return asyncio.run(fetch_hedged_async(sources, tickers, hedge_delay))
+
+async def _fetch_groups_async(groups, hedge_delay):
+    results = await asyncio.gather(*(fetch_hedged_async(sources, tickers, hedge_delay) for sources, tickers in groups))
+    changes, failed = {}, []
+    for group_changes, group_failed in results:
+        changes.update(group_changes)
+        failed.extend(group_failed)
+    return changes, sorted(failed)
+
+def fetch_hedged_groups(groups, hedge_delay=HEDGE_DELAY):
+    """
+    多组股票并发对冲查询，每组使用各自的数据源顺序 (如按市场健康度排列)
+    groups: [(sources, tickers)]，返回合并后的 (changes, failed)
+    """
+    groups = [(sources, tickers) for sources, tickers in groups if tickers]
+    if not groups:
+        return {}, []
+    return asyncio.run(_fetch_groups_async(groups, hedge_delay))
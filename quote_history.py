@@ -0,0 +1,170 @@
+# 历史收盘价存储 - 回顾模式使用的本地日线库 (SQLite)，股票日线按需从Yahoo补齐，基金净值由批量回填写入
+# 查询走 (代码, 日期) 主键索引；已覆盖的日期区间单独记录：区间内查不到的日期即非交易日，不会重复访问网络
+import datetime
+import os
+import sqlite3
+import threading
+
+HISTORY_PATH = os.environ.get('QUOTE_HISTORY_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'quote_history.sqlite'))
+_QUERY_BATCH = 500
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS daily_close (
+    ticker TEXT NOT NULL,
+    date TEXT NOT NULL,
+    close REAL NOT NULL,
+    PRIMARY KEY (ticker, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    ticker TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    PRIMARY KEY (ticker, start)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS fund_nav (
+    fund_code TEXT NOT NULL,
+    date TEXT NOT NULL,
+    nav REAL,
+    change_pct REAL,
+    PRIMARY KEY (fund_code, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS nav_coverage (
+    fund_code TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    PRIMARY KEY (fund_code, start)
+) WITHOUT ROWID;
+"""
+
+# 覆盖区间表 -> 代码列名
+_COVERAGE_KEYS = {'coverage': 'ticker', 'nav_coverage': 'fund_code'}
+
+class QuoteHistory:
+    """
+    日线收盘价存储：
+    - daily_close: 每只股票每个交易日的收盘价
+    - coverage: 每只股票已从上游完整拉取过的日期区间 (闭区间，相互重叠的区间写入时合并)
+    - fund_nav / nav_coverage: 基金每日单位净值、日涨跌幅(%)及已拉取的日期区间
+    日期统一使用 'YYYY-MM-DD' 字符串，字典序即时间顺序
+    """
+
+    def __init__(self, path=HISTORY_PATH):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(_SCHEMA)
+        self._lock = threading.Lock()
+
+    def uncovered(self, tickers, start, end):
+        """返回 [start, end] 未被已拉取区间完整覆盖的股票"""
+        return self._uncovered('coverage', tickers, start, end)
+
+    def uncovered_funds(self, fund_codes, start, end):
+        """返回 [start, end] 净值未被完整覆盖的基金"""
+        return self._uncovered('nav_coverage', fund_codes, start, end)
+
+    def _uncovered(self, table, keys, start, end):
+        start, end = str(start), str(end)
+        column, covered = _COVERAGE_KEYS[table], set()
+        with self._lock:
+            for i in range(0, len(keys), _QUERY_BATCH):  # SQLite单条语句的参数个数有上限
+                batch = keys[i:i + _QUERY_BATCH]
+                covered.update(row[0] for row in self._conn.execute(
+                    f"SELECT {column} FROM {table} WHERE start <= ? AND end >= ? AND {column} IN ({','.join('?' * len(batch))})",
+                    (start, end, *batch)
+                ))
+        return [k for k in keys if k not in covered]
+
+    def store(self, closes, start, end):
+        """
+        写入一次拉取的结果并标记 [start, end] 已覆盖 (start > end 时只写入收盘价)
+        closes: {ticker: [(date, close), ...]}，区间内没有数据的股票也应传入空列表
+        """
+        start, end = str(start), str(end)
+        with self._lock, self._conn:
+            for ticker, rows in closes.items():
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO daily_close (ticker, date, close) VALUES (?, ?, ?)",
+                    [(ticker, str(date), float(close)) for date, close in rows]
+                )
+                self._mark_covered('coverage', ticker, start, end)
+
+    def store_navs(self, fund_code, rows, start, end):
+        """
+        写入一只基金的历史净值；rows: [(date, nav, change_pct), ...]
+        只标记 [start, 返回的最新净值日期] 已覆盖：QDII等基金净值 T+1/T+2 才公布，之后的日期尚未发布，不能视为非交易日
+        """
+        start, end = str(start), min(str(end), max((str(date) for date, _, _ in rows), default=''))
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO fund_nav (fund_code, date, nav, change_pct) VALUES (?, ?, ?, ?)",
+                [(fund_code, str(date), nav, change_pct) for date, nav, change_pct in rows]
+            )
+            self._mark_covered('nav_coverage', fund_code, start, end)
+
+    def _mark_covered(self, table, key, start, end):
+        """与已有的重叠/相邻区间合并为一个区间 (调用方持有锁并处于事务中)"""
+        if start > end:
+            return
+        column = _COVERAGE_KEYS[table]
+        merged_start, merged_end = start, end
+        overlapping = self._conn.execute(
+            f"SELECT start, end FROM {table} WHERE {column} = ? AND start <= ? AND end >= ?",
+            (key, _next_day(end), _prev_day(start))
+        ).fetchall()
+        for row_start, row_end in overlapping:
+            merged_start, merged_end = min(merged_start, row_start), max(merged_end, row_end)
+            self._conn.execute(f"DELETE FROM {table} WHERE {column} = ? AND start = ?", (key, row_start))
+        self._conn.execute(f"INSERT INTO {table} ({column}, start, end) VALUES (?, ?, ?)", (key, merged_start, merged_end))
+
+    def close_pair(self, ticker, date):
+        """返回 (date当天或之前最近交易日的收盘价, 再前一个交易日的收盘价)，数据不足时返回None"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT close FROM daily_close WHERE ticker = ? AND date <= ? ORDER BY date DESC LIMIT 2",
+                (ticker, str(date))
+            ).fetchall()
+        return (rows[0][0], rows[1][0]) if len(rows) == 2 else None
+
+    def nav_change(self, fund_code, date):
+        """
+        基金在 date 当天的日涨跌幅(%)：返回 (是否已覆盖, 涨跌幅)
+        已覆盖但没有记录表示当天不是交易日，调用方无需再访问网络；涨跌幅为空 ('--') 的记录视为未覆盖
+        """
+        date = str(date)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT change_pct FROM fund_nav WHERE fund_code = ? AND date = ?", (fund_code, date)
+            ).fetchone()
+            if row is not None:
+                return row[0] is not None, row[0]
+            covered = self._conn.execute(
+                "SELECT 1 FROM nav_coverage WHERE fund_code = ? AND start <= ? AND end >= ?", (fund_code, date, date)
+            ).fetchone()
+        return covered is not None, None
+
+    def stats(self):
+        with self._lock:
+            closes = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT ticker) FROM daily_close").fetchone()
+            navs = self._conn.execute("SELECT COUNT(*), COUNT(DISTINCT fund_code) FROM fund_nav").fetchone()
+        return {'path': self.path, 'closes': closes[0], 'tickers': closes[1], 'navs': navs[0], 'funds': navs[1]}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+def _next_day(date):
+    return (datetime.date.fromisoformat(date) + datetime.timedelta(days=1)).isoformat()
+
+def _prev_day(date):
+    return (datetime.date.fromisoformat(date) - datetime.timedelta(days=1)).isoformat()
+
+_history = None
+_history_lock = threading.Lock()
+
+def get_quote_history():
+    """进程内共享的历史收盘价存储 (首次使用时打开数据库)"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = QuoteHistory()
+        return _history
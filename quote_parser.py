@@ -0,0 +1,85 @@
+# 行情数据解析 - 单次遍历新浪/腾讯返回的原始字节，按偏移截取代码与字段，价格字段直接转为浮点数
+# 不使用正则，也不对整个响应做GBK解码 (股票名称等中文字段不需要解析)
+# 只依赖Python标准库
+_SINA_MARKER = b'var hq_str_'
+_TENCENT_MARKER = b'v_'
+
+def _records(content, marker):
+    """逐条产出 (数据源代码, 字段字节串)；代码只含ASCII字符，字段保持字节串不解码；跳过内容为空的记录"""
+    pos, marker_len = 0, len(marker)
+    while True:
+        start = content.find(marker, pos)
+        if start < 0:
+            return
+        eq = content.find(b'="', start)
+        if eq < 0:
+            return
+        end = content.find(b'"', eq + 2)
+        if end < 0:
+            return
+        pos = end + 1  # 下一次从本条记录的结束引号之后查找，不会误匹配字段内容
+        if end > eq + 2:
+            yield content[start + marker_len:eq].decode('ascii', 'replace'), content[eq + 2:end]
+
+def _change(latest, prev_close):
+    latest, prev_close = float(latest), float(prev_close)
+    return (latest - prev_close) / prev_close if prev_close != 0 else None
+
+def parse_sina(content, symbol_map):
+    """
+    解析新浪行情 (var hq_str_sh600519="...";)，symbol_map 为 {新浪代码: 规范代码}
+    - A股(sh/sz/bj): 字段2为昨收，字段3为最新价
+    - 港股(hk): 字段3为昨收，字段6为最新价
+    - 美股(gb_): 字段26为昨收(为0时取字段7)，字段1为最新价
+    返回 {规范代码: 涨跌幅}
+    """
+    changes = {}
+    for symbol, value in _records(content, _SINA_MARKER):
+        ticker = symbol_map.get(symbol)
+        if ticker is None:
+            continue
+        try:
+            change = None
+            if symbol.startswith('gb_'):
+                data = value.split(b',', 27)
+                if len(data) > 26:
+                    prev_close = float(data[26])
+                    if prev_close == 0 and len(data) > 7: prev_close = float(data[7])
+                    change = _change(data[1], prev_close)
+            elif symbol.startswith('hk'):
+                data = value.split(b',', 9)
+                if len(data) > 8: change = _change(data[6], data[3])
+            elif symbol.startswith(('sh', 'sz', 'bj')):
+                data = value.split(b',', 4)
+                if len(data) > 3: change = _change(data[3], data[2])
+            if change is not None:
+                changes[ticker] = change
+        except (ValueError, IndexError):
+            continue
+    return changes
+
+def parse_tencent(content, symbol_map):
+    """
+    解析腾讯行情 (v_sh600519="1~贵州茅台~600519~最新价~昨收~...";)，symbol_map 为 {腾讯代码: 规范代码}
+    名称中的 亊/銅/葉 等汉字GBK编码含 0x7E，按字节切分会使后续字段错位：
+    字段2(证券代码)与请求的代码不一致时，将该条记录按GBK解码后重新切分
+    返回 {规范代码: 涨跌幅}
+    """
+    changes = {}
+    for symbol, value in _records(content, _TENCENT_MARKER):
+        ticker = symbol_map.get(symbol)
+        if ticker is None:
+            continue
+        data = value.split(b'~', 5)
+        if len(data) > 2 and not data[2].upper().startswith(symbol[2:].upper().encode('ascii', 'replace')):
+            data = value.decode('gbk', 'replace').split('~', 5)
+            if len(data) < 3 or not data[2].upper().startswith(symbol[2:].upper()):
+                continue
+        if len(data) > 4 and data[3] and data[4]:
+            try:
+                change = _change(data[3], data[4])
+            except ValueError:
+                continue
+            if change is not None:
+                changes[ticker] = change
+    return changes
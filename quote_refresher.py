@@ -0,0 +1,94 @@
+# 后台行情刷新 - 按市场状态定时预刷新全部持仓股票的行情，请求线程直接命中缓存
+import os
+import threading
+import time
+
+from fund_estimator import fetch_price_changes, get_market_status, QUERY_STATUSES
+from market_calendar import market_statuses
+from quote_cache import quote_cache, QUOTE_TTL_OPEN
+from incremental_valuator import get_valuator
+
+# 交易中的股票刷新间隔，需小于行情缓存有效期，保证缓存在过期前被刷新
+REFRESH_INTERVAL_OPEN = int(os.environ.get('QUOTE_REFRESH_INTERVAL', QUOTE_TTL_OPEN // 2))
+REFRESH_INTERVAL_IDLE = 60  # 没有交易中的市场时，只定期重新检查市场状态
+
+class QuoteRefresher(threading.Thread):
+    """
+    后台刷新线程，每一轮：
+    - 交易中(open)的股票：无论缓存是否过期都重新查询，缓存始终保持新鲜
+    - 其他需要查询的状态(午休/当日已收盘等)：只补齐缓存中缺失的股票
+    - 已收盘的市场不查询
+    查询结果同时写入增量估值引擎，驱动增量流
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL_OPEN):
+        super().__init__(name='quote-refresher', daemon=True)
+        self.interval = interval
+        self._stop_event = threading.Event()
+        self.rounds = 0
+        self.last_refresh = None
+        self.last_fetched = 0
+
+    def refresh_once(self):
+        """执行一轮刷新，返回本轮是否有交易中的股票"""
+        valuator = get_valuator()
+        open_tickers, other_tickers = [], []
+        statuses = market_statuses()  # 每轮每个交易所只判断一次，休市日的市场整体跳过
+        for ticker in valuator.index.tickers:
+            status = get_market_status(ticker, statuses)
+            if status == 'open':
+                open_tickers.append(ticker)
+            elif status in QUERY_STATUSES:
+                other_tickers.append(ticker)
+
+        cached, missing = quote_cache.get_many(other_tickers, 'CURRENT_DAY') if other_tickers else ({}, [])
+        to_fetch = open_tickers + missing
+        changes = {}
+        if to_fetch:
+            changes, _ = fetch_price_changes(to_fetch, 'CURRENT_DAY')
+        changes.update(cached)
+        valuator.apply_quotes(changes)
+
+        self.rounds += 1
+        self.last_refresh = time.time()
+        self.last_fetched = len(to_fetch)
+        return bool(open_tickers)
+
+    def run(self):
+        print(f"后台行情刷新已启动，交易时段刷新间隔 {self.interval}s")
+        while not self._stop_event.is_set():
+            try:
+                has_open = self.refresh_once()
+            except Exception as e:
+                print(f"后台行情刷新出错: {e}")
+                has_open = False
+            self._stop_event.wait(self.interval if has_open else REFRESH_INTERVAL_IDLE)
+
+    def stop(self):
+        self._stop_event.set()
+
+    def stats(self):
+        return {
+            'running': self.is_alive(),
+            'interval': self.interval,
+            'rounds': self.rounds,
+            'last_refresh': self.last_refresh,
+            'last_fetched': self.last_fetched,
+        }
+
+_refresher = None
+_refresher_lock = threading.Lock()
+
+def start_quote_refresher():
+    """启动全局后台刷新线程 (重复调用只启动一次)；环境变量 QUOTE_REFRESHER=0 时不启动"""
+    global _refresher
+    if os.environ.get('QUOTE_REFRESHER', '1') == '0':
+        return None
+    with _refresher_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = QuoteRefresher()
+            _refresher.start()
+    return _refresher
+
+def get_refresher_stats():
+    return _refresher.stats() if _refresher is not None else {'running': False}
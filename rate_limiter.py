@@ -0,0 +1,108 @@
+# 上游主机自适应限流 - 每个主机一个令牌桶，按观察到的429/403/超时自动降速，请求顺畅时逐步恢复
+# 只依赖Python标准库，api/index.py (Vercel) 同样可以使用
+import os
+import threading
+import time
+
+ENABLED = os.environ.get('HTTP_RATE_LIMIT', '1') != '0'  # 设置 HTTP_RATE_LIMIT=0 关闭限流 (本地模拟器/基准测试)
+THROTTLE_STATUSES = (403, 429)
+DECREASE_FACTOR = 0.5     # 遇到限流信号时速率减半
+INCREASE_STEP = 0.5       # 每次成功请求速率增加的量(次/秒)
+DECREASE_COOLDOWN = 1.0   # 两次降速之间的最短间隔(秒)，同一批在途请求的限流信号只降速一次
+
+# 各主机的 (初始速率, 最低速率, 最高速率, 突发容量)，速率单位为次/秒
+DEFAULT_LIMIT = (10.0, 0.5, 50.0, 10)
+HOST_LIMITS = {
+    'hq.sinajs.cn': (10.0, 0.5, 50.0, 10),
+    'qt.gtimg.cn': (10.0, 0.5, 50.0, 10),
+    'query1.finance.yahoo.com': (2.0, 0.2, 10.0, 4),
+    'fundgz.1234567.com.cn': (20.0, 1.0, 100.0, 20),
+    'fundf10.eastmoney.com': (10.0, 0.5, 50.0, 10),
+    'fund.eastmoney.com': (10.0, 0.5, 50.0, 10),
+    'api.fund.eastmoney.com': (10.0, 0.5, 50.0, 10),
+}
+
+class AdaptiveTokenBucket:
+    """
+    令牌桶限流 (AIMD)：
+    - acquire() 取一个令牌，桶空时等待到下一个令牌生成
+    - on_success() 速率加性增长，直到最高速率
+    - on_throttle() 速率减半，直到最低速率；冷却期内的重复信号忽略
+    """
+
+    def __init__(self, rate, min_rate, max_rate, burst):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+        self.stats = {'acquired': 0, 'waited_seconds': 0.0, 'throttled': 0}
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """取一个令牌，返回等待的秒数"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    self.stats['acquired'] += 1
+                    self.stats['waited_seconds'] += waited
+                    return waited
+                delay = (1 - self._tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + INCREASE_STEP)
+
+    def on_throttle(self):
+        with self._lock:
+            self.stats['throttled'] += 1
+            now = time.monotonic()
+            if now - self._last_decrease < DECREASE_COOLDOWN:
+                return
+            self._last_decrease = now
+            self._refill(now)
+            self.rate = max(self.min_rate, self.rate * DECREASE_FACTOR)
+            self._tokens = min(self._tokens, 0.0)  # 清空桶内积攒的令牌，降速立即生效
+
+_limiters = {}
+_registry_lock = threading.Lock()
+
+def limiter_for(host):
+    """返回主机对应的限流器 (按需创建，进程内共享)"""
+    with _registry_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = AdaptiveTokenBucket(*HOST_LIMITS.get(host, DEFAULT_LIMIT))
+        return limiter
+
+def acquire(host):
+    """请求发出前调用；限流关闭时直接返回"""
+    if ENABLED and host:
+        limiter_for(host).acquire()
+
+def record(host, status_code=None, timed_out=False):
+    """请求结束后调用：403/429或超时视为限流信号，其余视为成功"""
+    if not ENABLED or not host:
+        return
+    limiter = limiter_for(host)
+    if timed_out or status_code in THROTTLE_STATUSES:
+        limiter.on_throttle()
+    else:
+        limiter.on_success()
+
+def get_rates():
+    """各主机当前的限流速率(次/秒)"""
+    with _registry_lock:
+        return {host: limiter.rate for host, limiter in _limiters.items()}
@@ -0,0 +1,84 @@
+# 批量行情请求切分 - 按URL长度把股票列表切成多个请求，并发执行，每个上游主机限制同时在途的请求数
+# 只依赖Python标准库，api/index.py (Vercel) 同样可以使用
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+DEFAULT_MAX_URL_LENGTH = 2000  # 未单独配置的主机，单个请求URL的最大长度
+DEFAULT_HOST_CONCURRENCY = int(os.environ.get('HOST_CONCURRENCY', '4'))  # 每个主机同时在途的请求数
+
+# 各数据源的URL长度上限 (留出余量，避免被上游或中间代理截断)
+MAX_URL_LENGTH = {
+    'hq.sinajs.cn': 2000,
+    'qt.gtimg.cn': 2000,
+}
+HOST_CONCURRENCY = {}
+
+_host_slots = {}
+_slots_lock = threading.Lock()
+_chunk_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='quote-chunk')
+
+def _host_of(url):
+    return urlsplit(url).hostname
+
+def _slots_for(host):
+    with _slots_lock:
+        slots = _host_slots.get(host)
+        if slots is None:
+            slots = _host_slots[host] = threading.BoundedSemaphore(HOST_CONCURRENCY.get(host, DEFAULT_HOST_CONCURRENCY))
+        return slots
+
+def chunk_symbols(base_url, symbols, max_url_length=None, sep=','):
+    """
+    将 symbols 切分为若干组，保证 base_url + ','.join(组) 不超过 max_url_length
+    单个代码本身超长时独占一组，不会被丢弃
+    返回 [(url, [symbol, ...]), ...]
+    """
+    limit = max_url_length or MAX_URL_LENGTH.get(_host_of(base_url), DEFAULT_MAX_URL_LENGTH)
+    chunks, current, length = [], [], len(base_url)
+    for symbol in symbols:
+        extra = len(symbol) + (len(sep) if current else 0)
+        if current and length + extra > limit:
+            chunks.append(current)
+            current, length = [], len(base_url)
+            extra = len(symbol)
+        current.append(symbol)
+        length += extra
+    if current:
+        chunks.append(current)
+    return [(base_url + sep.join(chunk), chunk) for chunk in chunks]
+
+def fetch_chunked(base_url, symbols, fetch, max_url_length=None, sep=','):
+    """
+    按URL长度切分后并发请求，同一主机同时在途的请求数不超过 HOST_CONCURRENCY
+    fetch(url) -> dict，各组结果合并返回；某一组请求出错只影响该组的代码
+    返回 (合并结果, 请求出错的代码列表)
+    """
+    chunks = chunk_symbols(base_url, list(symbols), max_url_length, sep)
+    slots = _slots_for(_host_of(base_url))
+
+    def run(url):
+        with slots:
+            return fetch(url)
+
+    if len(chunks) == 1:
+        outcomes = [_call(run, chunks[0][0])]  # 只有一组时直接在当前线程执行
+    else:
+        futures = [_chunk_executor.submit(_call, run, url) for url, _ in chunks]
+        outcomes = [future.result() for future in futures]
+
+    results, errored = {}, []
+    for (url, chunk), (value, error) in zip(chunks, outcomes):
+        if error is not None:
+            print(f"分组请求失败 ({len(chunk)} 只, {_host_of(url)}): {error}")
+            errored.extend(chunk)
+            continue
+        results.update(value)
+    return results, errored
+
+def _call(fn, *args):
+    try:
+        return fn(*args), None
+    except Exception as e:
+        return None, e
@@ -0,0 +1,197 @@
+# 数据源健康度 - 每个数据源一个熔断器(滚动错误率/耗时)，熔断期间跳过该数据源并在后台半开探测；
+# 另按 (数据源, 市场) 统计近期命中率与耗时，据此为每个市场排列数据源的查询顺序
+# 只依赖Python标准库，api/index.py (Vercel) 同样可以使用
+import threading
+import time
+from collections import deque
+
+from ticker_symbology import record_for_ticker
+
+WINDOW_SECONDS = 120        # 滚动统计窗口(秒)
+MIN_CALLS = 4               # 窗口内调用次数达到该值才判断是否熔断
+ERROR_RATE_THRESHOLD = 0.5  # 窗口内错误率达到该值即熔断
+SLOW_CALL_SECONDS = 8.0     # 耗时超过该值的调用按错误计 (等满超时的数据源同样需要熔断)
+EMPTY_RESULT_MIN = 5        # 至少查询这么多只股票却一只都没拿到才按错误计 (少量停牌/退市股票查不到属正常)
+OPEN_SECONDS = 30           # 熔断后等待多久开始半开探测
+PROBE_SIZE = 3              # 半开探测查询的股票数
+MISS_PENALTY_SECONDS = 5.0  # 排序时每 100% 未命中率折算的耗时
+
+CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+class CircuitBreaker:
+    """
+    单个数据源的熔断器：
+    - closed: 正常调用，窗口内错误率过高时转为 open
+    - open: 跳过该数据源；OPEN_SECONDS 后首次被请求时转为 half_open，并在后台线程用少量股票探测
+    - half_open: 仍然跳过；探测成功转为 closed (清空窗口)，失败重新 open
+    只有本次半开探测 (以 allow 生成的令牌标记) 的结果能改变 half_open 状态，熔断前发出、迟到返回的调用不影响
+    """
+
+    def __init__(self, name, probe=None):
+        self.name = name
+        self.probe = probe  # probe(tickers) -> (changes, failed)，未接入 record 的原始数据源函数，创建时注册一次
+        self.state = CLOSED
+        self._opened_at = 0.0
+        self._probe_token = None
+        self._events = deque()  # (时间, 是否成功, 耗时)
+        self._lock = threading.Lock()
+
+    def _trim(self, now):
+        while self._events and now - self._events[0][0] > WINDOW_SECONDS:
+            self._events.popleft()
+
+    def record(self, hits, requested, seconds, raised=False, probe_token=None):
+        """
+        记录一次调用：抛出异常、耗时过长、或批量查询一只都没拿到，计为错误
+        probe_token: 半开探测调用传入 allow 生成的令牌；half_open 期间其他调用的结果忽略
+        """
+        with self._lock:
+            now = time.monotonic()
+            ok = not raised and seconds <= SLOW_CALL_SECONDS and (hits > 0 or requested < EMPTY_RESULT_MIN)
+            if probe_token is not None or self.state == HALF_OPEN:
+                if self.state != HALF_OPEN or probe_token is not self._probe_token:
+                    return  # 过期的探测，或熔断前发出的迟到调用
+                ok = ok and hits > 0  # 探测必须真正拿到行情才算恢复
+                self._events.clear()
+                self._probe_token = None
+                self.state, self._opened_at = (CLOSED, 0.0) if ok else (OPEN, now)
+                print(f"--- 数据源 {self.name} 半开探测{'成功，恢复使用' if ok else '失败，继续熔断'} ---")
+                return
+            self._events.append((now, ok, seconds))
+            self._trim(now)
+            if self.state == CLOSED and len(self._events) >= MIN_CALLS and self._error_rate() >= ERROR_RATE_THRESHOLD:
+                self.state, self._opened_at = OPEN, now
+                print(f"--- 数据源 {self.name} 错误率过高，熔断 {OPEN_SECONDS}s ---")
+
+    def _error_rate(self):
+        return sum(1 for _, ok, _ in self._events if not ok) / len(self._events) if self._events else 0.0
+
+    def allow(self, sample=()):
+        """是否调用该数据源；熔断到期时用 sample 中的股票在后台发起半开探测"""
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and time.monotonic() - self._opened_at >= OPEN_SECONDS and self.probe and sample:
+                self.state = HALF_OPEN
+                self._probe_token = token = object()
+                tickers = list(sample)[:PROBE_SIZE]
+                threading.Thread(target=self._run_probe, args=(tickers, token), name=f'probe-{self.name}', daemon=True).start()
+            return False
+
+    def _run_probe(self, tickers, token):
+        started = time.perf_counter()
+        changes, raised = {}, True
+        try:
+            changes, _ = self.probe(tickers)
+            raised = False
+        except Exception:
+            pass
+        finally:
+            self.record(len(changes), len(tickers), time.perf_counter() - started, raised, probe_token=token)
+
+    def snapshot(self):
+        with self._lock:
+            self._trim(time.monotonic())
+            latencies = [s for _, _, s in self._events]
+            return {
+                'state': self.state,
+                'calls': len(self._events),
+                'error_rate': self._error_rate(),
+                'mean_seconds': sum(latencies) / len(latencies) if latencies else 0.0,
+            }
+
+class SourceHealth:
+    """所有数据源的熔断器与分市场统计"""
+
+    def __init__(self):
+        self._breakers = {}
+        self._market_events = {}  # (数据源, 市场) -> deque[(时间, 命中数, 查询数, 耗时)]
+        self._lock = threading.Lock()
+
+    def breaker(self, name, probe=None):
+        """
+        获取数据源的熔断器；probe 只在熔断器创建时 (或尚未注册探测函数时) 生效，之后的调用不会替换，
+        共用同一数据源的多个模块不会互相覆盖半开探测的行为
+        """
+        with self._lock:
+            breaker = self._breakers.get(name)
+            if breaker is None:
+                breaker = self._breakers[name] = CircuitBreaker(name, probe)
+            elif breaker.probe is None and probe is not None:
+                breaker.probe = probe
+            return breaker
+
+    def register(self, name, probe):
+        """模块加载时注册数据源的半开探测函数 probe(tickers) -> (changes, failed)，返回熔断器"""
+        return self.breaker(name, probe)
+
+    def instrument(self, name, fn):
+        """包装数据源函数 fn(tickers) -> (changes, failed)：记录耗时、成败与分市场命中率 (不注册为探测函数)"""
+        def wrapped(tickers):
+            started = time.perf_counter()
+            changes, raised = {}, True
+            try:
+                changes, failed = fn(tickers)
+                raised = False
+                return changes, failed
+            finally:
+                seconds = time.perf_counter() - started
+                self.breaker(name).record(len(changes), len(tickers), seconds, raised)
+                self._record_markets(name, tickers, changes, seconds)
+        return wrapped
+
+    def _record_markets(self, name, tickers, changes, seconds):
+        requested, hits = {}, {}
+        for ticker in tickers:
+            market = record_for_ticker(ticker).market
+            requested[market] = requested.get(market, 0) + 1
+            if ticker in changes:
+                hits[market] = hits.get(market, 0) + 1
+        now = time.monotonic()
+        with self._lock:
+            for market, count in requested.items():
+                events = self._market_events.setdefault((name, market), deque())
+                events.append((now, hits.get(market, 0), count, seconds))
+                while events and now - events[0][0] > WINDOW_SECONDS:
+                    events.popleft()
+
+    def _score(self, name, market, now):
+        """近期平均耗时 + 未命中率折算的耗时，越小越好；没有近期记录返回None"""
+        with self._lock:
+            events = [e for e in self._market_events.get((name, market), ()) if now - e[0] <= WINDOW_SECONDS]
+        requested = sum(e[2] for e in events)
+        if not requested:
+            return None
+        miss_rate = 1 - sum(e[1] for e in events) / requested
+        return sum(e[3] for e in events) / len(events) + miss_rate * MISS_PENALTY_SECONDS
+
+    def order_for_market(self, names, market):
+        """按近期表现排列数据源 (没有近期记录的数据源保持原有相对顺序排在最前，以便获得统计)"""
+        now = time.monotonic()
+        scores = {name: self._score(name, market, now) for name in names}
+        return sorted(names, key=lambda name: (scores[name] is not None, scores[name] or 0.0))
+
+    def plan(self, names, tickers):
+        """
+        为一批股票安排查询：按市场排列数据源顺序并跳过熔断中的数据源，顺序相同的市场合并为一组
+        返回 ([(数据源名称顺序, [股票...]), ...], 没有可用数据源的股票)
+        """
+        by_market = {}
+        for ticker in tickers:
+            by_market.setdefault(record_for_ticker(ticker).market, []).append(ticker)
+        groups, unavailable = {}, []
+        for market, market_tickers in by_market.items():
+            order = tuple(name for name in self.order_for_market(names, market) if self.breaker(name).allow(market_tickers))
+            if order:
+                groups.setdefault(order, []).extend(market_tickers)
+            else:
+                unavailable.extend(market_tickers)
+        return list(groups.items()), unavailable
+
+    def snapshot(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {name: breaker.snapshot() for name, breaker in breakers.items()}
+
+# 进程内共享的数据源健康度
+source_health = SourceHealth()
@@ -0,0 +1,83 @@
+# 股票代码规范化 - 原始持仓代码 -> 驻留的规范代码记录 (市场、Yahoo/新浪/腾讯代码)，结果全局缓存
+# 只依赖Python标准库，fund_estimator.py 与 api/index.py 共用同一套规则
+import sys
+import threading
+from collections import namedtuple
+
+TickerRecord = namedtuple('TickerRecord', [
+    'ticker',       # 规范代码 (与Yahoo一致)：600519.SS / 00700.HK / AAPL
+    'market',       # 市场分类：A股 / 港股 / 美股 / 其他
+    'market_code',  # 简写市场代码 (api/index 返回值使用)：A / BJ / HK / US / unknown
+    'yahoo',        # Yahoo Finance 代码
+    'sina',         # 新浪行情代码：sh600519 / hk00700 / gb_aapl
+    'tencent',      # 腾讯行情代码：sh600519 / hk00700 / usAAPL
+])
+
+# 交易所后缀 -> (行情代码前缀, 市场分类, 简写市场代码)
+_EXCHANGES = {
+    '.SS': ('sh', 'A股', 'A'),
+    '.SZ': ('sz', 'A股', 'A'),
+    '.BJ': ('bj', 'A股', 'BJ'),
+    '.HK': ('hk', '港股', 'HK'),
+}
+
+_records = {}   # 规范代码 -> TickerRecord (每个规范代码只有一个记录对象)
+_by_code = {}   # 原始代码 -> TickerRecord
+_lock = threading.Lock()
+
+def canonical_ticker(stock_code):
+    """将原始持仓代码转换为规范代码 (不查缓存)；支持 'XXX US'/'XXX HK'/'XXX CH' 后缀和逗号分隔的多个代码"""
+    stock_code = str(stock_code).strip().upper()
+    if ' US' in stock_code: return stock_code.replace(' US', '').strip()
+    if ' HK' in stock_code: return f"{stock_code.replace(' HK', '').strip().zfill(5)}.HK"
+    if ' CH' in stock_code: stock_code = stock_code.replace(' CH', '').strip()
+    if stock_code.isdigit() and len(stock_code) == 6:
+        if stock_code.startswith(('8', '4', '9')):
+            return f"{stock_code}.BJ"
+        return f"{stock_code}.SS" if stock_code.startswith('6') else f"{stock_code}.SZ"
+    if stock_code.isdigit() and len(stock_code) < 6: return f"{stock_code.zfill(5)}.HK"
+    if stock_code.isalpha(): return stock_code
+    if ',' in stock_code: return canonical_ticker(stock_code.split(',')[0])  # 复合代码取第一个
+    return stock_code
+
+def _build_record(ticker):
+    suffix = ticker[-3:]
+    exchange = _EXCHANGES.get(suffix) if len(ticker) > 3 else None
+    if exchange:
+        prefix, market, market_code = exchange
+        symbol = f"{prefix}{ticker[:-3]}"
+        return TickerRecord(ticker, market, market_code, ticker, symbol, symbol)
+    if ticker.isalpha() or '.' not in ticker:
+        market, market_code = '美股', 'US' if ticker.isalpha() else 'unknown'
+    else:
+        market, market_code = '其他', 'unknown'
+    return TickerRecord(ticker, market, market_code, ticker, f"gb_{ticker.lower()}", f"us{ticker.upper()}")
+
+def record_for_ticker(ticker):
+    """按规范代码获取驻留的代码记录"""
+    record = _records.get(ticker)
+    if record is None:
+        with _lock:
+            record = _records.get(ticker)
+            if record is None:
+                record = _records[sys.intern(ticker)] = _build_record(sys.intern(ticker))
+    return record
+
+def lookup(stock_code):
+    """按原始持仓代码获取代码记录，同一原始代码只解析一次；空代码返回None"""
+    record = _by_code.get(stock_code)
+    if record is not None:
+        return record
+    if stock_code is None or not str(stock_code).strip():
+        return None
+    record = record_for_ticker(canonical_ticker(stock_code))
+    _by_code[stock_code] = record
+    return record
+
+def symbols_for(tickers, source):
+    """生成 {数据源代码: 规范代码} 映射，source 为 'sina' / 'tencent' / 'yahoo'"""
+    field = TickerRecord._fields.index(source)
+    return {record_for_ticker(ticker)[field]: ticker for ticker in tickers}
+
+def cache_info():
+    return {'records': len(_records), 'raw_codes': len(_by_code)}
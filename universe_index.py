@@ -0,0 +1,130 @@
+# 全市场持仓索引 - 跨基金的股票代码驻留表 + 基金×股票稀疏权重矩阵 + 股票->基金倒排表
+# 一次行情刷新只需一次稀疏矩阵-向量乘法即可重新估值全部基金
+import os
+import re
+import threading
+
+import numpy as np
+
+from fund_estimator import HOLDINGS_FOLDER
+from holdings_store import load_holdings, stat_key
+
+class UniverseIndex:
+    """
+    基于 fund_holdings/ 构建的持仓索引 (numpy实现的CSR/CSC，不依赖scipy)：
+    - tickers: 驻留的股票代码表，ticker_ids 为 代码->下标
+    - 行(基金) CSR: indptr/indices/weights，weights 为持仓占比(小数)
+    - 列(股票) 倒排: post_indptr/post_funds/post_weights
+    - signature: 构建时全部持仓文件的版本键 (含无法解析而跳过的文件，skipped 记录这些文件)
+    """
+
+    def __init__(self, fund_codes, tickers, indptr, indices, weights, signature=None, skipped=()):
+        self.fund_codes = list(fund_codes)
+        self.fund_ids = {code: i for i, code in enumerate(self.fund_codes)}
+        self.tickers = list(tickers)
+        self.ticker_ids = {ticker: i for i, ticker in enumerate(self.tickers)}
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.signature = signature
+        self.skipped = list(skipped)
+
+        # 每个非零元素所属的基金行号，用于 bincount 形式的矩阵-向量乘法
+        self.entry_rows = np.repeat(np.arange(len(self.fund_codes), dtype=np.int32), np.diff(indptr))
+        self.total_weights = np.bincount(self.entry_rows, weights=weights, minlength=len(self.fund_codes))
+
+        # 倒排表 (按股票分组的CSC)
+        order = np.argsort(indices, kind='stable')
+        counts = np.bincount(indices, minlength=len(self.tickers))
+        self.post_indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        self.post_funds = self.entry_rows[order]
+        self.post_weights = weights[order]
+
+    @classmethod
+    def build(cls, folder=HOLDINGS_FOLDER):
+        """从持仓文件夹构建索引，股票代码在所有基金间驻留共享"""
+        files = sorted(f for f in os.listdir(folder) if re.match(r'^\d{6}\.csv$', f))
+        fund_codes, signature, skipped = [], [], []
+        ticker_ids, rows_indices, rows_weights = {}, [], []
+        for file in files:
+            csv_path = os.path.join(folder, file)
+            try:
+                holdings = load_holdings(csv_path)
+            except Exception as e:
+                print(f"构建持仓索引时跳过 {file}: {e}")
+                # 跳过的文件同样计入签名，文件不变时不会每次都判定索引过期而重建
+                try:
+                    signature.append((file, tuple(stat_key(csv_path).tolist())))
+                except OSError:
+                    pass
+                skipped.append(file)
+                continue
+            local_ids = np.array(
+                [ticker_ids.setdefault(ticker, len(ticker_ids)) for ticker in holdings.tickers.tolist()],
+                dtype=np.int32
+            )
+            fund_codes.append(file.split('.')[0])
+            signature.append((file, tuple(holdings.stat_key.tolist())))
+            rows_indices.append(local_ids[holdings.ticker_ids] if len(holdings) else np.zeros(0, dtype=np.int32))
+            rows_weights.append(holdings.weights.astype(np.float64) / 100.0)
+
+        indptr = np.zeros(len(fund_codes) + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum([len(r) for r in rows_indices])
+        indices = np.concatenate(rows_indices) if rows_indices else np.zeros(0, dtype=np.int32)
+        weights = np.concatenate(rows_weights) if rows_weights else np.zeros(0)
+        return cls(fund_codes, list(ticker_ids), indptr, indices.astype(np.int32), weights, tuple(signature), skipped)
+
+    def funds_holding(self, ticker):
+        """反查持有某只股票的基金：[(基金代码, 持仓占比)]，按占比从高到低"""
+        tid = self.ticker_ids.get(ticker)
+        if tid is None:
+            return []
+        start, end = self.post_indptr[tid], self.post_indptr[tid + 1]
+        pairs = [(self.fund_codes[f], float(w)) for f, w in zip(self.post_funds[start:end], self.post_weights[start:end])]
+        return sorted(pairs, key=lambda p: p[1], reverse=True)
+
+    def fund_holdings(self, fund_code):
+        """某只基金的持仓：[(股票代码, 持仓占比)]"""
+        fid = self.fund_ids.get(fund_code)
+        if fid is None:
+            return []
+        start, end = self.indptr[fid], self.indptr[fid + 1]
+        return [(self.tickers[t], float(w)) for t, w in zip(self.indices[start:end], self.weights[start:end])]
+
+    def quote_vector(self, changes):
+        """将 {股票代码: 涨跌幅} 转为按驻留下标排列的向量，缺失的股票按0计算"""
+        vector = np.zeros(len(self.tickers))
+        for ticker, change in changes.items():
+            tid = self.ticker_ids.get(ticker)
+            if tid is not None and change is not None:
+                vector[tid] = change
+        return vector
+
+    def matvec(self, vector):
+        """基金×股票权重矩阵与行情向量相乘，得到每只基金的加权涨跌幅之和"""
+        return np.bincount(self.entry_rows, weights=self.weights * vector[self.indices], minlength=len(self.fund_codes))
+
+    def revalue(self, changes):
+        """一次矩阵-向量乘法重新估值全部基金：{基金代码: 估算涨跌幅}"""
+        weighted = self.matvec(self.quote_vector(changes))
+        estimates = np.divide(weighted, self.total_weights, out=np.zeros_like(weighted), where=self.total_weights > 0)
+        return dict(zip(self.fund_codes, estimates.tolist()))
+
+_index = None
+_index_lock = threading.Lock()
+
+def _folder_signature(folder):
+    files = sorted(f for f in os.listdir(folder) if re.match(r'^\d{6}\.csv$', f))
+    # 与 UniverseIndex.build 中的签名一致：已加载与跳过的文件都按 holdings_store.stat_key 记录
+    return tuple((file, tuple(stat_key(os.path.join(folder, file)).tolist())) for file in files)
+
+def get_universe_index(folder=HOLDINGS_FOLDER):
+    """获取全局持仓索引；持仓文件有增删改时自动重建"""
+    global _index
+    signature = _folder_signature(folder)
+    if _index is not None and _index.signature == signature:
+        return _index
+    with _index_lock:
+        if _index is None or _index.signature != signature:
+            _index = UniverseIndex.build(folder)
+    return _index